@@ -0,0 +1,217 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+import pandas as pd
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import text
+import streamlit as st
+
+from database import SEVERITY_LEVELS
+
+# Cached results kept per analytics instance (least recently used are dropped first)
+CACHE_MAX_ENTRIES = 256
+# Upper bound on the age of a cached result, whatever changed the database
+CACHE_TTL_SECONDS = float(os.getenv("PASHU_ANALYTICS_CACHE_TTL", "600"))
+# How often the cache compares DatabaseManager.data_version() to catch writes by other processes
+VERSION_CHECK_SECONDS = 5.0
+
+
+class HealthAnalytics:
+    """Herd health analytics computed from cow_health_records.
+
+    Trends read the daily/weekly rollup tables, so cost depends on the
+    length of the date range rather than on the number of records; pandas
+    then resamples the series. Per-cow recurrence uses a window function
+    over the indexed raw table. Results are cached per (farm, date range);
+    an entry is dropped when a record committed in this process falls
+    inside its range. Writes by other processes (bulk_import, rollup
+    rebuilds, a sync server) show up as a new data_version(), which clears
+    the cache, and no entry outlives CACHE_TTL_SECONDS.
+    """
+
+    def __init__(self, db_manager, farm: Optional[str] = None):
+        self.db = db_manager
+        # One database per farm deployment, so the URL identifies the farm by default
+        self.farm = farm or db_manager.engine.url.render_as_string(hide_password=True)
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self._version = None
+        self._version_checked = 0.0
+        db_manager.add_record_listener(self.on_records_changed)
+        db_manager.add_update_listener(self.on_records_changed)
+
+    # ---------- Cache ----------
+    @staticmethod
+    def _bounds(start: Optional[date], end: Optional[date]) -> Tuple[datetime, datetime]:
+        """Half-open [start, end + 1 day) datetime bounds for a date range"""
+        start_dt = datetime.combine(start, datetime.min.time()) if start else datetime.min
+        end_dt = datetime.combine(end, datetime.min.time()) + timedelta(days=1) if end else datetime.max
+        return start_dt, end_dt
+
+    def _check_version(self) -> None:
+        now = time.monotonic()
+        if now - self._version_checked < VERSION_CHECK_SECONDS:
+            return
+        self._version_checked = now
+        version = self.db.data_version()
+        with self._lock:
+            if version != self._version:
+                self._cache.clear()
+                self._version = version
+
+    def _cached(self, kind: str, start, end, compute, *extra):
+        self._check_version()
+        key = (self.farm, kind, start, end) + extra
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is not None and time.monotonic() - entry[1] < CACHE_TTL_SECONDS:
+                self._cache.move_to_end(key)
+                return entry[0]
+        value = compute()
+        with self._lock:
+            self._cache[key] = (value, time.monotonic())
+            self._cache.move_to_end(key)
+            while len(self._cache) > CACHE_MAX_ENTRIES:
+                self._cache.popitem(last=False)
+        return value
+
+    def on_records_changed(self, records: List[Dict]) -> None:
+        """Invalidate only the cached ranges that contain a new, old or edited diagnosis date"""
+        dates = [pd.Timestamp(r['diagnosis_date']).to_pydatetime() for r in records if r.get('diagnosis_date') is not None]
+        if not dates:
+            return
+        with self._lock:
+            for key in list(self._cache):
+                start_dt, end_dt = self._bounds(key[2], key[3])
+                if key[1] == 'summary':
+                    # Summaries also compare against the preceding period
+                    start_dt -= end_dt - start_dt
+                if any(start_dt <= d < end_dt for d in dates):
+                    del self._cache[key]
+        # This write is accounted for; only other processes' writes should clear the whole cache
+        version = self.db.data_version()
+        with self._lock:
+            self._version = version
+
+    def clear_cache(self) -> None:
+        with self._lock:
+            self._cache.clear()
+
+    # ---------- Queries ----------
+    def _read_sql(self, sql: str, start, end) -> pd.DataFrame:
+        start_dt, end_dt = self._bounds(start, end)
+        with self.db.engine.connect() as conn:
+            return pd.read_sql(text(sql), conn, params={'start': start_dt, 'end': end_dt})
+
+    def _rollups(self, start, end, table: str = 'health_rollup_daily') -> pd.DataFrame:
+        """Per-(period, disease) counters from a rollup table"""
+        def compute():
+            start_dt, end_dt = self._bounds(start, end)
+            with self.db.engine.connect() as conn:
+                df = pd.read_sql(text(f"""
+                    SELECT period_start, disease_name, cases, mild_cases, moderate_cases,
+                           severe_cases, costed_cases, total_cost
+                    FROM {table}
+                    WHERE period_start >= :start AND period_start < :end AND cases > 0
+                """), conn, params={'start': start_dt.date(), 'end': end_dt.date()})
+            df['period_start'] = pd.to_datetime(df['period_start'])
+            return df
+        return self._cached(table, start, end, compute)
+
+    def incidence(self, start: Optional[date] = None, end: Optional[date] = None, freq: str = 'W') -> pd.DataFrame:
+        """Cases per disease per period (columns: diseases, index: period start)"""
+        def compute():
+            # Weekly rollups answer whole-week ranges directly
+            whole_weeks = start and end and start.weekday() == 0 and end.weekday() == 6
+            table = 'health_rollup_weekly' if freq == 'W' and whole_weeks else 'health_rollup_daily'
+            rollups = self._rollups(start, end, table)
+            if rollups.empty:
+                return pd.DataFrame()
+            pivot = rollups.pivot_table(index='period_start', columns='disease_name', values='cases', aggfunc='sum', fill_value=0)
+            return pivot.resample('W-MON' if freq == 'W' else freq, label='left', closed='left').sum()
+        return self._cached('incidence', start, end, compute, freq)
+
+    def cost_per_disease(self, start: Optional[date] = None, end: Optional[date] = None) -> pd.DataFrame:
+        """Total and average treatment cost per disease"""
+        def compute():
+            rollups = self._rollups(start, end)
+            if rollups.empty:
+                return pd.DataFrame(columns=['cases', 'total_cost', 'average_cost'])
+            df = rollups.groupby('disease_name')[['cases', 'costed_cases', 'total_cost']].sum()
+            df['average_cost'] = df['total_cost'] / df['costed_cases'].where(df['costed_cases'] > 0)
+            return df.drop(columns='costed_cases').sort_values('total_cost', ascending=False)
+        return self._cached('cost', start, end, compute)
+
+    def severity_mix(self, start: Optional[date] = None, end: Optional[date] = None) -> pd.DataFrame:
+        """Share of cases by severity for each disease"""
+        def compute():
+            rollups = self._rollups(start, end)
+            if rollups.empty:
+                return pd.DataFrame()
+            counts = rollups.groupby('disease_name')[['mild_cases', 'moderate_cases', 'severe_cases']].sum()
+            counts.columns = list(SEVERITY_LEVELS)
+            return counts.div(rollups.groupby('disease_name')['cases'].sum(), axis=0)
+        return self._cached('severity', start, end, compute)
+
+    def recurrence(self, start: Optional[date] = None, end: Optional[date] = None, limit: int = 50) -> pd.DataFrame:
+        """Per-cow repeat cases of the same disease, using a LAG window function"""
+        def compute():
+            return self._read_sql(f"""
+                SELECT cow_id, COUNT(*) AS cases,
+                       SUM(CASE WHEN previous_date IS NOT NULL THEN 1 ELSE 0 END) AS recurrences,
+                       COUNT(DISTINCT disease_name) AS diseases,
+                       MAX(diagnosis_date) AS last_diagnosis
+                FROM (
+                    SELECT cow_id, disease_name, diagnosis_date,
+                           LAG(diagnosis_date) OVER (
+                               PARTITION BY cow_id, disease_name ORDER BY diagnosis_date
+                           ) AS previous_date
+                    FROM cow_health_records
+                    WHERE diagnosis_date >= :start AND diagnosis_date < :end
+                ) AS history
+                GROUP BY cow_id
+                HAVING SUM(CASE WHEN previous_date IS NOT NULL THEN 1 ELSE 0 END) > 0
+                ORDER BY recurrences DESC, cases DESC
+                LIMIT {int(limit)}
+            """, start, end)
+        return self._cached('recurrence', start, end, compute, limit)
+
+    def summary(self, start: date, end: date) -> Dict:
+        """Headline metrics for a date range, compared with the preceding period"""
+        def compute():
+            daily = self._rollups(start, end)
+            previous_end = start - timedelta(days=1)
+            previous_start = previous_end - (end - start)
+            previous = self._rollups(previous_start, previous_end)
+
+            total = int(daily['cases'].sum()) if not daily.empty else 0
+            previous_total = int(previous['cases'].sum()) if not previous.empty else 0
+            by_disease = daily.groupby('disease_name')['cases'].sum() if total else pd.Series(dtype=int)
+            recurrences = self._read_sql("""
+                SELECT COUNT(*) AS recurrences
+                FROM (
+                    SELECT LAG(diagnosis_date) OVER (
+                               PARTITION BY cow_id, disease_name ORDER BY diagnosis_date
+                           ) AS previous_date
+                    FROM cow_health_records
+                    WHERE diagnosis_date >= :start AND diagnosis_date < :end
+                ) AS history
+                WHERE previous_date IS NOT NULL
+            """, start, end)['recurrences'].iloc[0]
+
+            return {
+                'total_diagnoses': total,
+                'change_pct': (total - previous_total) / previous_total * 100 if previous_total else None,
+                'most_common_disease': by_disease.idxmax() if total else None,
+                'most_common_share': by_disease.max() / total * 100 if total else 0.0,
+                'recurrence_rate': recurrences / total * 100 if total else 0.0,
+                'total_cost': float(daily['total_cost'].sum()) if total else 0.0,
+            }
+        return self._cached('summary', start, end, compute)
+
+
+@st.cache_resource
+def get_health_analytics(_db_manager) -> HealthAnalytics:
+    return HealthAnalytics(_db_manager)
@@ -1,157 +1,40 @@
+import os
+import importlib
 import streamlit as st
 from user_database import init_db, create_user, verify_user
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-
-from modules import (
-    diagnosis,
-    disease_database,
-    treatment_calculator,
-    emergency_protocol,
-    prevention_guide,
-    find_vet,
-    nutrition_advisor
-)
-
-def send_feedback_email(disease, issue):
-    sender_email = st.secrets["email"]["sender"]
-    receiver_email = st.secrets["email"]["receiver"]
-    app_password = st.secrets["email"]["app_password"]
-
-    subject = "🩺 Feedback on Disease Info - Pashu Raksha"
-    body = f"""Hello Admin,
-
-A user has submitted feedback for the disease: {disease}
-
-Issue or Suggestion:
-{issue}
-
-Please review and take necessary action.
-
-Thank you,
-Pashu Raksha App
-"""
+from feedback_outbox import enqueue_feedback
+from modules.html_fragments import FONT_SIZES, dashboard_css
+from localization import LANGUAGE_NAMES, get_texts
+from tracing import span
+
+# Page key -> (module, resources passed to its run()).
+# Modules and resources are imported on the first visit to a page, so
+# opening Emergency Protocols never loads TensorFlow, cv2 or fpdf.
+PAGES = {
+    "Diagnosis": ("modules.diagnosis", ("disease_db", "treatment_db", "image_processor", "ml_model", "language")),
+    "Disease Database": ("modules.disease_database", ("disease_db", "treatment_db", "language")),
+    "Treatment Calculator": ("modules.treatment_calculator", ("treatment_db",)),
+    "Emergency Protocols": ("modules.emergency_protocol", ("language", "font_size")),
+    "Prevention": ("modules.prevention_guide", ("language", "font_size")),
+    "Find a Vet": ("modules.find_vet", ()),
+    "Nutrition Advisor": ("modules.nutrition_advisor", ()),
+    "Health Analytics": ("modules.health_analytics", ("db_manager",)),
+    "Performance Metrics": ("modules.performance_metrics", ("ml_model_loader",)),
+}
 
-    msg = MIMEMultipart()
-    msg['From'] = sender_email
-    msg['To'] = receiver_email
-    msg['Subject'] = subject
-    msg.attach(MIMEText(body, 'plain'))
+# Users allowed to open admin pages, e.g. PASHU_ADMIN_USERS="admin,ops"
+ADMIN_USERS = {u.strip() for u in os.getenv("PASHU_ADMIN_USERS", "").split(",") if u.strip()}
+ADMIN_PAGES = {"Performance Metrics"}
 
-    try:
-        with smtplib.SMTP_SSL("smtp.gmail.com", 465) as server:
-            server.login(sender_email, app_password)
-            server.sendmail(sender_email, receiver_email, msg.as_string())
-        return True
-    except Exception as e:
-        print("Email error:", e)
-        return False
+def send_feedback_email(disease, issue):
+    """Queue feedback for delivery by the background outbox worker"""
+    return enqueue_feedback(disease, issue)
 
 def back_to_home_button(texts):
     if st.button("🔙 " + texts["home"]):
         st.session_state.page = texts["home"]
         st.rerun()
 
-LANGUAGES = {
-    "English": {
-        "login_title": "🐄 Pashu Raksha Login",
-        "welcome": "Welcome",
-        "username": "Username",
-        "password": "Password",
-        "login": "Log In",
-        "signup": "Sign Up",
-        "no_account": "Don't have an account?",
-        "have_account": "Already have an account?",
-        "logout": "Logout",
-        "account": "Account",
-        "navigation": "Navigation",
-        "choose_page": "Choose a page",
-        "language": "Language",
-        "settings": "Settings",
-        "font_size": "Font Size",
-        "home": "Home",
-        "login_success": "✅ Login successful!",
-        "logout_success": "✅ Logged out successfully!",
-        "invalid": "❌ Invalid username or password.",
-        "signup_success": "✅ Signup successful. Please login!",
-        "signup_error": "❌ Username already exists.",
-        "logged_in_as": "Logged in as",
-        "diagnosis": "Diagnosis",
-        "disease_db": "Disease Database",
-        "search": "Search Diseases",
-        "calculator": "Treatment Calculator",
-        "emergency": "Emergency Protocols",
-        "prevention": "Prevention",
-        "find_vet": "Find a Vet",
-        "nutrition": "Nutrition Advisor",
-    },
-    "தமிழ்": {
-        "login_title": "🐄 பசு ரக்ஷா உள்நுழைவு",
-        "welcome": "வரவேற்பு",
-        "username": "பயனர்பெயர்",
-        "password": "கடவுச்சொல்",
-        "login": "உள்நுழை",
-        "signup": "பதிவுசெய்",
-        "no_account": "கணக்கு இல்லையா?",
-        "have_account": "ஏற்கனவே கணக்கு உள்ளதா?",
-        "logout": "வெளியேறு",
-        "account": "கணக்கு",
-        "navigation": "வழிசெலுத்தல்",
-        "choose_page": "பக்கத்தை தேர்ந்தெடு",
-        "language": "மொழி",
-        "settings": "அமைப்புகள்",
-        "font_size": "எழுத்து அளவு",
-        "home": "முகப்பு",
-        "login_success": "✅ உள்நுழைவு வெற்றிகரமாக முடிந்தது!",
-        "logout_success": "✅ வெற்றிகரமாக வெளியேறியது!",
-        "invalid": "❌ தவறான பயனர்பெயர் அல்லது கடவுசொல்.",
-        "signup_success": "✅ பதிவு வெற்றிகரமாக முடிந்தது. தயவுசெய்து உள்நுழைக!",
-        "signup_error": "❌ பயனர்பெயர் ஏற்கனவே உள்ளது.",
-        "logged_in_as": "உள்நுழைந்தவர்",
-        "diagnosis": "நோயறிதல்",
-        "disease_db": "நோய் தரவுத்தொகுப்பு",
-        "search": "நோய்கள் தேடு",
-        "calculator": "சிகிச்சை கணிப்பான்",
-        "emergency": "அவசர நெறிமுறைகள்",
-        "prevention": "முன்கூட்டிய தடுப்பு",
-        "find_vet": "வெட்னரியை காண்க",
-        "nutrition": "மீன்ஊட்டம் ஆலோசகர்",
-    },
-    "हिन्दी": {
-        "login_title": "🐄 पशु रक्षा लॉगिन",
-        "welcome": "स्वागत है",
-        "username": "यूज़रनेम",
-        "password": "पासवर्ड",
-        "login": "लॉग इन",
-        "signup": "साइन अप",
-        "no_account": "अकाउंट नहीं है?",
-        "have_account": "पहले से अकाउंट है?",
-        "logout": "लॉगआउट",
-        "account": "खाता",
-        "navigation": "नेविगेशन",
-        "choose_page": "पृष्ठ चुनें",
-        "language": "भाषा",
-        "settings": "सेटिंग्स",
-        "font_size": "फ़ॉन्ट साइज",
-        "home": "मुख्यपृष्ठ",
-        "login_success": "✅ लॉगिन सफल!",
-        "logout_success": "✅ लॉगआउट सफल!",
-        "invalid": "❌ गलत यूज़रनेम या पासवर्ड।",
-        "signup_success": "✅ साइनअप सफल! कृपया लॉगिन करें।",
-        "signup_error": "❌ यूज़रनेम पहले से मौजूद है।",
-        "logged_in_as": "लॉग इन उपयोगकर्ता",
-        "diagnosis": "बीमारी का विश्लेषण",
-        "disease_db": "बीमारी डेटाबेस",
-        "search": "बीमारियाँ खोजें",
-        "calculator": "उपचार कैलकुलेटर",
-        "emergency": "आपातकालीन प्रोटोकॉल",
-        "prevention": "रोकथाम",
-        "find_vet": "पशु चिकित्सक खोजें",
-        "nutrition": "पोषण सलाहकार",
-    }
-}
-
 if "logged_in" not in st.session_state:
     st.session_state.logged_in = False
 if "username" not in st.session_state:
@@ -162,14 +45,66 @@ if "page" not in st.session_state:
     st.session_state.page = "Home"
 if "signup_mode" not in st.session_state:
     st.session_state.signup_mode = False
+if "font_size" not in st.session_state:
+    st.session_state.font_size = "Medium"
 
 @st.cache_resource
-def load_resources():
+def load_disease_db():
     from disease_database import DiseaseDatabase
+    return DiseaseDatabase()
+
+@st.cache_resource
+def load_treatment_db():
     from treatment_database import TreatmentDatabase
+    return TreatmentDatabase()
+
+@st.cache_resource
+def load_image_processor():
     from image_processor import ImageProcessor
+    return ImageProcessor()
+
+@st.cache_resource
+def load_ml_model():
+    # One model copy for every session; requests are micro-batched on a worker thread.
+    # PASHU_INFERENCE_PROCESSES=N serves batches from N processes sharing the mmap'd weights
+    from inference_worker import InferenceService
+    synthetic = os.getenv("PASHU_SYNTHETIC_MODEL_MS")
+    if synthetic:
+        # Load testing: "call_ms,item_ms" stand-in that costs time like a forward pass, no TensorFlow
+        from inference_worker import SyntheticModel
+        return InferenceService(SyntheticModel(*map(float, synthetic.split(","))))
+    processes = int(os.getenv("PASHU_INFERENCE_PROCESSES", "0"))
+    if processes > 0:
+        from ml_model import MultiProcessCowDiseaseModel
+        return InferenceService(MultiProcessCowDiseaseModel(processes), dispatchers=processes)
     from ml_model import CowDiseaseModel
-    return DiseaseDatabase(), TreatmentDatabase(), ImageProcessor(), CowDiseaseModel()
+    return InferenceService(CowDiseaseModel())
+
+def load_db_manager():
+    from database import get_database_manager
+    return get_database_manager()
+
+RESOURCE_LOADERS = {
+    "disease_db": load_disease_db,
+    "treatment_db": load_treatment_db,
+    "image_processor": load_image_processor,
+    "ml_model": load_ml_model,
+    "db_manager": load_db_manager,
+    # The loader itself, for pages that only need the model on demand
+    "ml_model_loader": lambda: load_ml_model,
+    # Settings, for pages whose rendered HTML is cached per language and font size
+    "language": lambda: st.session_state.language,
+    "font_size": lambda: st.session_state.font_size,
+}
+
+def run_page(page_key):
+    """Import a page module on first use and run it with the resources it needs"""
+    module_name, resource_names = PAGES[page_key]
+    with span(f"page:{page_key}"):
+        with span("load_page"):
+            page = importlib.import_module(module_name)
+            resources = [RESOURCE_LOADERS[name]() for name in resource_names]
+        page.run(*resources)
 
 def show_login(texts):
     st.set_page_config(page_title=texts["login_title"], layout="centered")
@@ -207,23 +142,34 @@ def show_signup(texts):
         st.session_state.signup_mode = False
         st.rerun()
 
+def show_field_sync():
+    """Sidebar status of diagnoses captured offline on this device"""
+    from field_sync import get_capture_queue, get_sync_engine
+    st.markdown("---")
+    st.markdown("## 📡 Field Sync")
+    status = get_capture_queue().status()
+    st.markdown(f"Waiting to upload: **{status.get('pending', 0)}** records, "
+                f"**{status['images_pending']}** photos")
+    if os.getenv("PASHU_SYNC_URL") and st.button("🔄 Sync Now"):
+        try:
+            stats = get_sync_engine().sync()
+            st.success(f"Uploaded {stats['records']} records and {stats['images']} photos "
+                       f"({stats['bytes_sent'] / 1024:.0f} KB)")
+            if stats['conflicts']:
+                st.warning(f"{stats['conflicts']} records were changed on the server; the server's version was kept.")
+        except Exception as e:
+            st.error(f"Sync failed, records stay queued: {e}")
+
 def show_dashboard(texts):
     st.set_page_config(page_title="Pashu Raksha", layout="wide")
 
-    st.markdown("""
-    <style>
-    html, body, [class*="css"]  {
-        font-family: 'Segoe UI', sans-serif;
-        background-color: #F8FAFC;
-    }
-    </style>
-    """, unsafe_allow_html=True)
-
     with st.sidebar:
         st.markdown(f"## 👤 {texts['account']}")
         st.markdown(f"{texts['logged_in_as']}: **{st.session_state.username}**")
 
         if st.button(f"🔓 {texts['logout']}"):
+            from session_store import release_session_objects
+            release_session_objects()
             st.session_state.logged_in = False
             st.session_state.username = ""
             st.success(texts["logout_success"])
@@ -232,29 +178,21 @@ def show_dashboard(texts):
         st.markdown("---")
         st.markdown(f"## 🌐 {texts['language']}")
         st.session_state.language = st.selectbox(
-            "", list(LANGUAGES.keys()), index=list(LANGUAGES).index(st.session_state.language)
+            "", LANGUAGE_NAMES, index=LANGUAGE_NAMES.index(st.session_state.language)
         )
 
         st.markdown(f"## ⚙️ {texts['settings']}")
-        font_size = st.radio(f"{texts['font_size']}", ["Small", "Medium", "Large"], index=1)
-
-        font_css = {
-            "Small": "14px",
-            "Medium": "17px",
-            "Large": "20px"
-        }
-        st.markdown(f"""
-            <style>
-            html, body, [class*="css"]  {{
-                font-size: {font_css[font_size]} !important;
-            }}
-            </style>
-        """, unsafe_allow_html=True)
-
-    texts = LANGUAGES[st.session_state.language]
-    st.markdown(f"### 👋 {texts['welcome']}, **{st.session_state.username}**")
+        st.radio(f"{texts['font_size']}", list(FONT_SIZES), key="font_size")
 
-    disease_db, treatment_db, image_processor, ml_model = load_resources()
+        from field_sync import offline_capture_enabled
+        if offline_capture_enabled():
+            show_field_sync()
+
+    # One cached <style> block per font size instead of re-building the CSS on every rerun
+    st.markdown(dashboard_css(st.session_state.font_size), unsafe_allow_html=True)
+
+    texts = get_texts(st.session_state.language)
+    st.markdown(f"### 👋 {texts['welcome']}, **{st.session_state.username}**")
 
     if st.session_state.page == texts["home"]:
         st.markdown("### ✨ Choose a feature to continue:")
@@ -266,50 +204,39 @@ def show_dashboard(texts):
             (texts["emergency"], "🚨", "Emergency Protocols"),
             (texts["prevention"], "🛡️", "Prevention"),
             (texts["find_vet"], "🧰", "Find a Vet"),
-            (texts["nutrition"], "🥗", "Nutrition Advisor")
+            (texts["nutrition"], "🥗", "Nutrition Advisor"),
+            (texts["analytics"], "📊", "Health Analytics")
         ]
 
+        if st.session_state.username in ADMIN_USERS:
+            features.append(("Performance Metrics", "📈", "Performance Metrics"))
+
         for label, emoji, page_key in features:
             if st.button(f"{emoji} {label}", key=label):
                 st.session_state.page = page_key
                 st.rerun()
 
-    elif st.session_state.page == "Diagnosis":
-        back_to_home_button(texts)
-        diagnosis.run(disease_db, treatment_db, image_processor, ml_model)
-
-    elif st.session_state.page == "Disease Database":
+    elif st.session_state.page in ADMIN_PAGES and st.session_state.username not in ADMIN_USERS:
         back_to_home_button(texts)
-        disease_database.run(disease_db, treatment_db)
+        st.error("This page is only available to administrators.")
 
-    elif st.session_state.page == "Treatment Calculator":
+    elif st.session_state.page in PAGES:
         back_to_home_button(texts)
-        treatment_calculator.run(disease_db, treatment_db)
-
-    elif st.session_state.page == "Emergency Protocols":
-        back_to_home_button(texts)
-        emergency_protocol.run()
-
-    elif st.session_state.page == "Prevention":
-        back_to_home_button(texts)
-        prevention_guide.run(disease_db, treatment_db)
-
-    elif st.session_state.page == "Find a Vet":
-        back_to_home_button(texts)
-        find_vet.run()
-
-    elif st.session_state.page == "Nutrition Advisor":
-        back_to_home_button(texts)
-        nutrition_advisor.run()
+        run_page(st.session_state.page)
 
 if __name__ == "__main__":
     init_db()
-    texts = LANGUAGES[st.session_state.language]
-
-    if not st.session_state.logged_in:
-        if st.session_state.signup_mode:
-            show_signup(texts)
+    if os.getenv("PASHU_METRICS_PORT"):
+        from instrumentation import start_metrics_server
+        start_metrics_server()
+    texts = get_texts(st.session_state.language)
+
+    # One trace per script run; page handlers, database calls and model calls nest under it
+    with span("script_run", page=st.session_state.page if st.session_state.logged_in else "login"):
+        if not st.session_state.logged_in:
+            if st.session_state.signup_mode:
+                show_signup(texts)
+            else:
+                show_login(texts)
         else:
-            show_login(texts)
-    else:
-        show_dashboard(texts)
+            show_dashboard(texts)
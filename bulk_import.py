@@ -0,0 +1,235 @@
+import os
+import time
+import argparse
+import numpy as np
+import pandas as pd
+from typing import Dict, Iterator, Optional, Tuple
+
+from database import CowHealthRecord, SEVERITY_LEVELS
+
+REQUIRED_COLUMNS = ['cow_id', 'diagnosis_date', 'disease_name', 'severity']
+COST_COLUMNS = ['medication_cost', 'labor_cost', 'supplies_cost', 'total_cost']
+TEXT_COLUMNS = ['symptoms', 'treatment_applied', 'veterinarian', 'notes', 'image_filename']
+
+# Spellings found in paper and spreadsheet records, mapped to SEVERITY_LEVELS
+SEVERITY_ALIASES = {
+    'mild': 'mild', 'low': 'mild', 'minor': 'mild',
+    'moderate': 'moderate', 'medium': 'moderate', 'mod': 'moderate',
+    'severe': 'severe', 'high': 'severe', 'critical': 'severe', 'very high': 'severe',
+}
+
+# Column names accepted in source files, mapped to CowHealthRecord columns
+COLUMN_ALIASES = {
+    'cow': 'cow_id', 'tag': 'cow_id', 'tag_number': 'cow_id',
+    'date': 'diagnosis_date', 'diagnosed_on': 'diagnosis_date',
+    'disease': 'disease_name', 'diagnosis': 'disease_name',
+    'confidence': 'confidence_score',
+    'treatment': 'treatment_applied',
+    'cost': 'total_cost', 'vet': 'veterinarian',
+    'weight': 'weight_kg',
+}
+
+
+def _string_limits() -> Dict[str, int]:
+    """Maximum lengths of the String columns of CowHealthRecord"""
+    return {
+        column.name: column.type.length
+        for column in CowHealthRecord.__table__.columns
+        if getattr(column.type, 'length', None)
+    }
+
+
+def iter_record_chunks(path: str, chunksize: int = 50000) -> Iterator[pd.DataFrame]:
+    """Read a CSV, Excel or JSONL file as DataFrame chunks of raw strings"""
+    ext = os.path.splitext(path)[1].lower()
+    if ext == '.csv':
+        yield from pd.read_csv(path, dtype=str, keep_default_na=False, chunksize=chunksize)
+    elif ext in ('.jsonl', '.ndjson'):
+        yield from pd.read_json(path, lines=True, dtype=False, chunksize=chunksize)
+    elif ext in ('.xlsx', '.xls'):
+        df = pd.read_excel(path, dtype=str, keep_default_na=False)
+        for start in range(0, len(df), chunksize):
+            yield df.iloc[start:start + chunksize]
+    else:
+        raise ValueError(f"Unsupported file type: {ext}")
+
+
+def normalize_records(raw: pd.DataFrame, dayfirst: bool = False) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Validate and coerce a chunk of raw records.
+
+    Args:
+        raw: DataFrame as read from the source file
+        dayfirst: Parse ambiguous dates such as 03/04/2021 as day/month
+
+    Returns:
+        (clean, rejects) where clean holds CowHealthRecord columns ready for
+        insertion and rejects holds the original rows plus an 'error' column
+    """
+    df = raw.copy()
+    df.columns = [str(c).strip().lower().replace(' ', '_') for c in df.columns]
+    df = df.rename(columns={k: v for k, v in COLUMN_ALIASES.items() if v not in df.columns})
+
+    errors = pd.Series('', index=df.index)
+
+    def flag(mask, message):
+        nonlocal errors
+        errors = errors.where(~mask, errors + message + '; ')
+
+    for column in REQUIRED_COLUMNS:
+        if column not in df.columns:
+            df[column] = ''
+    for column in COST_COLUMNS + TEXT_COLUMNS + ['confidence_score', 'weight_kg']:
+        if column not in df.columns:
+            df[column] = np.nan
+
+    text = {c: df[c].astype('string').str.strip().replace('', pd.NA) for c in REQUIRED_COLUMNS + TEXT_COLUMNS}
+
+    for column in ('cow_id', 'disease_name'):
+        flag(text[column].isna(), f'missing {column}')
+    for column, length in _string_limits().items():
+        if column in text:
+            flag(text[column].str.len().fillna(0).gt(length), f'{column} longer than {length}')
+
+    dates = pd.to_datetime(text['diagnosis_date'], errors='coerce', dayfirst=dayfirst, format='mixed')
+    flag(dates.isna(), 'invalid diagnosis_date')
+    flag(dates > pd.Timestamp.now(), 'diagnosis_date in the future')
+
+    severity = text['severity'].str.lower().map(SEVERITY_ALIASES)
+    flag(severity.isna(), f"severity must be one of {', '.join(SEVERITY_LEVELS)}")
+
+    numbers = {}
+    for column in COST_COLUMNS + ['confidence_score', 'weight_kg']:
+        given = df[column].astype('string').str.strip().fillna('').ne('')
+        numbers[column] = pd.to_numeric(df[column], errors='coerce')
+        flag(given & numbers[column].isna(), f'{column} is not a number')
+        flag(numbers[column].lt(0), f'{column} is negative')
+    flag(numbers['confidence_score'].gt(1), 'confidence_score above 1')
+
+    parts = numbers['medication_cost'].fillna(0) + numbers['labor_cost'].fillna(0) + numbers['supplies_cost'].fillna(0)
+    has_parts = numbers['medication_cost'].notna() | numbers['labor_cost'].notna() | numbers['supplies_cost'].notna()
+    total = numbers['total_cost'].where(numbers['total_cost'].notna() | ~has_parts, parts)
+
+    now = pd.Timestamp.now()
+    clean = pd.DataFrame({
+        'cow_id': text['cow_id'],
+        'diagnosis_date': dates,
+        'disease_name': text['disease_name'],
+        'severity': severity,
+        'confidence_score': numbers['confidence_score'],
+        'symptoms': text['symptoms'],
+        'treatment_applied': text['treatment_applied'],
+        'medication_cost': numbers['medication_cost'],
+        'labor_cost': numbers['labor_cost'],
+        'supplies_cost': numbers['supplies_cost'],
+        'total_cost': total,
+        'weight_kg': numbers['weight_kg'],
+        'veterinarian': text['veterinarian'],
+        'notes': text['notes'],
+        'image_filename': text['image_filename'],
+        'created_at': now,
+        'updated_at': now,
+    })
+
+    bad = errors.ne('')
+    rejects = raw.loc[bad.values].copy()
+    rejects['error'] = errors[bad].str.rstrip('; ').values
+    return clean[~bad], rejects
+
+
+def _to_rows(clean: pd.DataFrame) -> list:
+    """Convert a clean DataFrame into dicts with None instead of NaN/NaT"""
+    clean = clean.astype(object).where(clean.notna(), None)
+    for column in ('diagnosis_date', 'created_at', 'updated_at'):
+        clean[column] = [v.to_pydatetime() if v is not None else None for v in clean[column]]
+    return clean.to_dict('records')
+
+
+def import_records(path: str, db_manager, batch_size: int = 1000, reject_path: Optional[str] = None,
+                   use_copy: bool = True, dayfirst: bool = False, chunksize: int = 50000) -> Dict:
+    """
+    Import historical health records from a CSV/Excel/JSONL file.
+
+    Rows that fail validation or insertion are written to reject_path
+    (defaults to <path>.rejects.csv) instead of aborting the import.
+    Chunks whose COPY fails are inserted in batches instead; stats counts
+    them in copy_fallbacks and keeps the last error in copy_error.
+    """
+    reject_path = reject_path or f"{os.path.splitext(path)[0]}.rejects.csv"
+    copy_enabled = use_copy and db_manager.engine.dialect.name == 'postgresql'
+
+    stats = {'read': 0, 'inserted': 0, 'rejected': 0, 'seconds': 0.0, 'rows_per_sec': 0.0,
+             'reject_file': None, 'copy_fallbacks': 0, 'copy_error': None}
+    reject_header = True
+    started = time.perf_counter()
+
+    if os.path.exists(reject_path):
+        os.remove(reject_path)
+
+    for chunk_number, raw in enumerate(iter_record_chunks(path, chunksize)):
+        raw = raw.reset_index(drop=True)
+        raw.index = raw.index + chunk_number * chunksize
+        stats['read'] += len(raw)
+
+        clean, rejects = normalize_records(raw, dayfirst=dayfirst)
+
+        inserted = None
+        if copy_enabled and not clean.empty:
+            try:
+                inserted = db_manager.copy_health_records(clean)
+            except Exception as e:
+                stats['copy_fallbacks'] += 1
+                stats['copy_error'] = str(e)
+
+        if inserted is None and not clean.empty:
+            inserted, failures = db_manager.add_health_records_bulk(_to_rows(clean), batch_size=batch_size)
+            if failures:
+                failed_index = clean.index[[i for i, _ in failures]]
+                failed = raw.loc[failed_index].copy()
+                failed['error'] = [error for _, error in failures]
+                rejects = pd.concat([rejects, failed])
+
+        stats['inserted'] += inserted or 0
+
+        if not rejects.empty:
+            rejects.insert(0, 'source_row', rejects.index + 1)
+            rejects.to_csv(reject_path, mode='a', header=reject_header, index=False)
+            reject_header = False
+            stats['rejected'] += len(rejects)
+            stats['reject_file'] = reject_path
+
+    stats['seconds'] = time.perf_counter() - started
+    stats['rows_per_sec'] = stats['inserted'] / stats['seconds'] if stats['seconds'] else 0.0
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk import historical cow health records")
+    parser.add_argument("path", help="CSV, Excel (.xlsx/.xls) or JSONL file")
+    parser.add_argument("--batch-size", type=int, default=1000, help="Rows per INSERT transaction")
+    parser.add_argument("--rejects", help="Where to write rejected rows (CSV)")
+    parser.add_argument("--dayfirst", action="store_true", help="Parse dates as day/month/year")
+    parser.add_argument("--no-copy", action="store_true", help="Disable Postgres COPY")
+    args = parser.parse_args()
+
+    from database import DatabaseManager
+
+    stats = import_records(
+        args.path,
+        DatabaseManager(),
+        batch_size=args.batch_size,
+        reject_path=args.rejects,
+        use_copy=not args.no_copy,
+        dayfirst=args.dayfirst
+    )
+    print(f"✅ Imported {stats['inserted']} of {stats['read']} rows "
+          f"in {stats['seconds']:.1f}s ({stats['rows_per_sec']:.0f} rows/sec)")
+    if stats['copy_fallbacks']:
+        print(f"⚠️ COPY failed for {stats['copy_fallbacks']} chunks, which were inserted in batches instead: "
+              f"{stats['copy_error']}")
+    if stats['rejected']:
+        print(f"⚠️ {stats['rejected']} rows rejected, see {stats['reject_file']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""Fit temperature scaling and the cascade exit threshold on the validation split.
+
+Run from the project root:  python -m cow_disease_model.calibrate
+Writes trained_model.calibration.json next to the model, which CowDiseaseModel loads.
+
+The saved settings are fitted on the whole validation split. The ECE and
+cascade figures printed are cross-fitted: each fold is scored with
+temperatures and a cascade target fitted on the other folds, so they are
+not measured on the images the settings were tuned to.
+"""
+import json
+import time
+import argparse
+
+import numpy as np
+from PIL import Image
+
+from ml_model import CowDiseaseModel, apply_temperature, fit_temperature, expected_calibration_error
+from cow_disease_model.splits import DATASET_PATH, validation_split
+
+CASCADE_TARGETS = (0.6, 0.7, 0.8, 0.9, 0.95, 0.99)
+
+
+def predict_all(predict_on_batch, images, size: int):
+    """(N, C) probabilities and mean seconds per image at the given input size"""
+    preds = []
+    started = time.perf_counter()
+    for img in images:
+        batch = (np.asarray(img.resize((size, size)), dtype=np.float32) / 255.0)[np.newaxis]
+        preds.append(np.asarray(predict_on_batch(batch))[0])
+    return np.stack(preds), (time.perf_counter() - started) / len(images)
+
+
+def fold_ids(labels: np.ndarray, folds: int, seed: int = 0) -> np.ndarray:
+    """Fold number per sample, spreading each class evenly across the folds"""
+    rng = np.random.default_rng(seed)
+    ids = np.empty(len(labels), dtype=int)
+    for label in np.unique(labels):
+        members = rng.permutation(np.flatnonzero(labels == label))
+        ids[members] = np.arange(len(members)) % folds
+    return ids
+
+
+def cross_fit_temperature(preds: np.ndarray, labels: np.ndarray, folds: np.ndarray) -> np.ndarray:
+    """Calibrated probabilities where each fold is scaled by a temperature fitted on the other folds"""
+    calibrated = np.empty_like(preds)
+    for fold in np.unique(folds):
+        held_out = folds == fold
+        temperature = fit_temperature(preds[~held_out], labels[~held_out])
+        calibrated[held_out] = apply_temperature(preds[held_out], temperature)
+    return calibrated
+
+
+def cascade_report(full: np.ndarray, small: np.ndarray, labels: np.ndarray, target: float, cost_ratio: float):
+    exits = small.max(axis=1) >= target
+    chosen = np.where(exits[:, None], small, full)
+    return {
+        'target': target,
+        'early_exit': float(exits.mean()),
+        'accuracy': float((chosen.argmax(axis=1) == labels).mean()),
+        'relative_cost': float(cost_ratio + (1 - exits.mean())),
+    }
+
+
+def choose_target(full: np.ndarray, small: np.ndarray, labels: np.ndarray, cost_ratio: float, max_drop: float):
+    """Lowest cascade target whose accuracy stays within max_drop of the full model; the table of all targets"""
+    full_accuracy = float((full.argmax(axis=1) == labels).mean())
+    reports = [cascade_report(full, small, labels, t, cost_ratio) for t in CASCADE_TARGETS]
+    acceptable = [r for r in reports if r['accuracy'] >= full_accuracy - max_drop]
+    return (acceptable[0] if acceptable else reports[-1]), reports
+
+
+def cross_fit_cascade(full: np.ndarray, small: np.ndarray, labels: np.ndarray, folds: np.ndarray,
+                      cost_ratio: float, max_drop: float):
+    """Early exit and accuracy of the target-selection rule, each fold scored with a target chosen on the others"""
+    exits = correct = 0
+    for fold in np.unique(folds):
+        held_out = folds == fold
+        chosen, _ = choose_target(full[~held_out], small[~held_out], labels[~held_out], cost_ratio, max_drop)
+        report = cascade_report(full[held_out], small[held_out], labels[held_out], chosen['target'], cost_ratio)
+        exits += report['early_exit'] * held_out.sum()
+        correct += report['accuracy'] * held_out.sum()
+    return {'early_exit': float(exits / len(labels)), 'accuracy': float(correct / len(labels)),
+            'relative_cost': float(cost_ratio + 1 - exits / len(labels))}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fit calibration and cascade settings for the disease model")
+    parser.add_argument("--dataset", default=DATASET_PATH)
+    parser.add_argument("--split", type=float, default=0.2)
+    parser.add_argument("--cascade-size", type=int, default=112, help="Input size of the cheap first pass")
+    parser.add_argument("--max-accuracy-drop", type=float, default=0.01,
+                        help="Lowest cascade target whose accuracy stays within this of the full model is chosen")
+    parser.add_argument("--folds", type=int, default=5, help="Folds for the cross-fitted ECE and cascade figures")
+    args = parser.parse_args()
+
+    model = CowDiseaseModel()
+    if not model.model_loaded:
+        raise SystemExit("Model not available; train it with cow_disease_model/train_model.py first")
+
+    samples = validation_split(args.dataset, args.split)
+    images = [Image.open(path).convert("RGB") for path, _ in samples]
+    labels = np.array([label for _, label in samples])
+
+    small_model = model.build_resized_model(args.cascade_size)
+    full, full_seconds = predict_all(model.model.predict_on_batch, images, 224)
+    small, small_seconds = predict_all(small_model.predict_on_batch, images, args.cascade_size)
+
+    # Settings to save: fitted on every validation image
+    temperature = fit_temperature(full, labels)
+    small_temperature = fit_temperature(small, labels)
+    # Figures to report: every image calibrated by temperatures fitted without it
+    folds = fold_ids(labels, args.folds)
+    full_cal = cross_fit_temperature(full, labels, folds)
+    small_cal = cross_fit_temperature(small, labels, folds)
+    cost_ratio = small_seconds / full_seconds
+
+    full_accuracy = float((full.argmax(axis=1) == labels).mean())
+    print(f"{len(samples)} validation images, full-model accuracy {full_accuracy:.1%}; "
+          f"calibrated figures cross-fitted over {args.folds} folds")
+    print(f"224x224: T={temperature:.3f}  ECE {expected_calibration_error(full, labels):.3f} -> "
+          f"{expected_calibration_error(full_cal, labels):.3f}")
+    print(f"{args.cascade_size}x{args.cascade_size}: T={small_temperature:.3f}  "
+          f"ECE {expected_calibration_error(small, labels):.3f} -> "
+          f"{expected_calibration_error(small_cal, labels):.3f}  "
+          f"({cost_ratio:.0%} of the full pass latency)")
+
+    print(f"\n{'target':>7} {'early exit':>11} {'accuracy':>9} {'cost':>6}")
+    chosen, reports = choose_target(full_cal, small_cal, labels, cost_ratio, args.max_accuracy_drop)
+    for r in reports:
+        print(f"{r['target']:>7.2f} {r['early_exit']:>11.1%} {r['accuracy']:>9.1%} {r['relative_cost']:>6.2f}")
+    held_out = cross_fit_cascade(full_cal, small_cal, labels, folds, cost_ratio, args.max_accuracy_drop)
+
+    calibration = {
+        'temperature': temperature,
+        'cascade': {'size': args.cascade_size, 'temperature': small_temperature, 'target': chosen['target']},
+        'validation_images': len(samples),
+        'held_out': {'folds': args.folds, 'ece': expected_calibration_error(full_cal, labels), **held_out},
+        'fitted_at': time.strftime("%Y-%m-%d %H:%M:%S"),
+    }
+    with open(model.calibration_path, "w") as f:
+        json.dump(calibration, f, indent=2)
+    print(f"\nCascade target {chosen['target']:.2f}. With the target chosen on the other folds, "
+          f"{held_out['early_exit']:.0%} of held-out images exit early at {held_out['accuracy']:.1%} accuracy "
+          f"(full model {full_accuracy:.1%}), {held_out['relative_cost']:.2f}x the compute of the full model")
+    print(f"✅ Calibration written to {model.calibration_path}")
+
+
+if __name__ == "__main__":
+    main()
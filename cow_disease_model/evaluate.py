@@ -0,0 +1,80 @@
+"""Evaluate the trained model on the validation split.
+
+Run from the project root:  python -m cow_disease_model.evaluate
+"""
+import time
+import argparse
+from typing import Dict, List, Tuple
+
+import numpy as np
+from PIL import Image
+
+from ml_model import CowDiseaseModel, TTA_VIEWS_BY_QUALITY
+from image_processor import ImageProcessor
+from cow_disease_model.splits import DATASET_PATH, validation_split
+
+
+def evaluate(model: CowDiseaseModel, samples: List[Tuple[Image.Image, Dict, int]], views) -> Dict:
+    """views(quality) -> number of TTA views for an image"""
+    correct = covered = total_views = 0
+    latencies = []
+    for img, quality, label in samples:
+        k = views(quality)
+        started = time.perf_counter()
+        preds = model.calibrated(model.predict_proba_batch(model.preprocess_views(img, k)))
+        latencies.append(time.perf_counter() - started)
+        correct += int(np.argmax(preds) == label)
+        covered += int(preds.max() >= model.confidence_threshold)
+        total_views += k
+    n = len(samples)
+    return {
+        'accuracy': correct / n,
+        'coverage': covered / n,
+        'mean_views': total_views / n,
+        'mean_ms': float(np.mean(latencies)) * 1000,
+        'p95_ms': float(np.percentile(latencies, 95)) * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Accuracy vs latency of test-time augmentation on the validation split")
+    parser.add_argument("--dataset", default=DATASET_PATH)
+    parser.add_argument("--split", type=float, default=0.2)
+    args = parser.parse_args()
+
+    model = CowDiseaseModel()
+    if not model.model_loaded:
+        raise SystemExit("Model not available; train it with cow_disease_model/train_model.py first")
+    processor = ImageProcessor()
+
+    samples = []
+    for path, label in validation_split(args.dataset, args.split):
+        img = Image.open(path).convert("RGB")
+        samples.append((img, processor.detect_image_quality(img), label))
+    model.predict_proba_batch(model.preprocess_views(samples[0][0], 8))  # warm up
+
+    max_views = max(TTA_VIEWS_BY_QUALITY.values())
+    modes = {
+        'single pass': lambda quality: 1,
+        'adaptive TTA': lambda quality: TTA_VIEWS_BY_QUALITY.get(quality.get('overall_quality'),
+                                                                TTA_VIEWS_BY_QUALITY['unknown']),
+        f'TTA x{max_views}': lambda quality: max_views,
+    }
+    results = {name: evaluate(model, samples, views) for name, views in modes.items()}
+
+    qualities = [q.get('overall_quality') for _, q, _ in samples]
+    print(f"{len(samples)} validation images; quality: "
+          + ", ".join(f"{q} {qualities.count(q)}" for q in sorted(set(qualities), key=str)))
+    print(f"{'mode':<14} {'accuracy':>9} {'coverage':>9} {'views':>6} {'mean ms':>8} {'p95 ms':>8}")
+    for name, r in results.items():
+        print(f"{name:<14} {r['accuracy']:>9.1%} {r['coverage']:>9.1%} {r['mean_views']:>6.1f} "
+              f"{r['mean_ms']:>8.1f} {r['p95_ms']:>8.1f}")
+    base = results['single pass']
+    for name, r in list(results.items())[1:]:
+        print(f"{name}: {(r['accuracy'] - base['accuracy']) * 100:+.1f} pts accuracy, "
+              f"{(r['coverage'] - base['coverage']) * 100:+.1f} pts coverage for "
+              f"{r['mean_ms'] / base['mean_ms']:.1f}x latency")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,27 @@
+"""The training dataset layout and the train/validation split used by train_model.py."""
+import os
+from typing import List, Tuple
+
+DATASET_PATH = os.path.join("cow_disease_model", "dataset")
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp")
+
+
+def dataset_files(dataset_path: str = DATASET_PATH, split: float = 0.2) -> List[Tuple[str, str, int, str]]:
+    """(path, class name, label, subset) per image.
+
+    ImageDataGenerator(validation_split=split) holds out the first split of
+    each sorted class folder, so those files are the validation subset.
+    """
+    files = []
+    class_names = sorted(c for c in os.listdir(dataset_path) if os.path.isdir(os.path.join(dataset_path, c)))
+    for label, class_name in enumerate(class_names):
+        folder = os.path.join(dataset_path, class_name)
+        names = sorted(f for f in os.listdir(folder) if f.lower().endswith(IMAGE_EXTENSIONS))
+        n_validation = int(len(names) * split)
+        files.extend((os.path.join(folder, name), class_name, label, "validation" if i < n_validation else "training")
+                     for i, name in enumerate(names))
+    return files
+
+
+def validation_split(dataset_path: str = DATASET_PATH, split: float = 0.2) -> List[Tuple[str, int]]:
+    return [(path, label) for path, _, label, subset in dataset_files(dataset_path, split) if subset == "validation"]
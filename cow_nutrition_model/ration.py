@@ -0,0 +1,242 @@
+import os
+import time
+import argparse
+from io import StringIO
+from functools import lru_cache
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .utils import categorize_ages
+
+FEED_INVENTORY_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "feed_inventory.csv")
+NUTRIENTS = ("me", "cp", "ca", "p")
+# Animals are grouped on these bucket widths; requirements use the bucket's upper edge
+WEIGHT_BUCKET_KG = 25
+MILK_BUCKET_L = 2
+DEFAULT_WEIGHT_KG = {"Calf": 80, "Growing": 250, "Adult": 400, "Senior": 400, "Unknown": 400}
+DMI_TOLERANCE = 0.05
+MIN_NDF_SHARE = 0.28
+
+
+def animal_requirements(herd: pd.DataFrame) -> pd.DataFrame:
+    """Daily dry-matter intake and nutrient needs per animal.
+
+    Field rules of thumb, not a full NRC model:
+      DMI   2% of body weight (2.8% while growing) + 0.3 kg per litre of milk
+      ME    0.55 MJ x BW^0.75 maintenance + 5.2 MJ/l milk, +18 MJ pregnant, +0.1 MJ/kg BW growing
+      CP    0.6 g/kg BW + 85 g/l milk, +200 g pregnant; 16% of DMI while growing
+      Ca/P  40/28 mg per kg BW + 2.8/1.7 g per litre of milk
+    """
+    age_group = categorize_ages(herd["age"]) if "age" in herd else pd.Series("Unknown", index=herd.index)
+    stage = herd["stage"].astype("string").str.strip().str.lower() if "stage" in herd else pd.Series("", index=herd.index)
+    weight = pd.to_numeric(herd.get("weight"), errors="coerce") if "weight" in herd else pd.Series(np.nan, index=herd.index)
+    weight = weight.fillna(age_group.map(DEFAULT_WEIGHT_KG)).astype(float)
+    milk = pd.to_numeric(herd["milk_yield"], errors="coerce").fillna(0.0) if "milk_yield" in herd else 0.0 * weight
+
+    growing = age_group.isin(["Calf", "Growing"]).to_numpy() | stage.isin(["calf", "growing"]).fillna(False).to_numpy()
+    pregnant = stage.eq("pregnant").fillna(False).to_numpy()
+    dmi = np.where(growing, 0.028, 0.02) * weight + 0.3 * milk
+    return pd.DataFrame({
+        "dmi": dmi,
+        "me": 0.55 * weight ** 0.75 + 5.2 * milk + 18 * pregnant + 0.1 * weight * growing,
+        "cp": np.where(growing, 0.16 * dmi, 0.0006 * weight + 0.085 * milk + 0.2 * pregnant),
+        "ca": 0.04 * weight + 2.8 * milk,
+        "p": 0.028 * weight + 1.7 * milk,
+    }, index=herd.index)
+
+
+def group_herd(herd: pd.DataFrame) -> Tuple[pd.Series, pd.DataFrame]:
+    """(group id per animal, one row per group with head count and requirements)"""
+    keys = pd.DataFrame({
+        "age_group": categorize_ages(herd["age"]) if "age" in herd else "Unknown",
+        "stage": herd["stage"].astype("string").str.strip().str.title() if "stage" in herd else "",
+        "weight": np.ceil(pd.to_numeric(herd.get("weight"), errors="coerce") / WEIGHT_BUCKET_KG) * WEIGHT_BUCKET_KG
+        if "weight" in herd else np.nan,
+        "milk_yield": np.ceil(pd.to_numeric(herd.get("milk_yield"), errors="coerce").fillna(0) / MILK_BUCKET_L)
+        * MILK_BUCKET_L if "milk_yield" in herd else 0.0,
+    }, index=herd.index)
+    key_columns = list(keys.columns)
+    group_id = keys.groupby(key_columns, dropna=False, sort=True).ngroup()
+    groups = keys.assign(group=group_id.to_numpy()).drop_duplicates("group").set_index("group").sort_index()
+    groups["head"] = group_id.value_counts().sort_index()
+    groups = groups.join(animal_requirements(groups.assign(age=groups["age_group"].map(
+        {"Calf": 0.5, "Growing": 2, "Adult": 5, "Senior": 10, "Unknown": np.nan}))))
+    return group_id, groups
+
+
+def load_feeds(path: str = FEED_INVENTORY_PATH) -> pd.DataFrame:
+    return pd.read_csv(path)
+
+
+class RationOptimizer:
+    """Least-cost ration formulation for a whole herd as one block linear program.
+
+    Variables are kg as fed of each feed per head per day, one block per
+    animal group. Each block must meet its group's ME, CP, Ca and P needs,
+    keep dry matter within 5% of intake, keep NDF at least 28% of dry
+    matter, and respect per-feed share limits. Daily feed availability
+    couples the blocks. Without availability limits the groups are
+    independent, and solutions are cached per group requirement; with them,
+    per herd make-up. Groups no mix of the feeds can satisfy are found by
+    bisection and left without a ration, so the rest of the herd is still
+    fed and costed.
+    """
+
+    def __init__(self, feeds: pd.DataFrame):
+        self.feeds = feeds.reset_index(drop=True)
+        self.names = self.feeds["feed"].tolist()
+        self.cost = self.feeds["cost_per_kg"].to_numpy(float)
+        dm = self.feeds["dry_matter"].to_numpy(float)
+        self.dm = dm
+        # Nutrients supplied per kg as fed
+        self.supply = np.vstack([
+            dm * self.feeds["me_mj_per_kg_dm"].to_numpy(float),
+            dm * self.feeds["crude_protein"].to_numpy(float),
+            dm * self.feeds["calcium_g_per_kg_dm"].to_numpy(float),
+            dm * self.feeds["phosphorus_g_per_kg_dm"].to_numpy(float),
+        ])
+        self.ndf_margin = dm * (self.feeds["ndf"].to_numpy(float) - MIN_NDF_SHARE)
+        self.max_share = self.feeds.get("max_share_of_dm", pd.Series(np.nan, index=self.feeds.index)).to_numpy(float)
+        self.available = self.feeds.get("available_kg_per_day",
+                                        pd.Series(np.nan, index=self.feeds.index)).to_numpy(float)
+        self._cache = {}
+
+    def _block(self) -> np.ndarray:
+        """Constraint rows (as A x <= b) for one group, shared by every block"""
+        limited = np.flatnonzero(~np.isnan(self.max_share))
+        share_rows = np.zeros((len(limited), len(self.names)))
+        for row, f in enumerate(limited):
+            share_rows[row] = -self.max_share[f] * self.dm
+            share_rows[row, f] += self.dm[f]
+        return np.vstack([-self.supply, self.dm, -self.dm, -self.ndf_margin, share_rows])
+
+    def _rhs(self, groups: pd.DataFrame) -> np.ndarray:
+        n_share = int((~np.isnan(self.max_share)).sum())
+        return np.hstack([
+            -groups[list(NUTRIENTS)].to_numpy(float),
+            groups[["dmi"]].to_numpy(float) * (1 + DMI_TOLERANCE),
+            -groups[["dmi"]].to_numpy(float) * (1 - DMI_TOLERANCE),
+            np.zeros((len(groups), 1 + n_share)),
+        ]).ravel()
+
+    def _solve(self, groups: pd.DataFrame, couple: bool) -> Tuple[Optional[np.ndarray], str]:
+        from scipy.optimize import linprog
+        from scipy import sparse
+
+        n_groups, n_feeds = len(groups), len(self.names)
+        block = sparse.csr_matrix(self._block())
+        a_ub = sparse.kron(sparse.identity(n_groups, format="csr"), block, format="csr")
+        b_ub = self._rhs(groups)
+        head = groups["head"].to_numpy(float)
+        if couple:
+            limited = np.flatnonzero(~np.isnan(self.available))
+            availability = sparse.kron(sparse.csr_matrix(head), sparse.identity(n_feeds, format="csr"), format="csr")
+            a_ub = sparse.vstack([a_ub, availability[limited]], format="csr")
+            b_ub = np.concatenate([b_ub, self.available[limited]])
+        result = linprog(np.kron(head, self.cost), A_ub=a_ub, b_ub=b_ub, bounds=(0, None), method="highs")
+        if not result.success:
+            return None, result.message
+        return result.x.reshape(n_groups, n_feeds), "optimal"
+
+    def _solve_independent(self, groups: pd.DataFrame, keys, todo) -> None:
+        """Solve uncoupled groups in one LP, bisecting to isolate any the feeds cannot satisfy"""
+        solved, _ = self._solve(groups.iloc[todo], couple=False)
+        if solved is not None:
+            for i, ration in zip(todo, solved):
+                self._cache[keys[i]] = ration
+        elif len(todo) == 1:
+            self._cache[keys[todo[0]]] = None
+        else:
+            middle = len(todo) // 2
+            self._solve_independent(groups, keys, todo[:middle])
+            self._solve_independent(groups, keys, todo[middle:])
+
+    def solve_groups(self, groups: pd.DataFrame) -> Tuple[pd.DataFrame, str]:
+        """kg as fed per head per day for each group (rows) and feed (columns)"""
+        couple = bool((~np.isnan(self.available)).any())
+        key_columns = ["dmi", *NUTRIENTS]
+        keys = [tuple(np.round(row, 4)) for row in groups[key_columns].to_numpy()]
+        todo = [i for i, key in enumerate(keys) if key not in self._cache]
+        if todo:
+            self._solve_independent(groups, keys, todo)
+        feasible = [i for i, key in enumerate(keys) if self._cache[key] is not None]
+        status = "optimal" if len(feasible) == len(keys) else "infeasible for some groups"
+        if couple:
+            # Shared feed limits tie the groups together, so cache on the whole herd's make-up.
+            # Groups the feeds cannot satisfy on their own are left out rather than failing the herd
+            signature = (tuple(keys[i] for i in feasible), tuple(groups["head"].iloc[feasible]))
+            if signature not in self._cache:
+                self._cache[signature] = self._solve(groups.iloc[feasible], couple=True)
+            solved, _ = self._cache[signature]
+            rations = np.full((len(groups), len(self.names)), np.nan)
+            if solved is not None:
+                rations[feasible] = solved
+            elif feasible:
+                status = "short of feed: daily availability cannot cover the herd"
+        else:
+            missing = np.full(len(self.names), np.nan)
+            rations = np.vstack([self._cache[key] if self._cache[key] is not None else missing for key in keys])
+        return pd.DataFrame(rations, index=groups.index, columns=self.names), status
+
+    def optimize_herd(self, herd: pd.DataFrame) -> Dict:
+        group_id, groups = group_herd(herd)
+        rations, status = self.solve_groups(groups)
+        rations = rations.mask(rations < 1e-6, 0.0)
+        groups["cost_per_head"] = rations.to_numpy() @ self.cost
+        totals = rations.mul(groups["head"], axis=0).sum()
+        costed = groups["cost_per_head"].notna()
+        return {
+            'status': status,
+            'groups': groups,
+            'rations': rations.round(2),
+            'animal_group': group_id,
+            'feed_totals_kg': totals.round(1),
+            # Covers costed animals only; uncosted_head counts the animals with no feasible ration
+            'daily_cost': float((groups["cost_per_head"][costed] * groups["head"][costed]).sum()),
+            'uncosted_head': int(groups["head"][~costed].sum()),
+        }
+
+
+@lru_cache(maxsize=8)
+def get_ration_optimizer(feeds_csv: Optional[str] = None) -> RationOptimizer:
+    """Shared optimizer per feed inventory (CSV text), so group rations stay cached across reruns"""
+    return RationOptimizer(pd.read_csv(StringIO(feeds_csv)) if feeds_csv else load_feeds())
+
+
+def synthetic_herd(size: int, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    stage = rng.choice(["Lactating", "Dry", "Pregnant", "Growing", "Calf"], size, p=[0.45, 0.15, 0.15, 0.15, 0.1])
+    age = np.where(np.isin(stage, ["Growing", "Calf"]), rng.uniform(0.3, 2.5, size), rng.uniform(3, 12, size))
+    weight = np.where(age < 1, rng.uniform(60, 180, size), np.where(age <= 3, rng.uniform(150, 350, size),
+                                                                      rng.uniform(320, 600, size)))
+    milk = np.where(stage == "Lactating", rng.uniform(4, 30, size), 0.0)
+    return pd.DataFrame({"breed": rng.choice(["Jersey", "Gir", "HF", "Sahiwal"], size), "age": age.round(1),
+                         "stage": stage, "weight": weight.round(), "milk_yield": milk.round(1)})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Least-cost rations for a herd")
+    parser.add_argument("--herd", help="CSV with breed, age, stage, weight, milk_yield (default: synthetic)")
+    parser.add_argument("--size", type=int, default=5000, help="Synthetic herd size")
+    parser.add_argument("--feeds", default=FEED_INVENTORY_PATH)
+    args = parser.parse_args()
+
+    herd = pd.read_csv(args.herd) if args.herd else synthetic_herd(args.size)
+    optimizer = RationOptimizer(load_feeds(args.feeds))
+    started = time.perf_counter()
+    result = optimizer.optimize_herd(herd)
+    elapsed = time.perf_counter() - started
+    print(f"{len(herd)} animals in {len(result['groups'])} groups: {result['status']} in {elapsed:.2f}s, "
+          f"daily feed cost ₹{result['daily_cost']:,.0f} for {len(herd) - result['uncosted_head']} animals")
+    if result['uncosted_head']:
+        print(f"No feasible ration for {result['uncosted_head']} animals")
+    started = time.perf_counter()
+    optimizer.optimize_herd(herd)
+    print(f"Re-run with cached group rations: {time.perf_counter() - started:.2f}s")
+    print(result['feed_totals_kg'].to_string())
+
+
+if __name__ == "__main__":
+    main()
@@ -1,30 +1,115 @@
+import os
+from functools import lru_cache
+from typing import Dict, Optional, Tuple
+
+import numpy as np
 import pandas as pd
-from .utils import categorize_age
+
+from .utils import categorize_age, categorize_ages
 from .nutrition_rules import nutrition_map
 
-# Load CSV once
-df = pd.read_csv("cow_nutrition_model/nutrition_dataset.csv")
-
-def get_nutrition_advice(breed, age, stage):
-    age_group = categorize_age(age)
-
-    # Try dataset first
-    match = df[
-        (df["breed"].str.lower() == breed.lower()) &
-        (df["age_group"].str.lower() == age_group.lower()) &
-        (df["stage"].str.lower() == stage.lower())
-    ]
-
-    if not match.empty:
-        row = match.iloc[0]
-        return {
-            "nutrition": row["nutrition"],
-            "food": row["food"],
-            "supplements": row["supplements"],
-            "remedies": row["remedies"],
-            "follow_up": row["follow_up"]
-        }
-
-    # Fallback to rule-based
-    rules = nutrition_map.get(stage) or nutrition_map.get(age_group)
-    return rules if rules else {"nutrition": "No data found."}
+# Resolved next to this module, so the app works from any working directory
+DATASET_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "nutrition_dataset.csv")
+ADVICE_FIELDS = ("nutrition", "food", "supplements", "remedies", "follow_up")
+KEY_FIELDS = ("breed", "age_group", "stage")
+NO_DATA = {"nutrition": "No data found."}
+
+
+def _normalize(values: pd.Series) -> pd.Series:
+    return values.astype("string").str.strip().str.lower()
+
+
+class NutritionIndex:
+    """The nutrition dataset, normalized once and keyed for O(1) lookup.
+
+    Lookups fall back in order: exact (breed, age group, stage) row, then
+    any breed with the same age group and stage, then the rule table by
+    stage, then by age group. The first dataset row wins for duplicate keys.
+    """
+
+    def __init__(self, data: pd.DataFrame, rules: Dict = nutrition_map):
+        data = data.copy()
+        for field in KEY_FIELDS:
+            data[field] = _normalize(data[field])
+        for field in ADVICE_FIELDS:
+            if field not in data:
+                data[field] = pd.NA
+        data = data.dropna(subset=list(KEY_FIELDS))
+
+        self.exact_table = data.drop_duplicates(list(KEY_FIELDS))[list(KEY_FIELDS) + list(ADVICE_FIELDS)]
+        self.any_breed_table = data.drop_duplicates(["age_group", "stage"])[
+            ["age_group", "stage"] + list(ADVICE_FIELDS)]
+        self.exact = {key: row for key, row in zip(
+            self.exact_table[list(KEY_FIELDS)].itertuples(index=False, name=None),
+            self.exact_table[list(ADVICE_FIELDS)].to_dict("records"))}
+        self.any_breed = {key: row for key, row in zip(
+            self.any_breed_table[["age_group", "stage"]].itertuples(index=False, name=None),
+            self.any_breed_table[list(ADVICE_FIELDS)].to_dict("records"))}
+        self.rules = {name.strip().lower(): advice for name, advice in rules.items()}
+
+    @classmethod
+    def from_csv(cls, path: str = DATASET_PATH) -> "NutritionIndex":
+        return cls(pd.read_csv(path, dtype="string"))
+
+    def lookup(self, breed: str, age_group: str, stage: str) -> Tuple[Dict, str]:
+        """(advice, source) where source names the fallback step that matched"""
+        breed, age_group, stage = (str(v).strip().lower() for v in (breed, age_group, stage))
+        advice = self.exact.get((breed, age_group, stage))
+        if advice is not None:
+            return advice, "exact"
+        advice = self.any_breed.get((age_group, stage))
+        if advice is not None:
+            return advice, "any_breed"
+        if stage in self.rules:
+            return self.rules[stage], "stage_rule"
+        if age_group in self.rules:
+            return self.rules[age_group], "age_rule"
+        return NO_DATA, "none"
+
+    def advise_herd(self, herd: pd.DataFrame) -> pd.DataFrame:
+        """Advice for every animal of a herd with breed, age and stage columns, in one vectorized pass"""
+        keys = pd.DataFrame({
+            "breed": _normalize(herd["breed"]),
+            "age_group": _normalize(categorize_ages(herd["age"])),
+            "stage": _normalize(herd["stage"]),
+        }, index=herd.index)
+
+        # Left merges keep the herd's row order; the right-hand tables have unique keys
+        exact = keys.merge(self.exact_table, on=list(KEY_FIELDS), how="left")
+        any_breed = keys[["age_group", "stage"]].merge(self.any_breed_table, on=["age_group", "stage"], how="left")
+        rules = pd.DataFrame.from_dict(self.rules, orient="index").reindex(columns=list(ADVICE_FIELDS))
+        fields = list(ADVICE_FIELDS)
+
+        advice = exact[fields].copy()
+        source = np.where(exact["nutrition"].notna(), "exact", "none").astype(object)
+        for candidates, name in (
+            (any_breed, "any_breed"),
+            (rules.reindex(keys["stage"].to_numpy()).reset_index(drop=True), "stage_rule"),
+            (rules.reindex(keys["age_group"].to_numpy()).reset_index(drop=True), "age_rule"),
+        ):
+            rows = (source == "none") & candidates["nutrition"].notna().to_numpy()
+            advice.loc[rows, fields] = candidates.loc[rows, fields].to_numpy()
+            source[rows] = name
+        advice.loc[source == "none", "nutrition"] = NO_DATA["nutrition"]
+
+        result = herd.copy()
+        result["age_group"] = categorize_ages(herd["age"]).to_numpy()
+        for field in ADVICE_FIELDS:
+            result[field] = advice[field].to_numpy()
+        result["advice_source"] = source
+        return result
+
+
+@lru_cache(maxsize=4)
+def get_nutrition_index(path: str = DATASET_PATH) -> NutritionIndex:
+    """Index for a dataset file, built on first use and reused for every call"""
+    return NutritionIndex.from_csv(path)
+
+
+def get_nutrition_advice(breed, age, stage, index: Optional[NutritionIndex] = None):
+    advice, _ = (index or get_nutrition_index()).lookup(breed, categorize_age(age), stage)
+    return dict(advice)
+
+
+def advise_herd(herd: pd.DataFrame, index: Optional[NutritionIndex] = None) -> pd.DataFrame:
+    return (index or get_nutrition_index()).advise_herd(herd)
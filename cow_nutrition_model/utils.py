@@ -1,13 +1,33 @@
+import numpy as np
+import pandas as pd
+
+AGE_GROUPS = ("Calf", "Growing", "Adult", "Senior")
+
+
 def categorize_age(age):
+    """Age group for an age in years; fractional ages are kept (0.5 is a calf)"""
     try:
-        age = int(age)
-        if age < 1:
-            return "Calf"
-        elif age <= 3:
-            return "Growing"
-        elif 3 < age <= 8:
-            return "Adult"
-        else:
-            return "Senior"
-    except:
+        age = float(age)
+    except (TypeError, ValueError):
         return "Unknown"
+    if np.isnan(age) or age < 0:
+        return "Unknown"
+    if age < 1:
+        return "Calf"
+    elif age <= 3:
+        return "Growing"
+    elif age <= 8:
+        return "Adult"
+    else:
+        return "Senior"
+
+
+def categorize_ages(ages: pd.Series) -> pd.Series:
+    """Vectorized categorize_age"""
+    ages = pd.to_numeric(ages, errors="coerce")
+    groups = np.select(
+        [ages < 0, ages < 1, ages <= 3, ages <= 8, ages > 8],
+        ["Unknown", *AGE_GROUPS],
+        default="Unknown",
+    )
+    return pd.Series(groups, index=ages.index)
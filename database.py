@@ -1,15 +1,25 @@
 import os
+import re
 import pandas as pd
-from datetime import datetime, date
-from typing import List, Dict, Optional
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, Float, Text, Boolean
+from datetime import datetime, date, timedelta
+from typing import List, Dict, Optional, Tuple
+from sqlalchemy import create_engine, inspect, insert, select, update, delete, case, func, text, Column, Integer, String, Date, DateTime, Float, Text, Boolean, Index, UniqueConstraint
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 import streamlit as st
+from tracing import trace_methods, record_exception
 
 # Database setup
 Base = declarative_base()
 
+# Canonical severity levels stored in cow_health_records.severity
+SEVERITY_LEVELS = ('mild', 'moderate', 'severe')
+
+# Free-text columns of cow_health_records covered by full-text search
+SEARCH_COLUMNS = ('cow_id', 'disease_name', 'symptoms', 'treatment_applied', 'notes')
+
 class CowHealthRecord(Base):
     __tablename__ = 'cow_health_records'
     
@@ -25,12 +35,125 @@ class CowHealthRecord(Base):
     labor_cost = Column(Float, nullable=True)
     supplies_cost = Column(Float, nullable=True)
     total_cost = Column(Float, nullable=True)
+    # True when the cost fields were estimated from the treatment protocols rather than entered
+    cost_estimated = Column(Boolean, nullable=True)
+    # Body weight at diagnosis; weight-based doses are costed with it when no costs are entered
+    weight_kg = Column(Float, nullable=True)
     veterinarian = Column(String(100), nullable=True)
     notes = Column(Text, nullable=True)
     image_filename = Column(String(255), nullable=True)
+    model_version = Column(String(32), nullable=True)
+    # Set by field devices that captured the record offline; makes sync retries idempotent
+    client_id = Column(String(36), nullable=True)
+    client_updated_at = Column(DateTime, nullable=True)
     created_at = Column(DateTime, default=datetime.now)
     updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)
 
+    __table_args__ = (
+        Index('ix_cow_health_records_diagnosis_date', 'diagnosis_date'),
+        Index('ix_cow_health_records_cow_disease_date', 'cow_id', 'disease_name', 'diagnosis_date'),
+        Index('ix_cow_health_records_client_id', 'client_id', unique=True),
+        # Makes MAX(updated_at) an index lookup for data_version()
+        Index('ix_cow_health_records_updated_at', 'updated_at'),
+    )
+
+class RecordPrediction(Base):
+    """A later model's prediction for a stored record image, kept alongside the original diagnosis"""
+    __tablename__ = 'record_predictions'
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    record_id = Column(Integer, nullable=False)
+    model_version = Column(String(32), nullable=False)
+    disease_name = Column(String(100), nullable=True)  # NULL when the image is no longer stored
+    confidence_score = Column(Float, nullable=True)
+    created_at = Column(DateTime, default=datetime.now)
+
+    __table_args__ = (UniqueConstraint('record_id', 'model_version', name='uq_record_predictions_record_version'),)
+
+# Columns added after the first release; create_all does not alter existing tables
+ADDED_COLUMNS = {
+    'cow_health_records': {'model_version': 'VARCHAR(32)', 'client_id': 'VARCHAR(36)',
+                           'client_updated_at': 'TIMESTAMP', 'weight_kg': 'FLOAT', 'cost_estimated': 'BOOLEAN'},
+    'veterinarians': {'updated_at': 'TIMESTAMP'},
+}
+# Added columns filled from an existing column for rows written before the migration
+ADDED_COLUMN_BACKFILL = {
+    ('veterinarians', 'updated_at'): 'created_at',
+}
+
+class _HealthRollupColumns:
+    """Per-period, per-disease aggregates of cow_health_records"""
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    period_start = Column(Date, nullable=False)
+    disease_name = Column(String(100), nullable=False)
+    cases = Column(Integer, nullable=False, default=0)
+    mild_cases = Column(Integer, nullable=False, default=0)
+    moderate_cases = Column(Integer, nullable=False, default=0)
+    severe_cases = Column(Integer, nullable=False, default=0)
+    costed_cases = Column(Integer, nullable=False, default=0)
+    total_cost = Column(Float, nullable=False, default=0.0)
+
+class DailyHealthRollup(_HealthRollupColumns, Base):
+    __tablename__ = 'health_rollup_daily'
+    __table_args__ = (UniqueConstraint('period_start', 'disease_name', name='uq_health_rollup_daily'),)
+
+class WeeklyHealthRollup(_HealthRollupColumns, Base):
+    """Weekly aggregates; period_start is the Monday of the week"""
+    __tablename__ = 'health_rollup_weekly'
+    __table_args__ = (UniqueConstraint('period_start', 'disease_name', name='uq_health_rollup_weekly'),)
+
+ROLLUP_COUNTERS = ('cases', 'mild_cases', 'moderate_cases', 'severe_cases', 'costed_cases', 'total_cost')
+
+def _rollup_deltas(records: List[Dict], sign: int = 1) -> Dict:
+    """Aggregate new records into counter deltas keyed by (model, period_start, disease)"""
+    deltas = {}
+    for record in records:
+        day = pd.Timestamp(record['diagnosis_date']).date()
+        for model, period_start in ((DailyHealthRollup, day), (WeeklyHealthRollup, day - timedelta(days=day.weekday()))):
+            delta = deltas.setdefault((model, period_start, record['disease_name']), dict.fromkeys(ROLLUP_COUNTERS, 0))
+            delta['cases'] += sign
+            severity = str(record.get('severity') or '').lower()
+            if severity in SEVERITY_LEVELS:
+                delta[f'{severity}_cases'] += sign
+            cost = record.get('total_cost')
+            if cost is not None and not pd.isna(cost):
+                delta['costed_cases'] += sign
+                delta['total_cost'] += sign * float(cost)
+    return deltas
+
+# Dialects with INSERT ... ON CONFLICT DO UPDATE / DO NOTHING
+UPSERT_INSERTS = {'postgresql': postgresql.insert, 'sqlite': sqlite.insert}
+
+def apply_rollups(session, records: List[Dict], sign: int = 1) -> None:
+    """Add new records to the daily and weekly rollups inside the caller's transaction.
+
+    sign=-1 takes records back out, e.g. the old version of an updated record.
+    Each counter row is upserted atomically, so concurrent first inserts for
+    the same (period, disease) add up instead of failing on the unique
+    constraint; rows are touched in a fixed order so writers cannot deadlock.
+    """
+    upsert = UPSERT_INSERTS.get(session.get_bind().dialect.name)
+    deltas = _rollup_deltas(records, sign)
+    for model, period_start, disease_name in sorted(deltas, key=lambda k: (k[0].__tablename__, k[1], k[2])):
+        delta = deltas[(model, period_start, disease_name)]
+        if upsert is not None:
+            statement = upsert(model).values(period_start=period_start, disease_name=disease_name, **delta)
+            session.execute(statement.on_conflict_do_update(
+                index_elements=['period_start', 'disease_name'],
+                set_={c: model.__table__.c[c] + statement.excluded[c] for c in ROLLUP_COUNTERS},
+            ))
+            continue
+        key = (model.period_start == period_start) & (model.disease_name == disease_name)
+        increment = update(model).where(key).values({c: getattr(model, c) + delta[c] for c in ROLLUP_COUNTERS})
+        if session.execute(increment).rowcount:
+            continue
+        try:
+            with session.begin_nested():
+                session.execute(insert(model).values(period_start=period_start, disease_name=disease_name, **delta))
+        except IntegrityError:
+            # Another transaction created the row first
+            session.execute(increment)
+
 class VeterinarianRecord(Base):
     __tablename__ = 'veterinarians'
     
@@ -44,6 +167,7 @@ class VeterinarianRecord(Base):
     emergency_services = Column(Boolean, default=False)
     rating = Column(Float, nullable=True)
     created_at = Column(DateTime, default=datetime.now)
+    updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)
 
 class TreatmentProtocol(Base):
     __tablename__ = 'treatment_protocols'
@@ -59,10 +183,42 @@ class TreatmentProtocol(Base):
     created_at = Column(DateTime, default=datetime.now)
     updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)
 
+# SQLite FTS5 external-content index, kept in sync with triggers
+SQLITE_FTS_DDL = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS cow_health_records_fts USING fts5(
+        {', '.join(SEARCH_COLUMNS)},
+        content='cow_health_records', content_rowid='id', tokenize='unicode61'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS cow_health_records_fts_ai AFTER INSERT ON cow_health_records BEGIN
+        INSERT INTO cow_health_records_fts(rowid, {', '.join(SEARCH_COLUMNS)})
+        VALUES (new.id, {', '.join('new.' + c for c in SEARCH_COLUMNS)});
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS cow_health_records_fts_ad AFTER DELETE ON cow_health_records BEGIN
+        INSERT INTO cow_health_records_fts(cow_health_records_fts, rowid, {', '.join(SEARCH_COLUMNS)})
+        VALUES ('delete', old.id, {', '.join('old.' + c for c in SEARCH_COLUMNS)});
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS cow_health_records_fts_au AFTER UPDATE ON cow_health_records BEGIN
+        INSERT INTO cow_health_records_fts(cow_health_records_fts, rowid, {', '.join(SEARCH_COLUMNS)})
+        VALUES ('delete', old.id, {', '.join('old.' + c for c in SEARCH_COLUMNS)});
+        INSERT INTO cow_health_records_fts(rowid, {', '.join(SEARCH_COLUMNS)})
+        VALUES (new.id, {', '.join('new.' + c for c in SEARCH_COLUMNS)});
+    END""",
+]
+
+# Postgres expression GIN index; always in sync because it is computed from the row
+PG_SEARCH_DOCUMENT = "to_tsvector('english', " + " || ' ' || ".join(f"coalesce({c}, '')" for c in SEARCH_COLUMNS) + ")"
+PG_FTS_DDL = [
+    f"CREATE INDEX IF NOT EXISTS ix_cow_health_records_fts ON cow_health_records USING GIN ({PG_SEARCH_DOCUMENT})",
+]
+
+@trace_methods
 class DatabaseManager:
     def __init__(self):
         self.engine = None
         self.Session = None
+        self.fts_backend = None
+        self.record_listeners = []
+        self.update_listeners = []
         self.connect()
     
     def connect(self):
@@ -73,17 +229,92 @@ class DatabaseManager:
             self.Session = sessionmaker(bind=self.engine)
             
             # Create tables if they don't exist
+            rollups_exist = inspect(self.engine).has_table(DailyHealthRollup.__tablename__)
             Base.metadata.create_all(self.engine)
+            self._add_missing_columns()
+            if not rollups_exist:
+                self.rebuild_rollups()
+            for index in CowHealthRecord.__table__.indexes:
+                index.create(self.engine, checkfirst=True)
+            self.fts_backend = self._setup_full_text_search()
             return True
             
         except Exception as e:
+            record_exception(e)
             st.error(f"Database connection failed: {str(e)}")
             return False
+
+    def _add_missing_columns(self) -> None:
+        inspector = inspect(self.engine)
+        with self.engine.begin() as conn:
+            for table, columns in ADDED_COLUMNS.items():
+                existing = {c['name'] for c in inspector.get_columns(table)}
+                for name, sql_type in columns.items():
+                    if name not in existing:
+                        conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {name} {sql_type}"))
+                        source = ADDED_COLUMN_BACKFILL.get((table, name))
+                        if source:
+                            conn.execute(text(f"UPDATE {table} SET {name} = {source}"))
+
+    def _setup_full_text_search(self) -> Optional[str]:
+        """Create the full-text index for the current backend, if supported"""
+        dialect = self.engine.dialect.name
+        try:
+            with self.engine.begin() as conn:
+                if dialect == 'sqlite':
+                    exists = conn.execute(text(
+                        "SELECT 1 FROM sqlite_master WHERE name = 'cow_health_records_fts'"
+                    )).first()
+                    for statement in SQLITE_FTS_DDL:
+                        conn.execute(text(statement))
+                    if not exists:
+                        # Index rows written before the FTS table existed
+                        conn.execute(text(
+                            "INSERT INTO cow_health_records_fts(cow_health_records_fts) VALUES ('rebuild')"
+                        ))
+                    return 'fts5'
+                if dialect == 'postgresql':
+                    for statement in PG_FTS_DDL:
+                        conn.execute(text(statement))
+                    return 'tsvector'
+        except Exception as e:
+            print(f"Full-text search unavailable, using ILIKE search: {e}")
+        return None
     
+    def add_record_listener(self, callback) -> None:
+        """Register callback(records: List[Dict]) to run after health records are committed"""
+        if callback not in self.record_listeners:
+            self.record_listeners.append(callback)
+
+    def add_update_listener(self, callback) -> None:
+        """Register callback(records: List[Dict]) to run after health records are replaced in place.
+
+        The callback gets both the old and the new version of every changed record.
+        """
+        if callback not in self.update_listeners:
+            self.update_listeners.append(callback)
+
+    def _notify_record_listeners(self, records: List[Dict], updated: bool = False) -> None:
+        """Pass newly committed (or, with updated=True, replaced) health records to the registered listeners"""
+        for callback in self.update_listeners if updated else self.record_listeners:
+            try:
+                callback(records)
+            except Exception as e:
+                print(f"Record listener failed: {e}")
+
+    def _estimate_costs(self, records: List[Dict]) -> None:
+        """Fill cost fields of records entered without any, from the treatment protocols and price list"""
+        try:
+            from treatment_costs import fill_record_costs
+            fill_record_costs(records)
+        except Exception as e:
+            print(f"Treatment cost estimate failed, saving records without costs: {e}")
+
     def add_health_record(self, record_data: Dict) -> bool:
         """Add a new health record to the database"""
         try:
             session = self.Session()
+            self._estimate_costs([record_data])
             
             # Convert date to datetime if needed
             if isinstance(record_data.get('diagnosis_date'), date):
@@ -94,17 +325,136 @@ class DatabaseManager:
             
             health_record = CowHealthRecord(**record_data)
             session.add(health_record)
+            apply_rollups(session, [record_data])
             session.commit()
             session.close()
+            self._notify_record_listeners([record_data])
             return True
             
         except Exception as e:
+            record_exception(e)
             st.error(f"Failed to add health record: {str(e)}")
             if session:
                 session.rollback()
                 session.close()
             return False
     
+    def add_health_records_bulk(self, records: List[Dict], batch_size: int = 1000) -> Tuple[int, List[Tuple[int, str]]]:
+        """Insert many health records using one executemany INSERT per batch.
+
+        Returns the number of inserted rows and a list of (row_index, error)
+        for rows that could not be inserted. A failing batch is retried row by
+        row so a single bad record does not abort the whole import.
+        """
+        inserted = 0
+        failures = []
+        for start in range(0, len(records), batch_size):
+            batch = records[start:start + batch_size]
+            self._estimate_costs(batch)
+            session = self.Session()
+            try:
+                session.execute(insert(CowHealthRecord), batch)
+                apply_rollups(session, batch)
+                session.commit()
+                inserted += len(batch)
+                self._notify_record_listeners(batch)
+            except Exception:
+                session.rollback()
+                for offset, row in enumerate(batch):
+                    try:
+                        session.execute(insert(CowHealthRecord), [row])
+                        apply_rollups(session, [row])
+                        session.commit()
+                        inserted += 1
+                        self._notify_record_listeners([row])
+                    except Exception as e:
+                        session.rollback()
+                        failures.append((start + offset, str(e)))
+            finally:
+                session.close()
+        return inserted, failures
+
+    def copy_health_records(self, records: pd.DataFrame) -> int:
+        """Load health records with Postgres COPY (all-or-nothing)"""
+        import io
+
+        try:
+            from treatment_costs import get_cost_engine
+            records = get_cost_engine().fill_record_costs(records)
+        except Exception as e:
+            print(f"Treatment cost estimate failed, loading records without costs: {e}")
+        buffer = io.StringIO()
+        records.to_csv(buffer, index=False, header=False, na_rep='\\N')
+        buffer.seek(0)
+        columns = ', '.join(records.columns)
+
+        rows = records.to_dict('records')
+        session = self.Session()
+        try:
+            # COPY through the session's connection so rollups commit atomically with the rows
+            cursor = session.connection().connection.cursor()
+            cursor.copy_expert(
+                f"COPY {CowHealthRecord.__tablename__} ({columns}) FROM STDIN WITH (FORMAT csv, NULL '\\N')",
+                buffer
+            )
+            apply_rollups(session, rows)
+            session.commit()
+            self._notify_record_listeners(rows)
+            return len(records)
+        except Exception:
+            session.rollback()
+            raise
+        finally:
+            session.close()
+
+    def data_version(self) -> Tuple:
+        """Cheap fingerprint of the health data that changes when any process writes records or rebuilds rollups"""
+        with self.engine.connect() as conn:
+            return (
+                conn.execute(select(func.max(CowHealthRecord.updated_at))).scalar(),
+                # A rebuild re-inserts every rollup row under new ids
+                conn.execute(select(func.max(DailyHealthRollup.id))).scalar(),
+            )
+
+    def rebuild_rollups(self) -> int:
+        """Recompute the daily and weekly rollups from cow_health_records"""
+        session = self.Session()
+        try:
+            session.execute(delete(DailyHealthRollup))
+            session.execute(delete(WeeklyHealthRollup))
+
+            severity_counts = [
+                func.sum(case((func.lower(CowHealthRecord.severity) == level, 1), else_=0))
+                for level in SEVERITY_LEVELS
+            ]
+            daily = session.query(
+                func.date(CowHealthRecord.diagnosis_date),
+                CowHealthRecord.disease_name,
+                func.count(),
+                *severity_counts,
+                func.count(CowHealthRecord.total_cost),
+                func.coalesce(func.sum(CowHealthRecord.total_cost), 0.0)
+            ).group_by(func.date(CowHealthRecord.diagnosis_date), CowHealthRecord.disease_name).all()
+
+            df = pd.DataFrame(daily, columns=['period_start', 'disease_name', *ROLLUP_COUNTERS])
+            if df.empty:
+                session.commit()
+                return 0
+            df['period_start'] = pd.to_datetime(df['period_start'])
+            weekly = df.assign(period_start=df['period_start'] - pd.to_timedelta(df['period_start'].dt.weekday, unit='D'))
+            weekly = weekly.groupby(['period_start', 'disease_name'], as_index=False)[list(ROLLUP_COUNTERS)].sum()
+
+            for model, frame in ((DailyHealthRollup, df), (WeeklyHealthRollup, weekly)):
+                frame = frame.assign(period_start=frame['period_start'].dt.date)
+                session.execute(insert(model), frame.to_dict('records'))
+            session.commit()
+            return len(df)
+        except Exception:
+            session.rollback()
+            raise
+        finally:
+            session.close()
+
     def get_health_records(self, cow_id: str = None, limit: int = 100) -> List[Dict]:
         """Retrieve health records from database"""
         try:
@@ -131,9 +481,11 @@ class DatabaseManager:
                     'labor_cost': record.labor_cost,
                     'supplies_cost': record.supplies_cost,
                     'total_cost': record.total_cost,
+                    'cost_estimated': record.cost_estimated,
                     'veterinarian': record.veterinarian,
                     'notes': record.notes,
                     'image_filename': record.image_filename,
+                    'model_version': record.model_version,
                     'created_at': record.created_at
                 })
             
@@ -141,39 +493,187 @@ class DatabaseManager:
             return result
             
         except Exception as e:
+            record_exception(e)
             st.error(f"Failed to retrieve health records: {str(e)}")
             return []
     
-    def get_disease_statistics(self) -> Dict:
-        """Get disease statistics from the database"""
+    def get_referenced_images(self) -> set:
+        """Image store digests referenced by any health record"""
+        with self.engine.connect() as conn:
+            rows = conn.execute(
+                select(CowHealthRecord.image_filename).where(CowHealthRecord.image_filename.isnot(None)).distinct()
+            )
+            return {row[0] for row in rows}
+
+    def get_records_to_rescore(self, model_version: str, after_id: int = 0, limit: int = 100) -> List[Dict]:
+        """Records with a stored image but no prediction from model_version yet, in id order"""
+        scored = select(RecordPrediction.record_id).where(RecordPrediction.model_version == model_version)
+        query = (
+            select(CowHealthRecord.id, CowHealthRecord.image_filename)
+            .where(CowHealthRecord.image_filename.isnot(None), CowHealthRecord.id > after_id,
+                   CowHealthRecord.id.notin_(scored))
+            .order_by(CowHealthRecord.id).limit(limit)
+        )
+        with self.engine.connect() as conn:
+            return [dict(row) for row in conn.execute(query).mappings()]
+
+    def add_record_predictions(self, predictions: List[Dict]) -> None:
+        """Insert re-scoring results (record_id, model_version, disease_name, confidence_score).
+
+        A record this version already scored keeps its first prediction, so two
+        jobs (the app's and the CLI's) overlapping on a batch do not fail.
+        """
+        if not predictions:
+            return
+        with self.engine.begin() as conn:
+            upsert = UPSERT_INSERTS.get(conn.dialect.name)
+            if upsert is not None:
+                conn.execute(upsert(RecordPrediction).on_conflict_do_nothing(
+                    index_elements=['record_id', 'model_version']), predictions)
+                return
+            for prediction in predictions:
+                try:
+                    with conn.begin_nested():
+                        conn.execute(insert(RecordPrediction), prediction)
+                except IntegrityError:
+                    # Scored by another job first
+                    continue
+
+    def get_rescoring_progress(self, model_version: str) -> Dict:
+        with self.engine.connect() as conn:
+            total = conn.execute(
+                select(func.count()).where(CowHealthRecord.image_filename.isnot(None))
+            ).scalar()
+            done = conn.execute(
+                select(func.count()).select_from(RecordPrediction).where(RecordPrediction.model_version == model_version)
+            ).scalar()
+        return {'total': total, 'done': done}
+
+    def get_prediction_drift(self, model_version: str) -> pd.DataFrame:
+        """Original diagnosis next to model_version's prediction, for every re-scored record"""
+        query = (
+            select(CowHealthRecord.id.label('record_id'), CowHealthRecord.cow_id, CowHealthRecord.diagnosis_date,
+                   CowHealthRecord.model_version.label('old_version'),
+                   CowHealthRecord.disease_name.label('old_disease'),
+                   CowHealthRecord.confidence_score.label('old_confidence'),
+                   RecordPrediction.disease_name.label('new_disease'),
+                   RecordPrediction.confidence_score.label('new_confidence'))
+            .join(RecordPrediction, RecordPrediction.record_id == CowHealthRecord.id)
+            .where(RecordPrediction.model_version == model_version, RecordPrediction.disease_name.isnot(None))
+            .order_by(CowHealthRecord.id)
+        )
+        with self.engine.connect() as conn:
+            return pd.DataFrame(conn.execute(query).mappings().all())
+
+    def upsert_synced_records(self, records: List[Dict]) -> Dict:
+        """Apply health records pushed by a field device, keyed by their client_id.
+
+        Re-sending a record is a no-op, so a device can retry a batch whose
+        response it never received. An edit replaces the stored row only if
+        its client_updated_at is newer (last writer wins); otherwise the
+        stored row is returned as a conflict for the device to adopt.
+        """
+        result = {'inserted': 0, 'updated': 0, 'unchanged': 0, 'conflicts': []}
+        if not records:
+            return result
+        self._estimate_costs(records)
+        columns = [c.name for c in CowHealthRecord.__table__.columns if c.name not in ('id', 'created_at', 'updated_at')]
+        session = self.Session()
+        try:
+            existing = {
+                row.client_id: row for row in session.query(CowHealthRecord)
+                .filter(CowHealthRecord.client_id.in_([r['client_id'] for r in records]))
+            }
+            new_rows = []
+            new_ids = set()
+            changed = []
+            for record in records:
+                stored = existing.get(record['client_id'])
+                if stored is None and record['client_id'] not in new_ids:
+                    new_rows.append(record)
+                    new_ids.add(record['client_id'])
+                elif stored is None or stored.client_updated_at == record['client_updated_at']:
+                    result['unchanged'] += 1
+                elif stored.client_updated_at is None or record['client_updated_at'] > stored.client_updated_at:
+                    old = {c: getattr(stored, c) for c in columns}
+                    for c in columns:
+                        setattr(stored, c, record.get(c))
+                    apply_rollups(session, [old], sign=-1)
+                    apply_rollups(session, [record])
+                    changed.extend([old, record])
+                    result['updated'] += 1
+                else:
+                    result['conflicts'].append({c: getattr(stored, c) for c in columns})
+            if new_rows:
+                session.execute(insert(CowHealthRecord), new_rows)
+                apply_rollups(session, new_rows)
+            session.commit()
+            result['inserted'] = len(new_rows)
+        except Exception:
+            session.rollback()
+            raise
+        finally:
+            session.close()
+        if new_rows:
+            self._notify_record_listeners(new_rows)
+        if changed:
+            self._notify_record_listeners(changed, updated=True)
+        return result
+
+    def get_knowledge_changes(self, since: Optional[datetime] = None) -> Dict:
+        """Treatment protocols and veterinarians changed after `since`, for field devices' delta sync"""
+        tables = {
+            'treatment_protocols': (TreatmentProtocol, TreatmentProtocol.updated_at),
+            'veterinarians': (VeterinarianRecord, VeterinarianRecord.updated_at),
+        }
+        changes = {}
+        cursor = since
+        with self.engine.connect() as conn:
+            for name, (model, changed_at) in tables.items():
+                query = select(model.__table__)
+                if since is not None:
+                    query = query.where(changed_at > since)
+                rows = [dict(row) for row in conn.execute(query.order_by(changed_at)).mappings()]
+                changes[name] = rows
+                if rows:
+                    latest = rows[-1][changed_at.name]
+                    cursor = latest if cursor is None else max(cursor, latest)
+        changes['cursor'] = cursor
+        return changes
+
+    def get_disease_statistics(self, start: Optional[date] = None, end: Optional[date] = None) -> Dict:
+        """Get disease statistics from the daily rollups"""
         try:
             session = self.Session()
             
-            # Most common diseases
-            disease_counts = session.query(
-                CowHealthRecord.disease_name,
-                session.query(CowHealthRecord).filter(
-                    CowHealthRecord.disease_name == CowHealthRecord.disease_name
-                ).count().label('count')
-            ).group_by(CowHealthRecord.disease_name).all()
-            
-            # Total records
-            total_records = session.query(CowHealthRecord).count()
-            
-            # Average costs
-            avg_cost = session.query(
-                session.func.avg(CowHealthRecord.total_cost)
-            ).scalar() or 0
+            query = session.query(
+                DailyHealthRollup.disease_name,
+                func.sum(DailyHealthRollup.cases),
+                func.sum(DailyHealthRollup.costed_cases),
+                func.sum(DailyHealthRollup.total_cost)
+            )
+            if start:
+                query = query.filter(DailyHealthRollup.period_start >= start)
+            if end:
+                query = query.filter(DailyHealthRollup.period_start <= end)
+            # Rows moved to another disease by a synced edit leave zero counts behind
+            rows = query.group_by(DailyHealthRollup.disease_name).having(func.sum(DailyHealthRollup.cases) > 0).all()
             
             session.close()
             
+            # Most common diseases first
+            disease_counts = {name: int(cases) for name, cases, _, _ in sorted(rows, key=lambda r: r[1], reverse=True)}
+            costed = sum(r[2] or 0 for r in rows)
+            total_cost = sum(r[3] or 0 for r in rows)
+            
             return {
-                'total_records': total_records,
-                'disease_counts': dict(disease_counts),
-                'average_cost': avg_cost
+                'total_records': sum(disease_counts.values()),
+                'disease_counts': disease_counts,
+                'average_cost': total_cost / costed if costed else 0
             }
             
         except Exception as e:
+            record_exception(e)
             st.error(f"Failed to get statistics: {str(e)}")
             return {'total_records': 0, 'disease_counts': {}, 'average_cost': 0}
     
@@ -188,9 +688,29 @@ class DatabaseManager:
             return True
             
         except Exception as e:
+            record_exception(e)
             st.error(f"Failed to add veterinarian: {str(e)}")
             return False
     
+    def update_veterinarian(self, vet_id: int, changes: Dict) -> bool:
+        """Edit a veterinarian; the new updated_at sends the change to field devices on their next sync"""
+        try:
+            session = self.Session()
+            veterinarian = session.get(VeterinarianRecord, vet_id)
+            if veterinarian is None:
+                session.close()
+                return False
+            for name, value in changes.items():
+                setattr(veterinarian, name, value)
+            session.commit()
+            session.close()
+            return True
+
+        except Exception as e:
+            record_exception(e)
+            st.error(f"Failed to update veterinarian: {str(e)}")
+            return False
+
     def get_veterinarians(self, location: str = None) -> List[Dict]:
         """Get veterinarians from database"""
         try:
@@ -220,19 +740,37 @@ class DatabaseManager:
             return result
             
         except Exception as e:
+            record_exception(e)
             st.error(f"Failed to retrieve veterinarians: {str(e)}")
             return []
     
-    def search_records(self, search_term: str) -> List[Dict]:
-        """Search health records by disease name, cow ID, or notes"""
+    def search_records(self, search_term: str, limit: int = 100) -> List[Dict]:
+        """Search health records by cow ID, disease, symptoms, treatment or notes.
+
+        Uses the full-text index when available and returns results ranked by
+        relevance with a highlighted snippet; falls back to ILIKE otherwise.
+        """
+        tokens = re.findall(r'\w+', search_term or '')
+        if not tokens:
+            return []
+
+        if self.fts_backend:
+            try:
+                return self._search_full_text(tokens, limit)
+            except Exception as e:
+                print(f"Full-text search failed, using ILIKE search: {e}")
+
         try:
             session = self.Session()
             
+            pattern = f'%{search_term}%'
             records = session.query(CowHealthRecord).filter(
-                (CowHealthRecord.disease_name.ilike(f'%{search_term}%')) |
-                (CowHealthRecord.cow_id.ilike(f'%{search_term}%')) |
-                (CowHealthRecord.notes.ilike(f'%{search_term}%'))
-            ).order_by(CowHealthRecord.diagnosis_date.desc()).all()
+                (CowHealthRecord.disease_name.ilike(pattern)) |
+                (CowHealthRecord.cow_id.ilike(pattern)) |
+                (CowHealthRecord.symptoms.ilike(pattern)) |
+                (CowHealthRecord.treatment_applied.ilike(pattern)) |
+                (CowHealthRecord.notes.ilike(pattern))
+            ).order_by(CowHealthRecord.diagnosis_date.desc()).limit(limit).all()
             
             result = []
             for record in records:
@@ -251,10 +789,55 @@ class DatabaseManager:
             return result
             
         except Exception as e:
+            record_exception(e)
             st.error(f"Search failed: {str(e)}")
             return []
 
+    def _search_full_text(self, tokens: List[str], limit: int) -> List[Dict]:
+        """Ranked full-text search with snippets (FTS5 or Postgres tsvector)"""
+        if self.fts_backend == 'fts5':
+            # Quote each token so user input can never be parsed as FTS5 syntax
+            query = text("""
+                SELECT r.id, r.cow_id, r.diagnosis_date, r.disease_name, r.severity,
+                       r.total_cost, r.veterinarian, r.notes,
+                       -bm25(cow_health_records_fts) AS rank,
+                       snippet(cow_health_records_fts, -1, '**', '**', '…', 12) AS snippet
+                FROM cow_health_records_fts
+                JOIN cow_health_records r ON r.id = cow_health_records_fts.rowid
+                WHERE cow_health_records_fts MATCH :query
+                ORDER BY bm25(cow_health_records_fts), r.diagnosis_date DESC
+                LIMIT :limit
+            """)
+            params = {'query': ' '.join(f'"{t}"*' for t in tokens), 'limit': limit}
+        else:
+            query = text(f"""
+                SELECT id, cow_id, diagnosis_date, disease_name, severity,
+                       total_cost, veterinarian, notes,
+                       ts_rank({PG_SEARCH_DOCUMENT}, q) AS rank,
+                       ts_headline('english', {" || ' ' || ".join(f"coalesce({c}, '')" for c in SEARCH_COLUMNS)}, q,
+                                   'StartSel=**, StopSel=**, MaxFragments=2') AS snippet
+                FROM cow_health_records, to_tsquery('english', :query) AS q
+                WHERE {PG_SEARCH_DOCUMENT} @@ q
+                ORDER BY rank DESC, diagnosis_date DESC
+                LIMIT :limit
+            """)
+            params = {'query': ' & '.join(f'{t}:*' for t in tokens), 'limit': limit}
+
+        with self.engine.connect() as conn:
+            rows = conn.execute(query, params).mappings().all()
+
+        result = [dict(row) for row in rows]
+        for row in result:
+            if isinstance(row['diagnosis_date'], str):
+                row['diagnosis_date'] = datetime.fromisoformat(row['diagnosis_date'])
+        return result
+
 # Initialize database manager
 @st.cache_resource
 def get_database_manager():
-    return DatabaseManager()
\ No newline at end of file
+    db_manager = DatabaseManager()
+    # Attached here so every record inserted through the shared manager reaches the detector,
+    # without the app building either one before a page needs the database
+    from outbreak_detector import get_outbreak_detector
+    get_outbreak_detector().attach(db_manager)
+    return db_manager
\ No newline at end of file
@@ -1,5 +1,7 @@
 from typing import Dict, List, Optional
 import pandas as pd 
+from localization import localize_record
+from tracing import traced
 class DiseaseDatabase:
     """Database class for managing cow disease information"""
 
@@ -140,14 +142,19 @@ class DiseaseDatabase:
         # Sort dictionary alphabetically by key
         return dict(sorted(diseases.items()))
 
-    def get_disease_info(self, disease_name: str) -> Optional[Dict]:
-        """Get information for a specific disease"""
-        return self.diseases.get(disease_name)
+    @traced()
+    def get_disease_info(self, disease_name: str, language: Optional[str] = None) -> Optional[Dict]:
+        """Get information for a specific disease, translated when a language is given"""
+        return localize_record("disease", disease_name, self.diseases.get(disease_name), language)
 
-    def get_all_diseases(self) -> Dict:
+    @traced()
+    def get_all_diseases(self, language: Optional[str] = None) -> Dict:
         """Get all diseases in the database"""
-        return self.diseases
+        if not language:
+            return self.diseases
+        return {name: localize_record("disease", name, info, language) for name, info in self.diseases.items()}
 
+    @traced()
     def search_diseases(self, search_term: str) -> List[str]:
         """Search for diseases by name or symptoms"""
         search_term = search_term.lower()
@@ -166,6 +173,7 @@ class DiseaseDatabase:
 
         return matching_diseases
 
+    @traced()
     def get_diseases_by_category(self, category: str) -> List[str]:
         """Get diseases by category"""
         return [name for name, info in self.diseases.items()
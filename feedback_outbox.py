@@ -0,0 +1,409 @@
+import time
+import random
+import sqlite3
+import smtplib
+import argparse
+import threading
+import socketserver
+from datetime import datetime
+from email.mime.text import MIMEText
+from email.mime.multipart import MIMEMultipart
+from typing import Dict, List, Optional
+
+OUTBOX_DB = "outbox.db"
+
+
+# ---------- Durable outbox ----------
+def init_outbox(db_path: str = OUTBOX_DB):
+    conn = sqlite3.connect(db_path)
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS feedback_outbox (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            subject TEXT NOT NULL,
+            body TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            next_attempt_at REAL NOT NULL,
+            last_error TEXT,
+            created_at TEXT NOT NULL,
+            sent_at TEXT
+        )
+    ''')
+    conn.execute("CREATE INDEX IF NOT EXISTS ix_feedback_outbox_due ON feedback_outbox (status, next_attempt_at)")
+    conn.commit()
+    conn.close()
+
+
+def build_feedback_message(disease: str, issue: str) -> Dict[str, str]:
+    subject = f"🩺 Feedback on Disease Info - Pashu Raksha: {disease}"
+    body = f"""Hello Admin,
+
+A user has submitted feedback for the disease: {disease}
+
+Issue or Suggestion:
+{issue}
+
+Please review and take necessary action.
+
+Thank you,
+Pashu Raksha App
+"""
+    return {'subject': subject, 'body': body}
+
+
+def enqueue_message(subject: str, body: str, db_path: str = OUTBOX_DB) -> int:
+    """Store a message in the outbox; delivery happens on the sender worker"""
+    conn = sqlite3.connect(db_path)
+    try:
+        cursor = conn.execute(
+            "INSERT INTO feedback_outbox (subject, body, next_attempt_at, created_at) VALUES (?, ?, ?, ?)",
+            (subject, body, time.time(), datetime.now().isoformat(timespec='seconds'))
+        )
+        conn.commit()
+        return cursor.lastrowid
+    finally:
+        conn.close()
+
+
+def outbox_status(db_path: str = OUTBOX_DB) -> Dict[str, int]:
+    conn = sqlite3.connect(db_path)
+    try:
+        return dict(conn.execute("SELECT status, COUNT(*) FROM feedback_outbox GROUP BY status").fetchall())
+    finally:
+        conn.close()
+
+
+# ---------- SMTP connection pool ----------
+class SMTPConnectionPool:
+    """Keeps authenticated SMTP connections open between sends"""
+
+    def __init__(self, host: str, port: int, username: str, password: str,
+                 use_ssl: bool = True, max_size: int = 2, idle_timeout: float = 60.0, timeout: float = 15.0):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.use_ssl = use_ssl
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.timeout = timeout
+        self._idle = []
+        self._lock = threading.Lock()
+
+    def _connect(self) -> smtplib.SMTP:
+        smtp_class = smtplib.SMTP_SSL if self.use_ssl else smtplib.SMTP
+        server = smtp_class(self.host, self.port, timeout=self.timeout)
+        if self.username:
+            server.login(self.username, self.password)
+        return server
+
+    def acquire(self) -> smtplib.SMTP:
+        """Return a live idle connection, or open and authenticate a new one"""
+        while True:
+            with self._lock:
+                if not self._idle:
+                    break
+                server, last_used = self._idle.pop()
+            if time.monotonic() - last_used < self.idle_timeout:
+                try:
+                    if server.noop()[0] == 250:
+                        return server
+                except smtplib.SMTPException:
+                    pass
+                except OSError:
+                    pass
+            self._close(server)
+        return self._connect()
+
+    def release(self, server: smtplib.SMTP, broken: bool = False) -> None:
+        with self._lock:
+            if not broken and len(self._idle) < self.max_size:
+                self._idle.append((server, time.monotonic()))
+                return
+        self._close(server)
+
+    def close_idle(self) -> None:
+        """Close connections that have been idle longer than idle_timeout"""
+        now = time.monotonic()
+        with self._lock:
+            stale = [s for s, used in self._idle if now - used >= self.idle_timeout]
+            self._idle = [(s, used) for s, used in self._idle if now - used < self.idle_timeout]
+        for server in stale:
+            self._close(server)
+
+    def close_all(self) -> None:
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for server, _ in idle:
+            self._close(server)
+
+    @staticmethod
+    def _close(server: smtplib.SMTP) -> None:
+        try:
+            server.quit()
+        except Exception:
+            try:
+                server.close()
+            except Exception:
+                pass
+
+
+# ---------- Sender worker ----------
+class OutboxWorker(threading.Thread):
+    """Background thread that delivers queued messages in batches with retry and backoff"""
+
+    def __init__(self, pool: SMTPConnectionPool, sender: str, receiver: str, db_path: str = OUTBOX_DB,
+                 batch_size: int = 20, poll_interval: float = 2.0, max_attempts: int = 8,
+                 base_delay: float = 5.0, max_delay: float = 3600.0):
+        super().__init__(name="feedback-outbox", daemon=True)
+        self.pool = pool
+        self.sender = sender
+        self.receiver = receiver
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+
+    def notify(self) -> None:
+        """Wake the worker immediately instead of waiting for the next poll"""
+        self._wake.set()
+
+    def stop(self) -> None:
+        self._stopping.set()
+        self._wake.set()
+
+    def run(self) -> None:
+        while not self._stopping.is_set():
+            try:
+                sent = self.deliver_due()
+            except Exception as e:
+                print("Outbox error:", e)
+                sent = 0
+            # Drain a backlog without sleeping; otherwise wait for new mail
+            if sent < self.batch_size:
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+                self.pool.close_idle()
+        self.pool.close_all()
+
+    def _due_messages(self, conn) -> List[tuple]:
+        return conn.execute(
+            "SELECT id, subject, body, attempts FROM feedback_outbox "
+            "WHERE status = 'pending' AND next_attempt_at <= ? ORDER BY id LIMIT ?",
+            (time.time(), self.batch_size)
+        ).fetchall()
+
+    def _backoff(self, attempts: int) -> float:
+        delay = min(self.max_delay, self.base_delay * 2 ** (attempts - 1))
+        return delay * random.uniform(0.8, 1.2)
+
+    def deliver_due(self) -> int:
+        """Send one batch of due messages over a single pooled connection"""
+        conn = sqlite3.connect(self.db_path)
+        try:
+            batch = self._due_messages(conn)
+            if not batch:
+                return 0
+
+            server = None
+            sent = 0
+            for message_id, subject, body, attempts in batch:
+                try:
+                    if server is None:
+                        server = self.pool.acquire()
+                    server.sendmail(self.sender, self.receiver, self._format(subject, body))
+                    conn.execute(
+                        "UPDATE feedback_outbox SET status = 'sent', attempts = ?, sent_at = ?, last_error = NULL WHERE id = ?",
+                        (attempts + 1, datetime.now().isoformat(timespec='seconds'), message_id)
+                    )
+                    sent += 1
+                except Exception as e:
+                    attempts += 1
+                    status = 'failed' if attempts >= self.max_attempts else 'pending'
+                    conn.execute(
+                        "UPDATE feedback_outbox SET status = ?, attempts = ?, next_attempt_at = ?, last_error = ? WHERE id = ?",
+                        (status, attempts, time.time() + self._backoff(attempts), str(e), message_id)
+                    )
+                    if server is not None and isinstance(e, (smtplib.SMTPServerDisconnected, OSError)):
+                        self.pool.release(server, broken=True)
+                        server = None
+                conn.commit()
+
+            if server is not None:
+                self.pool.release(server)
+            return sent
+        finally:
+            conn.close()
+
+    def _format(self, subject: str, body: str) -> str:
+        msg = MIMEMultipart()
+        msg['From'] = self.sender
+        msg['To'] = self.receiver
+        msg['Subject'] = subject
+        msg.attach(MIMEText(body, 'plain'))
+        return msg.as_string()
+
+
+def create_worker(email_config: Dict, db_path: str = OUTBOX_DB) -> OutboxWorker:
+    """Build a worker from an [email] secrets section"""
+    pool = SMTPConnectionPool(
+        host=email_config.get("smtp_host", "smtp.gmail.com"),
+        port=int(email_config.get("smtp_port", 465)),
+        username=email_config["sender"],
+        password=email_config["app_password"],
+        # Secrets and env overrides give strings; bool("false") would be True
+        use_ssl=str(email_config.get("smtp_ssl", True)).strip().lower() in ("1", "true", "yes")
+    )
+    return OutboxWorker(pool, email_config["sender"], email_config["receiver"], db_path=db_path)
+
+
+_worker = None
+_worker_lock = threading.Lock()
+
+
+def get_outbox_worker() -> OutboxWorker:
+    """Start the process-wide sender worker on first use"""
+    global _worker
+    with _worker_lock:
+        if _worker is None or not _worker.is_alive():
+            import streamlit as st
+            init_outbox()
+            _worker = create_worker(dict(st.secrets["email"]))
+            _worker.start()
+        return _worker
+
+
+def enqueue_feedback(disease: str, issue: str) -> bool:
+    """Queue a feedback email; returns as soon as it is stored durably"""
+    try:
+        worker = get_outbox_worker()
+        message = build_feedback_message(disease, issue)
+        enqueue_message(message['subject'], message['body'], worker.db_path)
+        worker.notify()
+        return True
+    except Exception as e:
+        print("Email error:", e)
+        return False
+
+
+# ---------- Local stand-in SMTP server ----------
+class _SMTPHandler(socketserver.StreamRequestHandler):
+    """Minimal SMTP dialogue: EHLO, AUTH, MAIL, RCPT, DATA, NOOP, RSET, QUIT"""
+
+    def reply(self, line: str) -> None:
+        self.wfile.write((line + "\r\n").encode())
+
+    def handle(self) -> None:
+        server = self.server
+        server.connections += 1
+        self.reply("220 localhost stand-in SMTP")
+        mail_from, rcpt_to = None, []
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode(errors="replace").strip()
+            verb = command.split(" ", 1)[0].upper()
+            if verb in ("EHLO", "HELO"):
+                self.reply("250-localhost")
+                self.reply("250 AUTH PLAIN LOGIN")
+            elif verb == "AUTH":
+                server.logins += 1
+                if server.fail_auth:
+                    self.reply("535 Authentication failed")
+                else:
+                    self.reply("235 Authentication successful")
+            elif verb == "MAIL":
+                mail_from, rcpt_to = command[10:].strip("<> "), []
+                self.reply("250 OK")
+            elif verb == "RCPT":
+                rcpt_to.append(command[8:].strip("<> "))
+                self.reply("250 OK")
+            elif verb == "DATA":
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                data = []
+                while True:
+                    chunk = self.rfile.readline()
+                    if not chunk or chunk in (b".\r\n", b".\n"):
+                        break
+                    data.append(chunk.decode(errors="replace"))
+                server.messages.append({'from': mail_from, 'to': rcpt_to, 'data': "".join(data)})
+                self.reply("250 OK queued")
+            elif verb in ("NOOP", "RSET"):
+                self.reply("250 OK")
+            elif verb == "QUIT":
+                self.reply("221 Bye")
+                return
+            else:
+                self.reply("502 Command not implemented")
+
+
+class LocalSMTPServer(socketserver.ThreadingTCPServer):
+    """Plain-text SMTP server on localhost that records messages, for tests and development"""
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, port: int = 0):
+        super().__init__(("127.0.0.1", port), _SMTPHandler)
+        self.messages = []
+        self.connections = 0
+        self.logins = 0
+        self.fail_auth = False
+        self._thread = None
+
+    @property
+    def port(self) -> int:
+        return self.server_address[1]
+
+    def start(self) -> "LocalSMTPServer":
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Feedback outbox tools")
+    parser.add_argument("--status", action="store_true", help="Show message counts by status")
+    parser.add_argument("--demo", type=int, metavar="N", help="Deliver N messages to a local stand-in SMTP server")
+    args = parser.parse_args()
+
+    if args.status:
+        init_outbox()
+        print(outbox_status())
+    elif args.demo:
+        import os
+        import tempfile
+
+        smtp = LocalSMTPServer().start()
+        db_path = os.path.join(tempfile.mkdtemp(), "outbox.db")
+        init_outbox(db_path)
+        worker = create_worker({"smtp_host": "127.0.0.1", "smtp_port": smtp.port, "smtp_ssl": False,
+                                "sender": "app@localhost", "receiver": "admin@localhost",
+                                "app_password": "secret"}, db_path=db_path)
+        started = time.perf_counter()
+        for i in range(args.demo):
+            message = build_feedback_message(f"Disease {i}", "Demo feedback")
+            enqueue_message(message['subject'], message['body'], db_path)
+        enqueued = time.perf_counter() - started
+        worker.start()
+        while len(smtp.messages) < args.demo and time.perf_counter() - started < 30:
+            time.sleep(0.05)
+        worker.stop()
+        worker.join()
+        smtp.stop()
+        print(f"Enqueued {args.demo} messages in {enqueued * 1000:.1f} ms; delivered {len(smtp.messages)} "
+              f"over {smtp.connections} connection(s) with {smtp.logins} login(s)")
+    else:
+        parser.print_help()
+
+
+if __name__ == "__main__":
+    main()
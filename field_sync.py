@@ -0,0 +1,555 @@
+import os
+import io
+import json
+import time
+import uuid
+import hmac
+import zlib
+import struct
+import sqlite3
+import hashlib
+import argparse
+import threading
+import urllib.request
+from datetime import datetime, date
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional, Tuple
+
+SYNC_DB = "field_capture.db"
+# Health record fields a device captures; the server adds ids and timestamps
+RECORD_FIELDS = (
+    'cow_id', 'diagnosis_date', 'disease_name', 'severity', 'confidence_score', 'symptoms', 'treatment_applied',
+    'medication_cost', 'labor_cost', 'supplies_cost', 'total_cost', 'veterinarian', 'notes', 'image_filename',
+    'model_version', 'weight_kg',
+)
+# Photos are sent in their own batches of at most this many bytes
+IMAGE_BATCH_BYTES = 4 * 1024 * 1024
+# The server refuses larger request bodies, and batch headers that inflate beyond this
+MAX_BODY_BYTES = int(float(os.getenv("PASHU_SYNC_MAX_BODY_MB", "32")) * 1024 * 1024)
+MAX_HEADER_BYTES = 64 * 1024 * 1024
+# Signed requests older (or newer) than this are rejected, so a captured request cannot be replayed later
+SIGNATURE_MAX_AGE_SECONDS = 300
+
+
+# ---------- Wire format ----------
+def encode_batch(header: Dict, blobs: List[bytes] = ()) -> bytes:
+    """zlib-compressed JSON header, then raw blobs (photos are already compressed)"""
+    header = dict(header, blob_sizes=[len(b) for b in blobs])
+    meta = zlib.compress(json.dumps(header, default=_json_default, separators=(",", ":")).encode(), 6)
+    return struct.pack(">I", len(meta)) + meta + b"".join(blobs)
+
+
+def decode_batch(data: bytes) -> Tuple[Dict, List[bytes]]:
+    (meta_size,) = struct.unpack(">I", data[:4])
+    inflater = zlib.decompressobj()
+    meta = inflater.decompress(data[4:4 + meta_size], MAX_HEADER_BYTES)
+    if inflater.unconsumed_tail:
+        raise ValueError(f"Batch header larger than {MAX_HEADER_BYTES} bytes")
+    header = json.loads(meta)
+    blobs, offset = [], 4 + meta_size
+    for size in header.pop('blob_sizes', []):
+        blobs.append(data[offset:offset + size])
+        offset += size
+    return header, blobs
+
+
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+# ---------- On-device queue ----------
+def init_capture_queue(db_path: str = SYNC_DB):
+    conn = sqlite3.connect(db_path)
+    conn.executescript('''
+        CREATE TABLE IF NOT EXISTS captured_records (
+            client_id TEXT PRIMARY KEY,
+            payload TEXT NOT NULL,
+            updated_at TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            last_error TEXT
+        );
+        CREATE INDEX IF NOT EXISTS ix_captured_records_status ON captured_records (status);
+        CREATE TABLE IF NOT EXISTS captured_images (
+            digest TEXT PRIMARY KEY,
+            data BLOB NOT NULL,
+            uploaded INTEGER NOT NULL DEFAULT 0
+        );
+        CREATE TABLE IF NOT EXISTS knowledge_cache (
+            kind TEXT NOT NULL,
+            item_id INTEGER NOT NULL,
+            payload TEXT NOT NULL,
+            PRIMARY KEY (kind, item_id)
+        );
+        CREATE TABLE IF NOT EXISTS sync_state (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        );
+    ''')
+    conn.commit()
+    conn.close()
+
+
+class CaptureQueue:
+    """Diagnoses, health records and photos captured on a field device without connectivity.
+
+    Records get a client-generated UUID when captured, so the central
+    server can apply them idempotently however many times a sync is retried.
+    """
+
+    def __init__(self, db_path: str = SYNC_DB):
+        self.db_path = db_path
+        init_capture_queue(db_path)
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.db_path)
+
+    def capture(self, record: Dict, image: Optional[bytes] = None) -> str:
+        """Queue a health record (and its photo); returns the record's client_id"""
+        record = {field: record.get(field) for field in RECORD_FIELDS}
+        conn = self._connect()
+        try:
+            if image is not None:
+                digest = hashlib.sha256(image).hexdigest()
+                conn.execute("INSERT OR IGNORE INTO captured_images (digest, data) VALUES (?, ?)", (digest, image))
+                record['image_filename'] = digest
+            client_id = str(uuid.uuid4())
+            conn.execute("INSERT INTO captured_records (client_id, payload, updated_at) VALUES (?, ?, ?)",
+                         (client_id, json.dumps(record, default=_json_default), _now()))
+            conn.commit()
+            return client_id
+        finally:
+            conn.close()
+
+    def edit(self, client_id: str, changes: Dict) -> bool:
+        """Change a captured record; it is queued again with a newer timestamp"""
+        conn = self._connect()
+        try:
+            row = conn.execute("SELECT payload FROM captured_records WHERE client_id = ?", (client_id,)).fetchone()
+            if row is None:
+                return False
+            record = json.loads(row[0])
+            record.update({k: v for k, v in changes.items() if k in RECORD_FIELDS})
+            conn.execute("UPDATE captured_records SET payload = ?, updated_at = ?, status = 'pending' "
+                         "WHERE client_id = ?", (json.dumps(record, default=_json_default), _now(), client_id))
+            conn.commit()
+            return True
+        finally:
+            conn.close()
+
+    def pending_records(self, limit: int) -> List[Dict]:
+        conn = self._connect()
+        try:
+            rows = conn.execute("SELECT client_id, payload, updated_at FROM captured_records "
+                                "WHERE status = 'pending' ORDER BY updated_at LIMIT ?", (limit,)).fetchall()
+        finally:
+            conn.close()
+        return [dict(json.loads(payload), client_id=client_id, client_updated_at=updated_at)
+                for client_id, payload, updated_at in rows]
+
+    def pending_images(self, max_bytes: int) -> List[Tuple[str, bytes]]:
+        """Photos not yet uploaded, up to max_bytes (always at least one)"""
+        conn = self._connect()
+        try:
+            batch, total = [], 0
+            for digest, size in conn.execute("SELECT digest, length(data) FROM captured_images WHERE uploaded = 0"):
+                if batch and total + size > max_bytes:
+                    break
+                batch.append(digest)
+                total += size
+            return [(d, conn.execute("SELECT data FROM captured_images WHERE digest = ?", (d,)).fetchone()[0])
+                    for d in batch]
+        finally:
+            conn.close()
+
+    def mark_synced(self, records: List[Dict]) -> None:
+        """Mark records synced unless they were edited again after the batch was read"""
+        conn = self._connect()
+        try:
+            conn.executemany("UPDATE captured_records SET status = 'synced', last_error = NULL "
+                             "WHERE client_id = ? AND updated_at = ?",
+                             [(r['client_id'], r['client_updated_at']) for r in records])
+            conn.commit()
+        finally:
+            conn.close()
+
+    def mark_failed(self, records: List[Dict], error: str) -> None:
+        conn = self._connect()
+        try:
+            conn.executemany("UPDATE captured_records SET attempts = attempts + 1, last_error = ? WHERE client_id = ?",
+                             [(error, r['client_id']) for r in records])
+            conn.commit()
+        finally:
+            conn.close()
+
+    def adopt(self, server_records: List[Dict]) -> None:
+        """Replace local copies that lost a conflict with the server's newer version"""
+        conn = self._connect()
+        try:
+            for record in server_records:
+                payload = {field: record.get(field) for field in RECORD_FIELDS}
+                conn.execute("UPDATE captured_records SET payload = ?, updated_at = ?, status = 'synced' "
+                             "WHERE client_id = ?", (json.dumps(payload, default=_json_default),
+                                                     str(record['client_updated_at']), record['client_id']))
+            conn.commit()
+        finally:
+            conn.close()
+
+    def mark_images_uploaded(self, digests: List[str]) -> None:
+        """Drop uploaded photo bytes; the central image store now holds them"""
+        conn = self._connect()
+        try:
+            conn.executemany("UPDATE captured_images SET uploaded = 1, data = x'' WHERE digest = ?",
+                             [(d,) for d in digests])
+            conn.commit()
+        finally:
+            conn.close()
+
+    # ---------- Knowledge base ----------
+    def get_state(self, key: str) -> Optional[str]:
+        conn = self._connect()
+        try:
+            row = conn.execute("SELECT value FROM sync_state WHERE key = ?", (key,)).fetchone()
+            return row[0] if row else None
+        finally:
+            conn.close()
+
+    def store_knowledge(self, changes: Dict) -> int:
+        conn = self._connect()
+        try:
+            stored = 0
+            for kind, rows in changes.items():
+                if kind == 'cursor':
+                    continue
+                conn.executemany("INSERT OR REPLACE INTO knowledge_cache (kind, item_id, payload) VALUES (?, ?, ?)",
+                                 [(kind, row['id'], json.dumps(row, default=_json_default)) for row in rows])
+                stored += len(rows)
+            if changes.get('cursor'):
+                conn.execute("INSERT OR REPLACE INTO sync_state (key, value) VALUES ('knowledge_cursor', ?)",
+                             (str(changes['cursor']),))
+            conn.commit()
+            return stored
+        finally:
+            conn.close()
+
+    def knowledge(self, kind: str) -> List[Dict]:
+        """Locally cached treatment_protocols or veterinarians"""
+        conn = self._connect()
+        try:
+            return [json.loads(p) for (p,) in conn.execute(
+                "SELECT payload FROM knowledge_cache WHERE kind = ? ORDER BY item_id", (kind,))]
+        finally:
+            conn.close()
+
+    def status(self) -> Dict[str, int]:
+        conn = self._connect()
+        try:
+            counts = dict(conn.execute("SELECT status, COUNT(*) FROM captured_records GROUP BY status").fetchall())
+            counts['images_pending'] = conn.execute(
+                "SELECT COUNT(*) FROM captured_images WHERE uploaded = 0").fetchone()[0]
+            return counts
+        finally:
+            conn.close()
+
+
+def _now() -> str:
+    return datetime.now().isoformat(timespec='microseconds')
+
+
+# ---------- Request signing ----------
+def sign_request(token: str, path: str, timestamp: str, body: bytes) -> str:
+    """HMAC-SHA256 of the path, timestamp and body under the shared sync token"""
+    message = path.encode() + b"\n" + timestamp.encode() + b"\n" + body
+    return hmac.new(token.encode(), message, hashlib.sha256).hexdigest()
+
+
+def verify_request(token: str, path: str, timestamp: Optional[str], signature: Optional[str], body: bytes) -> bool:
+    if not timestamp or not signature:
+        return False
+    try:
+        age = abs(time.time() - float(timestamp))
+    except ValueError:
+        return False
+    return age <= SIGNATURE_MAX_AGE_SECONDS and hmac.compare_digest(sign_request(token, path, timestamp, body), signature)
+
+
+def sync_token() -> str:
+    """Shared secret of the devices and the central sync endpoint (PASHU_SYNC_TOKEN)"""
+    token = os.getenv("PASHU_SYNC_TOKEN", "")
+    if not token:
+        raise RuntimeError("PASHU_SYNC_TOKEN is not set")
+    return token
+
+
+# ---------- Sync engine ----------
+def http_transport(base_url: str, token: str, timeout: float = 30.0) -> Callable[[str, bytes], bytes]:
+    def post(path: str, body: bytes) -> bytes:
+        timestamp = f"{time.time():.3f}"
+        request = urllib.request.Request(base_url.rstrip("/") + path, data=body, method="POST",
+                                         headers={"Content-Type": "application/octet-stream",
+                                                  "X-Pashu-Timestamp": timestamp,
+                                                  "X-Pashu-Signature": sign_request(token, path, timestamp, body)})
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            return response.read()
+    return post
+
+
+class SyncEngine:
+    """Pushes the capture queue to the central server and pulls knowledge-base changes.
+
+    Photos go first, so a record never references an image the server does
+    not have; records follow in compressed batches. Every request can be
+    retried safely: photos are content-addressed and records are upserted
+    by client_id.
+    """
+
+    def __init__(self, queue: CaptureQueue, transport: Callable[[str, bytes], bytes], batch_size: int = 200,
+                 image_batch_bytes: int = IMAGE_BATCH_BYTES):
+        self.queue = queue
+        self.transport = transport
+        self.batch_size = batch_size
+        self.image_batch_bytes = image_batch_bytes
+        self._lock = threading.Lock()
+
+    def _post(self, path: str, body: bytes, stats: Dict) -> Dict:
+        response = self.transport(path, body)
+        stats['bytes_sent'] += len(body)
+        stats['bytes_received'] += len(response)
+        stats['bytes_sent_by_endpoint'][path] = stats['bytes_sent_by_endpoint'].get(path, 0) + len(body)
+        stats['requests'] += 1
+        return decode_batch(response)[0]
+
+    def sync(self) -> Dict:
+        with self._lock:
+            stats = {'records': 0, 'inserted': 0, 'updated': 0, 'unchanged': 0, 'conflicts': 0, 'images': 0,
+                     'knowledge_items': 0, 'bytes_sent': 0, 'bytes_received': 0, 'requests': 0,
+                     'bytes_sent_by_endpoint': {}}
+            started = time.perf_counter()
+            self._push_images(stats)
+            self._push_records(stats)
+            self._pull_knowledge(stats)
+            stats['seconds'] = time.perf_counter() - started
+            stats['records_per_second'] = stats['records'] / stats['seconds'] if stats['seconds'] else 0.0
+            return stats
+
+    def _push_images(self, stats: Dict) -> None:
+        while True:
+            images = self.queue.pending_images(self.image_batch_bytes)
+            if not images:
+                return
+            reply = self._post("/images", encode_batch({'digests': [d for d, _ in images]},
+                                                        [data for _, data in images]), stats)
+            self.queue.mark_images_uploaded(reply['stored'])
+            stats['images'] += len(reply['stored'])
+            if len(reply['stored']) < len(images):
+                raise RuntimeError(f"Server rejected {len(images) - len(reply['stored'])} photo(s)")
+
+    def _push_records(self, stats: Dict) -> None:
+        while True:
+            records = self.queue.pending_records(self.batch_size)
+            if not records:
+                return
+            try:
+                reply = self._post("/records", encode_batch({'records': records}), stats)
+            except Exception as e:
+                self.queue.mark_failed(records, str(e))
+                raise
+            self.queue.mark_synced(records)
+            self.queue.adopt(reply['conflicts'])
+            stats['records'] += len(records)
+            for key in ('inserted', 'updated', 'unchanged'):
+                stats[key] += reply[key]
+            stats['conflicts'] += len(reply['conflicts'])
+
+    def _pull_knowledge(self, stats: Dict) -> None:
+        reply = self._post("/knowledge", encode_batch({'since': self.queue.get_state('knowledge_cursor')}), stats)
+        stats['knowledge_items'] += self.queue.store_knowledge(reply)
+
+
+# ---------- Central endpoint ----------
+def _parse_datetime(value):
+    return datetime.fromisoformat(value) if isinstance(value, str) else value
+
+
+def handle_sync_request(db_manager, store, path: str, body: bytes) -> bytes:
+    """Serve one sync request against the central DatabaseManager and image store"""
+    header, blobs = decode_batch(body)
+    if path == "/images":
+        stored = [digest for digest, data in zip(header['digests'], blobs) if store.put(data) == digest]
+        return encode_batch({'stored': stored})
+    if path == "/records":
+        records = [
+            dict({field: record.get(field) for field in RECORD_FIELDS}, client_id=record['client_id'],
+                 diagnosis_date=_parse_datetime(record.get('diagnosis_date')),
+                 client_updated_at=_parse_datetime(record['client_updated_at']))
+            for record in header['records']
+        ]
+        return encode_batch(db_manager.upsert_synced_records(records))
+    if path == "/knowledge":
+        return encode_batch(db_manager.get_knowledge_changes(_parse_datetime(header.get('since'))))
+    raise ValueError(f"Unknown sync endpoint {path}")
+
+
+class _SyncHandler(BaseHTTPRequestHandler):
+    def do_POST(self) -> None:
+        try:
+            length = int(self.headers.get("Content-Length", ""))
+        except ValueError:
+            return self._reply(411, b"Content-Length required")
+        if length < 0 or length > self.server.max_body_bytes:
+            return self._reply(413, f"Request body over {self.server.max_body_bytes} bytes".encode())
+        body = self.rfile.read(length)
+        if not verify_request(self.server.token, self.path, self.headers.get("X-Pashu-Timestamp"),
+                              self.headers.get("X-Pashu-Signature"), body):
+            return self._reply(401, b"Bad or expired request signature")
+        try:
+            reply = handle_sync_request(self.server.db_manager, self.server.store, self.path, body)
+            self._reply(200, reply)
+        except Exception as e:
+            self._reply(400, str(e).encode())
+
+    def _reply(self, status: int, reply: bytes) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Content-Length", str(len(reply)))
+        self.end_headers()
+        self.wfile.write(reply)
+
+    def log_message(self, format, *args) -> None:
+        pass
+
+
+class LocalSyncServer(ThreadingHTTPServer):
+    """Central sync endpoint; binds to localhost by default.
+
+    Every request must be signed with the shared token (see sign_request),
+    and bodies over max_body_bytes are refused before they are read.
+    """
+    daemon_threads = True
+
+    def __init__(self, db_manager, store, token: str, port: int = 0, host: str = "127.0.0.1",
+                 max_body_bytes: int = MAX_BODY_BYTES):
+        if not token:
+            raise ValueError("The sync endpoint needs a shared token")
+        super().__init__((host, port), _SyncHandler)
+        self.db_manager = db_manager
+        self.store = store
+        self.token = token
+        self.max_body_bytes = max_body_bytes
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def start(self) -> "LocalSyncServer":
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+
+
+def offline_capture_enabled() -> bool:
+    """PASHU_OFFLINE_CAPTURE=1 queues saved diagnoses on the device instead of writing the central database"""
+    return os.getenv("PASHU_OFFLINE_CAPTURE", "0") == "1"
+
+
+def get_capture_queue() -> CaptureQueue:
+    import streamlit as st
+
+    @st.cache_resource
+    def _queue():
+        return CaptureQueue(os.getenv("PASHU_CAPTURE_DB", SYNC_DB))
+
+    return _queue()
+
+
+def get_sync_engine() -> SyncEngine:
+    """Engine for PASHU_SYNC_URL, the central server's sync endpoint, signing with PASHU_SYNC_TOKEN"""
+    return SyncEngine(get_capture_queue(), http_transport(os.environ["PASHU_SYNC_URL"], sync_token()))
+
+
+def _demo(count: int, image_kb: int) -> None:
+    import random
+    import tempfile
+    from PIL import Image
+
+    workdir = tempfile.mkdtemp()
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(workdir, 'central.db')}"
+    from database import DatabaseManager
+    from image_store import ImageStore
+
+    db_manager = DatabaseManager()
+    db_manager.add_veterinarian({'name': "Dr. Demo", 'phone': "0000000000", 'location': "Demo"})
+    token = uuid.uuid4().hex
+    server = LocalSyncServer(db_manager, ImageStore(os.path.join(workdir, "image_store")), token).start()
+    queue = CaptureQueue(os.path.join(workdir, "device.db"))
+
+    rng = random.Random(0)
+    side = max(16, int((image_kb * 1024 / 3) ** 0.5))
+    photos = []
+    for _ in range(max(1, count // 10)):
+        buffer = io.BytesIO()
+        Image.frombytes("RGB", (side, side), os.urandom(side * side * 3)).save(buffer, format="JPEG", quality=80)
+        photos.append(buffer.getvalue())
+    diseases = ["Mastitis", "Foot and Mouth Disease", "Lumpy Skin Disease", "Bloat", "Ringworm"]
+    record_bytes = photo_bytes = 0
+    for i in range(count):
+        record = {'cow_id': f"COW-{rng.randint(1, 500):04d}", 'diagnosis_date': date.today(),
+                  'disease_name': rng.choice(diseases), 'severity': rng.choice(["mild", "moderate", "severe"]),
+                  'confidence_score': rng.random(), 'notes': "Captured offline during a farm visit"}
+        photo = photos[i // 10] if i % 10 == 0 and i // 10 < len(photos) else None
+        queue.capture(record, photo)
+        record_bytes += len(json.dumps(record, default=_json_default))
+        photo_bytes += len(photo) if photo else 0
+
+    engine = SyncEngine(queue, http_transport(server.url, token))
+    stats = engine.sync()
+    retry = engine.sync()
+    server.stop()
+    print(f"Synced {stats['records']} records and {stats['images']} photos in {stats['seconds']:.2f}s "
+          f"({stats['records_per_second']:.0f} records/s, {stats['requests']} requests)")
+    sent = stats['bytes_sent_by_endpoint']
+    print(f"Bytes on wire: records {sent['/records'] / 1024:.1f} KB (JSON {record_bytes / 1024:.1f} KB), "
+          f"photos {sent['/images'] / 1024:.1f} KB ({photo_bytes / 1024:.1f} KB), "
+          f"{stats['bytes_received'] / 1024:.1f} KB received; {stats['knowledge_items']} knowledge items pulled")
+    print(f"Second sync: {retry['records']} records, {retry['bytes_sent']} bytes sent")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline field capture and sync")
+    parser.add_argument("--status", action="store_true", help="Show queued records and photos")
+    parser.add_argument("--sync", action="store_true", help="Sync the queue with PASHU_SYNC_URL")
+    parser.add_argument("--serve", type=int, metavar="PORT", help="Serve the sync endpoint for the central database")
+    parser.add_argument("--host", default="127.0.0.1",
+                        help="Address to serve on; use 0.0.0.0 only behind TLS on a trusted network")
+    parser.add_argument("--demo", type=int, metavar="N", help="Capture N records and sync them to a local stand-in server")
+    parser.add_argument("--image-kb", type=int, default=120, help="Approximate size of demo photos")
+    args = parser.parse_args()
+
+    db_path = os.getenv("PASHU_CAPTURE_DB", SYNC_DB)
+    if args.status:
+        print(CaptureQueue(db_path).status())
+    elif args.sync:
+        stats = SyncEngine(CaptureQueue(db_path), http_transport(os.environ["PASHU_SYNC_URL"], sync_token())).sync()
+        print(stats)
+    elif args.serve:
+        from database import DatabaseManager
+        from image_store import ImageStore, STORE_DIR
+        server = LocalSyncServer(DatabaseManager(), ImageStore(os.getenv("PASHU_IMAGE_STORE", STORE_DIR)),
+                                 sync_token(), args.serve, host=args.host)
+        print(f"Serving sync endpoint on {args.host}:{args.serve}")
+        server.serve_forever()
+    elif args.demo:
+        _demo(args.demo, args.image_kb)
+    else:
+        parser.print_help()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+import os
+import json
+import argparse
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+HASH_SIZE = 8
+# pHash bits that may differ for two images to count as near-duplicates (of 64)
+DUPLICATE_DISTANCE = 6
+
+
+def _grayscale(images: Iterable[Image.Image], size: Tuple[int, int]) -> np.ndarray:
+    return np.stack([np.asarray(img.convert("L").resize(size, Image.LANCZOS), dtype=np.float32) for img in images])
+
+
+def _pack(bits: np.ndarray) -> np.ndarray:
+    """(N, 64) booleans -> (N,) uint64"""
+    return np.packbits(bits.reshape(len(bits), -1), axis=1).view(">u8").ravel().astype(np.uint64)
+
+
+def _dct_matrix(n: int) -> np.ndarray:
+    k = np.arange(n)[:, None]
+    matrix = np.cos(np.pi * (2 * np.arange(n)[None, :] + 1) * k / (2 * n)) * np.sqrt(2 / n)
+    matrix[0] /= np.sqrt(2)
+    return matrix.astype(np.float32)
+
+
+_DCT = _dct_matrix(HASH_SIZE * 4)
+
+
+def dhash_batch(images: List[Image.Image]) -> np.ndarray:
+    """Difference hash: sign of the horizontal gradient on a 9x8 thumbnail"""
+    pixels = _grayscale(images, (HASH_SIZE + 1, HASH_SIZE))
+    return _pack(pixels[:, :, 1:] > pixels[:, :, :-1])
+
+
+def phash_batch(images: List[Image.Image]) -> np.ndarray:
+    """Perceptual hash: low-frequency 8x8 DCT coefficients of a 32x32 thumbnail vs their median"""
+    pixels = _grayscale(images, (HASH_SIZE * 4, HASH_SIZE * 4))
+    low = np.einsum("ij,njk,lk->nil", _DCT, pixels, _DCT)[:, :HASH_SIZE, :HASH_SIZE].reshape(len(pixels), -1)
+    # The DC term only reflects overall brightness, so it is left out of the median
+    median = np.median(low[:, 1:], axis=1, keepdims=True)
+    return _pack(low > median)
+
+
+def phash(image: Image.Image) -> int:
+    return int(phash_batch([image])[0])
+
+
+def hamming(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+def hamming_matrix(hashes: np.ndarray) -> np.ndarray:
+    """All pairwise distances between (N,) uint64 hashes"""
+    return np.bitwise_count(hashes[:, None] ^ hashes[None, :])
+
+
+class BKTree:
+    """Metric tree over 64-bit hashes under Hamming distance.
+
+    A query with radius r only descends into children whose edge distance
+    lies within r of the distance to the current node, so lookups touch a
+    small fraction of the tree.
+    """
+
+    def __init__(self):
+        self.root = None
+        self.size = 0
+
+    def add(self, value: int, item) -> None:
+        node = [value, item, {}]
+        self.size += 1
+        if self.root is None:
+            self.root = node
+            return
+        current = self.root
+        while True:
+            distance = hamming(value, current[0])
+            child = current[2].get(distance)
+            if child is None:
+                current[2][distance] = node
+                return
+            current = child
+
+    def query(self, value: int, radius: int) -> List[Tuple[int, object]]:
+        """(distance, item) for every stored hash within radius, nearest first"""
+        if self.root is None:
+            return []
+        found = []
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            distance = hamming(value, node[0])
+            if distance <= radius:
+                found.append((distance, node[1]))
+            for edge, child in node[2].items():
+                if distance - radius <= edge <= distance + radius:
+                    stack.append(child)
+        return sorted(found, key=lambda f: f[0])
+
+
+class DuplicateFilter:
+    """Remembers hashes seen so far and reports which earlier image a new one duplicates"""
+
+    def __init__(self, max_distance: int = DUPLICATE_DISTANCE):
+        self.max_distance = max_distance
+        self.tree = BKTree()
+
+    def check(self, image: Image.Image, item) -> Optional[object]:
+        """Item of the nearest earlier duplicate, or None (and remember this image)"""
+        value = phash(image)
+        matches = self.tree.query(value, self.max_distance)
+        if matches:
+            return matches[0][1]
+        self.tree.add(value, item)
+        return None
+
+
+def duplicate_groups(hashes: np.ndarray, max_distance: int = DUPLICATE_DISTANCE) -> List[List[int]]:
+    """Connected components of images within max_distance of each other (groups of 2+)"""
+    tree = BKTree()
+    parent = list(range(len(hashes)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for i, value in enumerate(hashes.tolist()):
+        for _, j in tree.query(value, max_distance):
+            parent[find(i)] = find(j)
+        tree.add(value, i)
+    groups = {}
+    for i in range(len(hashes)):
+        groups.setdefault(find(i), []).append(i)
+    return [g for g in groups.values() if len(g) > 1]
+
+
+# ---------- Dataset audit ----------
+def audit_dataset(dataset_path: str, split: float = 0.2, max_distance: int = DUPLICATE_DISTANCE) -> Dict:
+    """Near-duplicate groups in the training data, flagging cross-class and train/validation leaks"""
+    from cow_disease_model.splits import dataset_files
+
+    entries = dataset_files(dataset_path, split)
+    files = [os.path.relpath(path, dataset_path) for path, _, _, _ in entries]
+    classes = [class_name for _, class_name, _, _ in entries]
+    subsets = [subset for _, _, _, subset in entries]
+
+    hashes = np.empty(len(files), dtype=np.uint64)
+    unreadable = []
+    for start in range(0, len(files), 64):
+        chunk = files[start:start + 64]
+        images = []
+        for name in chunk:
+            try:
+                images.append(Image.open(os.path.join(dataset_path, name)))
+            except Exception:
+                unreadable.append(name)
+                images.append(Image.new("L", (32, 32)))
+        hashes[start:start + len(chunk)] = phash_batch(images)
+
+    groups = []
+    for members in duplicate_groups(hashes, max_distance):
+        members = [m for m in members if files[m] not in unreadable]
+        if len(members) < 2:
+            continue
+        groups.append({
+            'files': [files[m] for m in members],
+            'cross_class': len({classes[m] for m in members}) > 1,
+            'train_validation_leak': len({subsets[m] for m in members}) > 1,
+        })
+    return {
+        'images': len(files),
+        'unreadable': unreadable,
+        'duplicate_groups': groups,
+        'redundant_images': sum(len(g['files']) - 1 for g in groups),
+        'cross_class_groups': sum(g['cross_class'] for g in groups),
+        'leaking_groups': sum(g['train_validation_leak'] for g in groups),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Audit the training dataset for near-duplicate images")
+    parser.add_argument("--dataset", default=os.path.join("cow_disease_model", "dataset"))
+    parser.add_argument("--split", type=float, default=0.2, help="Validation split used in training")
+    parser.add_argument("--max-distance", type=int, default=DUPLICATE_DISTANCE)
+    parser.add_argument("--json", help="Write the full report to this file")
+    args = parser.parse_args()
+
+    report = audit_dataset(args.dataset, args.split, args.max_distance)
+    print(f"{report['images']} images, {len(report['duplicate_groups'])} near-duplicate groups, "
+          f"{report['redundant_images']} redundant images")
+    print(f"  cross-class groups:          {report['cross_class_groups']}")
+    print(f"  train/validation leak groups: {report['leaking_groups']}")
+    for group in report['duplicate_groups']:
+        flags = [f for f, on in (("CROSS-CLASS", group['cross_class']),
+                                 ("LEAK", group['train_validation_leak'])) if on]
+        print(f"  {' '.join(flags) or '-':<17} {', '.join(group['files'])}")
+    for name in report['unreadable']:
+        print(f"  unreadable: {name}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,6 +2,7 @@ import numpy as np
 from PIL import Image, ImageEnhance, ImageFilter
 import cv2
 from typing import Optional, Tuple
+from instrumentation import stage
 
 class ImageProcessor:
     """Class for preprocessing cow images for disease detection"""
@@ -30,13 +31,16 @@ class ImageProcessor:
                 image = image.convert('RGB')
             
             # Enhance image quality
-            enhanced_image = self._enhance_image(image)
+            with stage("enhance"):
+                enhanced_image = self._enhance_image(image)
             
             # Resize image
-            resized_image = self._resize_image(enhanced_image)
+            with stage("resize"):
+                resized_image = self._resize_image(enhanced_image)
             
             # Normalize pixel values
-            normalized_image = self._normalize_image(resized_image)
+            with stage("normalize"):
+                normalized_image = self._normalize_image(resized_image)
             
             # Convert to numpy array
             image_array = np.array(normalized_image)
@@ -167,6 +171,10 @@ class ImageProcessor:
     
     def detect_image_quality(self, image: Image.Image) -> dict:
         """Assess image quality for diagnosis accuracy"""
+        with stage("quality_check"):
+            return self._detect_image_quality(image)
+
+    def _detect_image_quality(self, image: Image.Image) -> dict:
         try:
             img_array = np.array(image)
             
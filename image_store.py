@@ -0,0 +1,171 @@
+import os
+import io
+import time
+import hashlib
+import tempfile
+import argparse
+from typing import Dict, Iterable, Optional
+
+import numpy as np
+from PIL import Image
+
+STORE_DIR = "image_store"
+MODEL_INPUT_SIZE = (224, 224)
+THUMBNAIL_SIZE = (160, 160)
+# Blobs younger than this are never collected, so an upload whose record is not saved yet survives a GC run
+DEFAULT_GC_GRACE_SECONDS = 24 * 3600
+
+
+class ImageStore:
+    """Content-addressed store for diagnosed photos.
+
+    Each image is keyed by the SHA-256 of its bytes and written once, as
+    three derivatives sharded by the first two hex pairs of the digest:
+
+        originals/ab/cd/<digest>.<ext>   the uploaded bytes
+        tensors/ab/cd/<digest>.npy       224x224x3 uint8 model input
+        thumbs/ab/cd/<digest>.jpg        160px JPEG for history views
+
+    Re-diagnosis and similar-case retrieval read the tensor (memory-mapped)
+    instead of decoding the full-size photo again.
+    """
+
+    def __init__(self, root: str = STORE_DIR):
+        self.root = root
+
+    def _path(self, kind: str, digest: str, ext: str) -> str:
+        return os.path.join(self.root, kind, digest[:2], digest[2:4], digest + ext)
+
+    def original_path(self, digest: str) -> Optional[str]:
+        folder = os.path.dirname(self._path("originals", digest, ""))
+        if os.path.isdir(folder):
+            for name in os.listdir(folder):
+                # <digest>.<ext>, not another digest's prefix match or a write still in progress
+                if name.startswith(digest + ".") and not name.endswith(".tmp"):
+                    return os.path.join(folder, name)
+        return None
+
+    def tensor_path(self, digest: str) -> str:
+        return self._path("tensors", digest, ".npy")
+
+    def thumbnail_path(self, digest: str) -> str:
+        return self._path("thumbs", digest, ".jpg")
+
+    def __contains__(self, digest: str) -> bool:
+        return os.path.exists(self.tensor_path(digest))
+
+    # ---------- Ingest ----------
+    def put(self, data: bytes, image: Optional[Image.Image] = None) -> str:
+        """Store an uploaded photo (idempotent); returns its digest"""
+        digest = hashlib.sha256(data).hexdigest()
+        if digest in self:
+            return digest
+        if image is None:
+            image = Image.open(io.BytesIO(data))
+            image.load()
+        ext = "." + (image.format or "bin").lower().replace("jpeg", "jpg")
+        rgb = image.convert("RGB")
+
+        self._write(self._path("originals", digest, ext), data)
+        thumb = rgb.copy()
+        thumb.thumbnail(THUMBNAIL_SIZE)
+        buffer = io.BytesIO()
+        thumb.save(buffer, format="JPEG", quality=85)
+        self._write(self.thumbnail_path(digest), buffer.getvalue())
+        # Same resize as CowDiseaseModel.preprocess_image; stored as uint8, scaled to [0, 1] on load.
+        # Written last: its presence marks the entry complete
+        buffer = io.BytesIO()
+        np.save(buffer, np.asarray(rgb.resize(MODEL_INPUT_SIZE), dtype=np.uint8))
+        self._write(self.tensor_path(digest), buffer.getvalue())
+        return digest
+
+    def _write(self, path: str, data: bytes) -> None:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Unique per call: threads of one process may write the same digest at once
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=os.path.basename(path) + ".", suffix=".tmp")
+        try:
+            os.fchmod(fd, 0o644)  # mkstemp creates 0600
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    # ---------- Read ----------
+    def load_tensor(self, digest: str) -> np.ndarray:
+        """(224, 224, 3) float32 model input in [0, 1]"""
+        return np.load(self.tensor_path(digest), mmap_mode="r").astype(np.float32) / 255.0
+
+    def load_batch(self, digests: Iterable[str]) -> np.ndarray:
+        return np.stack([self.load_tensor(d) for d in digests])
+
+    # ---------- Garbage collection ----------
+    def collect_garbage(self, referenced: Iterable[str], grace_seconds: float = DEFAULT_GC_GRACE_SECONDS,
+                        dry_run: bool = False) -> Dict:
+        """Delete blobs not referenced by any health record and older than the grace period"""
+        referenced = set(referenced)
+        cutoff = time.time() - grace_seconds
+        removed = kept = freed = 0
+        for kind in ("originals", "tensors", "thumbs"):
+            for folder, _, files in os.walk(os.path.join(self.root, kind), topdown=False):
+                for name in files:
+                    path = os.path.join(folder, name)
+                    stale_tmp = name.endswith(".tmp") and os.path.getmtime(path) < cutoff
+                    orphan = name.split(".", 1)[0] not in referenced and os.path.getmtime(path) < cutoff
+                    if not (orphan or stale_tmp):
+                        kept += 1
+                        continue
+                    removed += 1
+                    freed += os.path.getsize(path)
+                    if not dry_run:
+                        os.remove(path)
+                if not dry_run and folder != os.path.join(self.root, kind) and not os.listdir(folder):
+                    os.rmdir(folder)
+        return {'removed_files': removed, 'kept_files': kept, 'freed_mb': freed / 1024 / 1024}
+
+    def stats(self) -> Dict:
+        sizes = {}
+        for kind in ("originals", "tensors", "thumbs"):
+            total = count = 0
+            for folder, _, files in os.walk(os.path.join(self.root, kind)):
+                for name in files:
+                    total += os.path.getsize(os.path.join(folder, name))
+                    count += 1
+            sizes[kind] = {'files': count, 'mb': total / 1024 / 1024}
+        return sizes
+
+
+def get_image_store() -> ImageStore:
+    """Process-wide store shared by all sessions"""
+    import streamlit as st
+
+    @st.cache_resource
+    def _store():
+        return ImageStore(os.getenv("PASHU_IMAGE_STORE", STORE_DIR))
+
+    return _store()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain the diagnosed-image store")
+    parser.add_argument("--root", default=os.getenv("PASHU_IMAGE_STORE", STORE_DIR))
+    parser.add_argument("--gc", action="store_true", help="Delete blobs no health record references")
+    parser.add_argument("--grace-hours", type=float, default=DEFAULT_GC_GRACE_SECONDS / 3600)
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+
+    store = ImageStore(args.root)
+    if args.gc:
+        from database import DatabaseManager
+        referenced = DatabaseManager().get_referenced_images()
+        result = store.collect_garbage(referenced, args.grace_hours * 3600, args.dry_run)
+        verb = "Would remove" if args.dry_run else "Removed"
+        print(f"{verb} {result['removed_files']} files ({result['freed_mb']:.1f} MB); "
+              f"{result['kept_files']} files referenced or within the grace period")
+    for kind, info in store.stats().items():
+        print(f"  {kind:<10} {info['files']:>7} files {info['mb']:>9.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,301 @@
+import time
+import queue
+import argparse
+import itertools
+import threading
+from concurrent.futures import Future
+from typing import Dict, List, Optional
+
+import numpy as np
+from PIL import Image
+
+from instrumentation import stage
+from tracing import traced
+
+# Batches are padded up to one of these sizes so the model sees few distinct shapes
+BATCH_BUCKETS = (1, 2, 4, 8, 16, 32)
+# Queue priorities: interactive requests always run before queued background work
+INTERACTIVE, BACKGROUND, _STOP = 0, 1, 2
+# Model method run for each kind of queued request; a micro-batch runs one forward pass per head
+HEADS = {
+    'probabilities': 'predict_proba_batch',
+    'cascade': 'cascade_proba_batch',
+    'embedding': 'embed_batch',
+}
+
+
+class InferenceService:
+    """Shares one CowDiseaseModel between all Streamlit sessions.
+
+    Sessions preprocess on their own thread and submit the tensor; a single
+    worker thread gathers requests into micro-batches (up to max_batch_size,
+    waiting at most max_wait_ms after the first one) and runs them in one
+    forward pass. predict() keeps the CowDiseaseModel.predict contract, so
+    pages can use the service in place of the model. With a multi-process
+    model, dispatchers > 1 keeps several batches in flight at once.
+    Background work (re-scoring) is submitted to the same queue at a lower
+    priority. The low-resolution cascade pass and similar-case embeddings
+    are queued too, as their own heads, so only the service's workers ever
+    call the model.
+    """
+
+    def __init__(self, model, max_batch_size: int = 16, max_wait_ms: float = 10.0, timeout: float = 60.0,
+                 dispatchers: int = 1):
+        self.model = model
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.timeout = timeout
+        self._queue = queue.PriorityQueue()
+        # Tie-breaker keeping FIFO order within a priority (arrays are not comparable)
+        self._sequence = itertools.count()
+        self._stats = {'requests': 0, 'batches': 0, 'largest_batch': 0}
+        self._stats_lock = threading.Lock()
+        # Background jobs (re-scoring) back off while interactive requests keep arriving
+        self.last_request_at = 0.0
+        self._workers = [threading.Thread(target=self._run, name=f"inference-worker-{i}", daemon=True)
+                         for i in range(dispatchers)]
+        for worker in self._workers:
+            worker.start()
+
+    def __getattr__(self, name):
+        # confidence_threshold, class_names, get_model_info, ... come from the model
+        return getattr(self.model, name)
+
+    # ---------- Client side ----------
+    def submit_array(self, array: np.ndarray, background: bool = False, head: str = 'probabilities') -> Future:
+        """Queue one preprocessed (H, W, 3) or (1, H, W, 3) tensor; resolves to that head's output for it"""
+        future = Future()
+        if not background:
+            self.last_request_at = time.monotonic()
+        self._queue.put((BACKGROUND if background else INTERACTIVE, next(self._sequence), head,
+                         array.reshape(array.shape[-3:]), future))
+        return future
+
+    def predict_proba_batch(self, tensors: np.ndarray, background: bool = False) -> np.ndarray:
+        """Class probabilities for a stack of tensors, computed by the service's workers"""
+        futures = [self.submit_array(tensor, background=background) for tensor in tensors]
+        return np.stack([future.result(timeout=self.timeout) for future in futures])
+
+    def submit(self, img_pil: Image.Image, quality: dict = None) -> Optional[List[Future]]:
+        """Queue an image (one future per TTA view, so the views share a micro-batch)"""
+        with stage("model_preprocess"):
+            preprocessed = self.model.preprocess_views(img_pil, self.model.tta_view_count(quality))
+        if preprocessed is None:
+            return None
+        return [self.submit_array(view) for view in preprocessed]
+
+    def _collect(self, futures: List[Future]) -> np.ndarray:
+        with stage("inference_wait"):
+            preds = [future.result(timeout=self.timeout) for future in futures]
+        return self.model.calibrated(np.stack(preds))
+
+    def _early_exit(self, img_pil: Image.Image, quality: dict = None):
+        """Cascade answer from the low-resolution pass, if confident (only when TTA is not needed)"""
+        if self.model.tta_view_count(quality) > 1:
+            return None
+        try:
+            preprocessed = self.model.preprocess_cascade(img_pil)
+            if preprocessed is None:
+                return None
+            future = self.submit_array(preprocessed, head='cascade')
+            with stage("inference_wait"):
+                preds = future.result(timeout=self.timeout)
+            return self.model.cascade_exit(preds)
+        except Exception as e:
+            print(f"❌ Cascade pass failed: {e}")
+            return None
+
+    def embed(self, img_pil: Image.Image):
+        """128-d embedding of one image, computed by the service's workers, or None when unavailable"""
+        if getattr(self.model, 'embedding_model', None) is None:
+            return None
+        preprocessed = self.model.preprocess_image(img_pil)
+        if preprocessed is None:
+            return None
+        future = self.submit_array(preprocessed, head='embedding')
+        with stage("inference_wait"):
+            return future.result(timeout=self.timeout)
+
+    @traced()
+    def predict(self, img_pil: Image.Image, quality: dict = None):
+        if not self.model.model_loaded:
+            print("❌ Model is not loaded.")
+            return []
+        early = self._early_exit(img_pil, quality)
+        if early is not None:
+            return self.model.top_predictions(early)
+        futures = self.submit(img_pil, quality)
+        if futures is None:
+            return []
+        try:
+            return self.model.top_predictions(self._collect(futures))
+        except Exception as e:
+            print(f"❌ Prediction failed: {e}")
+            return []
+
+    @traced()
+    def predict_many(self, images: List[Image.Image], qualities: List[dict] = None) -> List[list]:
+        """Submit several images at once so they share micro-batches"""
+        qualities = qualities or [None] * len(images)
+        pending = []
+        for img, quality in zip(images, qualities):
+            early = self._early_exit(img, quality) if self.model.model_loaded else None
+            if early is not None:
+                pending.append(early)
+            else:
+                pending.append(self.submit(img, quality) if self.model.model_loaded else None)
+        results = []
+        for futures in pending:
+            try:
+                if isinstance(futures, np.ndarray):
+                    results.append(self.model.top_predictions(futures))
+                else:
+                    results.append(self.model.top_predictions(self._collect(futures)) if futures else [])
+            except Exception as e:
+                print(f"❌ Prediction failed: {e}")
+                results.append([])
+        return results
+
+    def stats(self) -> Dict:
+        stats = dict(self._stats)
+        stats['mean_batch'] = stats['requests'] / stats['batches'] if stats['batches'] else 0.0
+        stats['queued'] = self._queue.qsize()
+        return stats
+
+    def close(self) -> None:
+        for _ in self._workers:
+            self._queue.put((_STOP, next(self._sequence), None, None, None))
+        for worker in self._workers:
+            worker.join()
+
+    # ---------- Worker side ----------
+    def _run(self) -> None:
+        while True:
+            first = self._queue.get()
+            if first[0] == _STOP:
+                return
+            batch = [first[2:]]
+            deadline = time.monotonic() + self.max_wait
+            stopping = False
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item[0] == _STOP:
+                    stopping = True
+                    break
+                batch.append(item[2:])
+            self._run_batch(batch)
+            if stopping:
+                return
+
+    def _run_batch(self, batch: List) -> None:
+        # Drop requests whose caller already gave up
+        batch = [(head, array, future) for head, array, future in batch if future.set_running_or_notify_cancel()]
+        if not batch:
+            return
+        for head in dict.fromkeys(head for head, _, _ in batch):
+            group = [(array, future) for h, array, future in batch if h == head]
+            try:
+                arrays = np.stack([array for array, _ in group]).astype(np.float32, copy=False)
+                size = next((b for b in BATCH_BUCKETS if b >= len(group)), len(group))
+                if size > len(group):
+                    arrays = np.concatenate([arrays, np.zeros((size - len(group),) + arrays.shape[1:], arrays.dtype)])
+                outputs = getattr(self.model, HEADS[head])(arrays)
+                for i, (_, future) in enumerate(group):
+                    future.set_result(outputs[i])
+            except Exception as e:
+                for _, future in group:
+                    future.set_exception(e)
+        with self._stats_lock:
+            self._stats['requests'] += len(batch)
+            self._stats['batches'] += 1
+            self._stats['largest_batch'] = max(self._stats['largest_batch'], len(batch))
+
+
+# ---------- Benchmark ----------
+class SyntheticModel:
+    """Stand-in with a fixed per-call overhead plus per-image cost, like a Keras forward pass"""
+    model_loaded = True
+    model_version = "synthetic"
+    class_names = [f"class_{i}" for i in range(10)]
+
+    def __init__(self, call_ms: float, item_ms: float):
+        self.call_ms = call_ms
+        self.item_ms = item_ms
+        self._lock = threading.Lock()
+
+    def preprocess_image(self, img_pil, target_size=(224, 224)):
+        return np.zeros((1, 224, 224, 3), np.float32)
+
+    def preprocess_views(self, img_pil, k, target_size=(224, 224)):
+        return self.preprocess_image(img_pil, target_size)
+
+    def tta_view_count(self, quality=None):
+        return 1
+
+    def preprocess_cascade(self, img_pil):
+        return None
+
+    def calibrated(self, preds):
+        return preds[0]
+
+    def predict_proba_batch(self, batch):
+        with self._lock:  # one model, one forward pass at a time
+            time.sleep((self.call_ms + self.item_ms * len(batch)) / 1000)
+        return np.full((len(batch), 10), 0.1, np.float32)
+
+    def top_predictions(self, preds, k=3):
+        return [(self.class_names[0], float(preds[0]))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Throughput of direct vs micro-batched inference under concurrency")
+    parser.add_argument("--users", type=int, default=16, help="Concurrent sessions")
+    parser.add_argument("--requests", type=int, default=20, help="Requests per session")
+    parser.add_argument("--synthetic", action="store_true", help="Use a synthetic model instead of trained_model.h5")
+    parser.add_argument("--call-ms", type=float, default=30.0, help="Synthetic per-call overhead")
+    parser.add_argument("--item-ms", type=float, default=3.0, help="Synthetic per-image cost")
+    args = parser.parse_args()
+
+    if args.synthetic:
+        model = SyntheticModel(args.call_ms, args.item_ms)
+    else:
+        from ml_model import CowDiseaseModel
+        model = CowDiseaseModel()
+    image = Image.new("RGB", (224, 224), (120, 100, 80))
+
+    def drive(predict) -> float:
+        def user():
+            for _ in range(args.requests):
+                predict(image)
+        threads = [threading.Thread(target=user) for _ in range(args.users)]
+        started = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        return args.users * args.requests / (time.perf_counter() - started)
+
+    def direct(img):
+        preprocessed = model.preprocess_image(img)
+        return model.top_predictions(model.predict_proba_batch(preprocessed)[0])
+
+    direct_rps = drive(direct)
+    service = InferenceService(model)
+    batched_rps = drive(service.predict)
+    stats = service.stats()
+    service.close()
+
+    print(f"{args.users} concurrent users x {args.requests} requests")
+    print(f"  direct:        {direct_rps:8.1f} images/sec")
+    print(f"  micro-batched: {batched_rps:8.1f} images/sec  (mean batch {stats['mean_batch']:.1f}, "
+          f"largest {stats['largest_batch']})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,212 @@
+import os
+import io
+import time
+import random
+import bisect
+import pstats
+import cProfile
+import threading
+from collections import deque
+from contextlib import contextmanager
+from functools import wraps
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+
+from tracing import span
+
+# Upper bounds (seconds) of the latency histogram buckets, Prometheus style
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    """Fixed-bucket latency histogram; O(log buckets) per observation"""
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def quantile(self, q: float) -> float:
+        """Approximate quantile: upper bound of the bucket containing it"""
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        running = 0
+        for i, n in enumerate(self.counts):
+            running += n
+            if running >= target:
+                return min(self.buckets[i], self.max) if i < len(self.buckets) else self.max
+        return self.max
+
+
+class Instrumentation:
+    """In-memory per-stage latency histograms plus sampled cProfile captures of slow requests"""
+
+    def __init__(self, profile_sample_rate: float = 0.0, slow_threshold: float = 2.0, max_profiles: int = 20):
+        self.histograms = {}
+        self.errors = {}
+        self.profile_sample_rate = profile_sample_rate
+        self.slow_threshold = slow_threshold
+        self.slow_profiles = deque(maxlen=max_profiles)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def record(self, name: str, seconds: float, error: bool = False) -> None:
+        with self._lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.observe(seconds)
+            if error:
+                self.errors[name] = self.errors.get(name, 0) + 1
+
+    @contextmanager
+    def stage(self, name: str):
+        """Time a block and record it under the given stage name; also a span when tracing is sampled"""
+        started = time.perf_counter()
+        failed = False
+        try:
+            with span(name):
+                yield
+        except BaseException:
+            failed = True
+            raise
+        finally:
+            self.record(name, time.perf_counter() - started, failed)
+
+    def timed(self, name: str):
+        """Decorator form of stage()"""
+        def decorator(func):
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.stage(name):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    @contextmanager
+    def request(self, name: str, **labels):
+        """Time a whole request; a sampled fraction is profiled and kept if slow"""
+        profiler = None
+        # Nested requests (or a profile already running) are not profiled twice
+        if not getattr(self._local, "profiling", False) and random.random() < self.profile_sample_rate:
+            profiler = cProfile.Profile()
+            self._local.profiling = True
+            profiler.enable()
+        started = time.perf_counter()
+        try:
+            with self.stage(name):
+                yield
+        finally:
+            elapsed = time.perf_counter() - started
+            if profiler is not None:
+                profiler.disable()
+                self._local.profiling = False
+                if elapsed >= self.slow_threshold:
+                    self._keep_profile(name, elapsed, profiler, labels)
+
+    def _keep_profile(self, name: str, elapsed: float, profiler: cProfile.Profile, labels: Dict) -> None:
+        out = io.StringIO()
+        pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(30)
+        self.slow_profiles.append({
+            'name': name,
+            'seconds': elapsed,
+            'at': time.strftime("%Y-%m-%d %H:%M:%S"),
+            'labels': labels,
+            'stats': out.getvalue(),
+        })
+
+    def snapshot(self) -> List[Dict]:
+        """Summary row per stage, slowest mean first"""
+        with self._lock:
+            rows = [{
+                'stage': name,
+                'count': h.count,
+                'errors': self.errors.get(name, 0),
+                'mean_ms': h.total / h.count * 1000 if h.count else 0.0,
+                'p50_ms': h.quantile(0.5) * 1000,
+                'p95_ms': h.quantile(0.95) * 1000,
+                'p99_ms': h.quantile(0.99) * 1000,
+                'max_ms': h.max * 1000,
+                'total_s': h.total,
+            } for name, h in self.histograms.items()]
+        return sorted(rows, key=lambda r: r['mean_ms'], reverse=True)
+
+    def prometheus_text(self) -> str:
+        """Histograms in the Prometheus text exposition format"""
+        lines = [
+            "# HELP pashu_stage_duration_seconds Latency of diagnosis pipeline stages",
+            "# TYPE pashu_stage_duration_seconds histogram",
+        ]
+        with self._lock:
+            for name, h in sorted(self.histograms.items()):
+                running = 0
+                for bound, n in zip(h.buckets, h.counts):
+                    running += n
+                    lines.append(f'pashu_stage_duration_seconds_bucket{{stage="{name}",le="{bound}"}} {running}')
+                lines.append(f'pashu_stage_duration_seconds_bucket{{stage="{name}",le="+Inf"}} {h.count}')
+                lines.append(f'pashu_stage_duration_seconds_sum{{stage="{name}"}} {h.total}')
+                lines.append(f'pashu_stage_duration_seconds_count{{stage="{name}"}} {h.count}')
+            lines.append("# HELP pashu_stage_errors_total Stages that raised an exception")
+            lines.append("# TYPE pashu_stage_errors_total counter")
+            for name, n in sorted(self.errors.items()):
+                lines.append(f'pashu_stage_errors_total{{stage="{name}"}} {n}')
+        return "\n".join(lines) + "\n"
+
+    def reset(self) -> None:
+        with self._lock:
+            self.histograms.clear()
+            self.errors.clear()
+            self.slow_profiles.clear()
+
+
+metrics = Instrumentation(
+    profile_sample_rate=float(os.getenv("PASHU_PROFILE_SAMPLE_RATE", "0.0")),
+    slow_threshold=float(os.getenv("PASHU_SLOW_REQUEST_SECONDS", "2.0")),
+)
+stage = metrics.stage
+timed = metrics.timed
+
+
+# ---------- Prometheus endpoint ----------
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.rstrip("/") != "/metrics":
+            self.send_error(404)
+            return
+        body = metrics.prometheus_text().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+_server = None
+_server_lock = threading.Lock()
+
+
+def start_metrics_server(port: Optional[int] = None) -> Optional[int]:
+    """Serve /metrics on a background thread (once per process); returns the port"""
+    global _server
+    with _server_lock:
+        if _server is None:
+            port = port if port is not None else int(os.getenv("PASHU_METRICS_PORT", "9464"))
+            try:
+                _server = ThreadingHTTPServer(("0.0.0.0", port), _MetricsHandler)
+            except OSError as e:
+                print(f"Metrics endpoint unavailable on port {port}: {e}")
+                return None
+            threading.Thread(target=_server.serve_forever, name="metrics-http", daemon=True).start()
+        return _server.server_address[1]
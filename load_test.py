@@ -0,0 +1,464 @@
+import os
+import sys
+import json
+import time
+import random
+import socket
+import argparse
+import threading
+import tempfile
+import subprocess
+import urllib.request
+from contextlib import ExitStack
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+APP_FILE = os.path.join(APP_DIR, "app.py")
+STAGES = ("open_app", "login", "open_diagnosis", "diagnose")
+# Users the harness creates; passwords are not secret, so they only go into a
+# throwaway users database, or are deleted afterwards when loading a server
+# that uses the real one (--url)
+USER_PREFIX = "loadtest-"
+USER_PASSWORD = "loadtest-password"
+UPLOADER_LABEL = "Choose an image file"
+
+
+def _process_stats(pid: int):
+    """(CPU seconds, RSS in MB) of a process, read from /proc; Linux only"""
+    with open(f"/proc/{pid}/stat") as f:
+        # Fields after the parenthesised command name; utime and stime are 14th and 15th overall
+        fields = f.read().rsplit(")", 1)[1].split()
+    cpu = (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+    rss = 0.0
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                rss = int(line.split()[1]) / 1024
+    return cpu, rss
+
+
+class ResourceSampler(threading.Thread):
+    """Samples the server's CPU time and RSS, attributing each interval's CPU to the stages running in it"""
+
+    def __init__(self, pid: Optional[int], interval: float = 0.1):
+        super().__init__(name="load-test-sampler", daemon=True)
+        self.pid = pid
+        self.interval = interval
+        self.active = dict.fromkeys(STAGES, 0)
+        self.cpu_seconds = dict.fromkeys(STAGES, 0.0)
+        self.peak_rss_mb = dict.fromkeys(STAGES, 0.0)
+        self.samples = []
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+
+    def enter(self, stage: str) -> None:
+        with self._lock:
+            self.active[stage] += 1
+
+    def exit(self, stage: str) -> None:
+        with self._lock:
+            self.active[stage] -= 1
+
+    def run(self) -> None:
+        if self.pid is None:
+            return
+        last_cpu, _ = _process_stats(self.pid)
+        last_time = time.perf_counter()
+        while not self._stopping.wait(self.interval):
+            try:
+                cpu, rss = _process_stats(self.pid)
+            except OSError:
+                return
+            now = time.perf_counter()
+            with self._lock:
+                running = {s: n for s, n in self.active.items() if n}
+            total = sum(running.values())
+            for stage, n in running.items():
+                self.cpu_seconds[stage] += (cpu - last_cpu) * n / total
+                self.peak_rss_mb[stage] = max(self.peak_rss_mb[stage], rss)
+            self.samples.append({'cpu_percent': 100 * (cpu - last_cpu) / (now - last_time), 'rss_mb': rss})
+            last_cpu, last_time = cpu, now
+
+    def stop(self) -> None:
+        self._stopping.set()
+        if self.is_alive():
+            self.join()
+
+
+class AppSession:
+    """A headless browser tab: speaks the app's websocket protocol and keeps the last rendered page.
+
+    Like the frontend, every rerun sends the current value of each widget
+    the user has touched, plus the button that was clicked.
+    """
+
+    def __init__(self, base_url: str, timeout: float):
+        from websockets.sync.client import connect
+        self.base_url = base_url
+        self.timeout = timeout
+        self._stack = ExitStack()
+        self.ws = self._stack.enter_context(connect(base_url.replace("http", "ws", 1) + "/_stcore/stream",
+                                                    subprotocols=["streamlit"], max_size=None, open_timeout=timeout))
+        self.session_id = None
+        self.elements = []
+        self.widget_states = {}
+        self._requests = 0
+
+    def close(self) -> None:
+        self._stack.close()
+
+    def _send(self, msg) -> None:
+        self.ws.send(msg.SerializeToString())
+
+    def _receive_until(self, done: Callable) -> object:
+        from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+        deadline = time.monotonic() + self.timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError(f"no response within {self.timeout:.0f}s")
+            msg = ForwardMsg.FromString(self.ws.recv(timeout=remaining))
+            kind = msg.WhichOneof("type")
+            if kind == "new_session":
+                # Every script run starts with one; the page is rebuilt from its deltas
+                self.elements = []
+                if msg.new_session.initialize.session_id:
+                    self.session_id = msg.new_session.initialize.session_id
+            elif kind == "delta" and msg.delta.WhichOneof("type") == "new_element":
+                self.elements.append(msg.delta.new_element)
+            if done(msg):
+                return msg
+
+    def run(self, clicked: Optional[str] = None) -> None:
+        """Rerun the script, as after a widget change, and wait for the final run to finish"""
+        from streamlit.proto.BackMsg_pb2 import BackMsg
+        from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+        msg = BackMsg()
+        widgets = msg.rerun_script.widget_states.widgets
+        widgets.extend(self.widget_states.values())
+        if clicked:
+            button = widgets.add()
+            button.id = clicked
+            button.trigger_value = True
+        self._send(msg)
+        # st.rerun() ends a run early and starts another; only a finished run is the page the user sees
+        self._receive_until(lambda m: m.WhichOneof("type") == "script_finished" and m.script_finished in (
+            ForwardMsg.FINISHED_SUCCESSFULLY, ForwardMsg.FINISHED_WITH_COMPILE_ERROR))
+
+    def widget_id(self, kind: str, label: str) -> str:
+        for element in self.elements:
+            if element.WhichOneof("type") == kind and getattr(element, kind).label == label:
+                return getattr(element, kind).id
+        raise LookupError(f"no {kind} labelled {label!r} on the page")
+
+    def set_text(self, label: str, value: str) -> None:
+        from streamlit.proto.WidgetStates_pb2 import WidgetState
+        widget_id = self.widget_id("text_input", label)
+        self.widget_states[widget_id] = WidgetState(id=widget_id, string_value=value)
+
+    def upload(self, label: str, name: str, data: bytes) -> None:
+        """Upload a file the way the browser does: ask for a URL, PUT the file, then report it in the widget state"""
+        from streamlit.proto.BackMsg_pb2 import BackMsg
+        from streamlit.proto.WidgetStates_pb2 import WidgetState
+        widget_id = self.widget_id("file_uploader", label)
+        self._requests += 1
+        request_id = str(self._requests)
+        msg = BackMsg()
+        msg.file_urls_request.request_id = request_id
+        msg.file_urls_request.file_names.append(name)
+        msg.file_urls_request.session_id = self.session_id
+        self._send(msg)
+        response = self._receive_until(lambda m: m.WhichOneof("type") == "file_urls_response"
+                                       and m.file_urls_response.response_id == request_id)
+        urls = response.file_urls_response.file_urls[0]
+
+        boundary = f"loadtest{random.getrandbits(64):x}"
+        body = (f"--{boundary}\r\nContent-Disposition: form-data; name=\"file\"; filename=\"{name}\"\r\n"
+                f"Content-Type: image/jpeg\r\n\r\n").encode() + data + f"\r\n--{boundary}--\r\n".encode()
+        request = urllib.request.Request(self.base_url + urls.upload_url, data=body, method="PUT",
+                                         headers={"Content-Type": f"multipart/form-data; boundary={boundary}"})
+        urllib.request.urlopen(request, timeout=self.timeout).close()
+
+        state = WidgetState(id=widget_id)
+        info = state.file_uploader_state_value.uploaded_file_info.add()
+        info.name, info.size, info.file_id = name, len(data), urls.file_id
+        info.file_urls.CopyFrom(urls)
+        self.widget_states[widget_id] = state
+
+    def errors(self) -> List[str]:
+        from streamlit.proto.Alert_pb2 import Alert
+        found = []
+        for element in self.elements:
+            kind = element.WhichOneof("type")
+            if kind == "exception":
+                found.append(f"{element.exception.type}: {element.exception.message}")
+            elif kind == "alert" and element.alert.format == Alert.ERROR:
+                found.append(element.alert.body)
+        return found
+
+    def markdown(self) -> List[str]:
+        return [e.markdown.body for e in self.elements if e.WhichOneof("type") == "markdown"]
+
+
+class VirtualUser:
+    """One farmer's session: log in, open Diagnosis, upload photos and read the predictions"""
+
+    def __init__(self, index: int, base_url: str, images: List[str], sampler: ResourceSampler, timeout: float):
+        self.username = f"{USER_PREFIX}{index}"
+        self.base_url = base_url
+        self.images = images
+        self.sampler = sampler
+        self.timeout = timeout
+        self.rng = random.Random(index)
+        self.timings = []
+        self.errors = []
+        self.predictions = 0
+
+    def _step(self, stage: str, sessions: List[AppSession], action) -> None:
+        self.sampler.enter(stage)
+        started = time.perf_counter()
+        try:
+            action()
+            error = sessions[0].errors()
+        except Exception as e:
+            error = [f"{type(e).__name__}: {e}"]
+        finally:
+            elapsed = time.perf_counter() - started
+            self.sampler.exit(stage)
+        self.timings.append((stage, elapsed))
+        if error:
+            self.errors.append((stage, error[0]))
+            raise RuntimeError(f"{stage}: {error[0]}")
+
+    def run(self, uploads: int) -> None:
+        from localization import get_texts
+        texts = get_texts()
+        sessions = []
+
+        def open_app():
+            sessions.append(AppSession(self.base_url, self.timeout))
+            sessions[0].run()
+
+        try:
+            self._step("open_app", sessions, open_app)
+            session = sessions[0]
+            session.set_text(texts["username"], self.username)
+            session.set_text(texts["password"], USER_PASSWORD)
+            self._step("login", sessions, lambda: session.run(session.widget_id("button", f"🔐 {texts['login']}")))
+            self._step("open_diagnosis", sessions,
+                       lambda: session.run(session.widget_id("button", f"🧪 {texts['diagnosis']}")))
+            for _ in range(uploads):
+                path = self.rng.choice(self.images)
+                with open(path, "rb") as f:
+                    data = f.read()
+
+                def diagnose():
+                    session.upload(UPLOADER_LABEL, os.path.basename(path), data)
+                    session.run()
+
+                self._step("diagnose", sessions, diagnose)
+                # Reading the results: the predictions rendered for this photo
+                self.predictions += sum("Predicted Disease" in body for body in session.markdown())
+        except RuntimeError:
+            pass
+        finally:
+            for session in sessions:
+                session.close()
+
+
+def ensure_users(count: int) -> List[str]:
+    """Create the virtual users' accounts; returns the ones created by this run"""
+    from user_database import init_db, create_user, verify_user
+    init_db()
+    created = []
+    for i in range(count):
+        if not verify_user(f"{USER_PREFIX}{i}", USER_PASSWORD):
+            create_user(f"{USER_PREFIX}{i}", USER_PASSWORD)
+            created.append(f"{USER_PREFIX}{i}")
+    return created
+
+
+def remove_users(usernames: List[str]) -> None:
+    from user_database import delete_user
+    for username in usernames:
+        delete_user(username)
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(synthetic_model: Optional[str], timeout: float = 60.0):
+    """`streamlit run app.py` on a free local port; returns (process, base URL) once it is healthy"""
+    port = _free_port()
+    env = dict(os.environ)
+    if synthetic_model:
+        env["PASHU_SYNTHETIC_MODEL_MS"] = synthetic_model
+    process = subprocess.Popen(
+        [sys.executable, "-m", "streamlit", "run", APP_FILE, "--server.headless", "true",
+         "--server.port", str(port), "--server.address", "127.0.0.1", "--server.fileWatcherType", "none",
+         # The harness is not a browser and has no XSRF cookie to echo back on uploads
+         "--server.enableXsrfProtection", "false", "--browser.gatherUsageStats", "false"],
+        cwd=APP_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise SystemExit(f"streamlit exited with code {process.returncode} before serving")
+        try:
+            with urllib.request.urlopen(f"{base_url}/_stcore/health", timeout=1) as response:
+                if response.status == 200:
+                    return process, base_url
+        except OSError:
+            time.sleep(0.2)
+    process.terminate()
+    raise SystemExit(f"streamlit did not become healthy within {timeout:.0f}s")
+
+
+def run_load(base_url: str, server_pid: Optional[int], users: int, uploads: int, ramp_seconds: float,
+             timeout: float, images: List[str]) -> Dict:
+    sampler = ResourceSampler(server_pid)
+    virtual_users = [VirtualUser(i, base_url, images, sampler, timeout) for i in range(users)]
+
+    def start(user: VirtualUser, delay: float):
+        time.sleep(delay)
+        user.run(uploads)
+
+    threads = [threading.Thread(target=start, args=(u, ramp_seconds * i / max(users, 1)), name=f"user-{i}")
+               for i, u in enumerate(virtual_users)]
+    sampler.start()
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - started
+    sampler.stop()
+
+    timings = [t for u in virtual_users for t in u.timings]
+    errors = [e for u in virtual_users for e in u.errors]
+    stages = {}
+    for stage in STAGES:
+        latencies = np.array([s for name, s in timings if name == stage])
+        failed = sum(1 for name, _ in errors if name == stage)
+        if not len(latencies):
+            continue
+        p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) * 1000
+        stages[stage] = {
+            'requests': len(latencies), 'errors': failed, 'p50_ms': p50, 'p95_ms': p95, 'p99_ms': p99,
+            'max_ms': float(latencies.max() * 1000), 'cpu_seconds': sampler.cpu_seconds[stage],
+            'peak_rss_mb': sampler.peak_rss_mb[stage],
+        }
+    return {
+        'users': users,
+        'uploads_per_user': uploads,
+        'wall_seconds': wall,
+        'requests': len(timings),
+        'requests_per_second': len(timings) / wall if wall else 0.0,
+        'error_rate': len(errors) / len(timings) if timings else 0.0,
+        'predictions': sum(u.predictions for u in virtual_users),
+        'mean_cpu_percent': float(np.mean([s['cpu_percent'] for s in sampler.samples])) if sampler.samples else 0.0,
+        'peak_rss_mb': max((s['rss_mb'] for s in sampler.samples), default=0.0),
+        'stages': stages,
+        'errors': sorted({f"{stage}: {message}" for stage, message in errors})[:10],
+    }
+
+
+def compare_to_baseline(report: Dict, baseline: Dict, tolerance: float, slack_ms: float = 0.0) -> List[str]:
+    """Regressions beyond the tolerance: slower p95 per stage, lower throughput, more errors.
+
+    slack_ms is added to every p95 allowance, so a fast stage measured over a
+    handful of requests does not fail on scheduling noise alone.
+    """
+    regressions = []
+    if report['requests_per_second'] < baseline['requests_per_second'] * (1 - tolerance):
+        regressions.append(f"throughput {report['requests_per_second']:.2f} req/s < "
+                           f"baseline {baseline['requests_per_second']:.2f}")
+    if report['error_rate'] > baseline['error_rate'] + 0.01:
+        regressions.append(f"error rate {report['error_rate']:.1%} > baseline {baseline['error_rate']:.1%}")
+    for stage, old in baseline['stages'].items():
+        new = report['stages'].get(stage)
+        if new is None:
+            regressions.append(f"{stage}: not reached")
+        elif new['p95_ms'] > old['p95_ms'] * (1 + tolerance) + slack_ms:
+            regressions.append(f"{stage}: p95 {new['p95_ms']:.0f} ms > baseline {old['p95_ms']:.0f} ms")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate concurrent farmers against one app.py server")
+    parser.add_argument("--users", type=int, default=8, help="Concurrent virtual users")
+    parser.add_argument("--uploads", type=int, default=3, help="Photos each user diagnoses")
+    parser.add_argument("--ramp-seconds", type=float, default=2.0, help="Spread user start times over this period")
+    parser.add_argument("--timeout", type=float, default=120.0, help="Seconds allowed per page run")
+    parser.add_argument("--url", help="Load an already running server instead of starting one "
+                                      "(it must run with --server.enableXsrfProtection false)")
+    parser.add_argument("--server-pid", type=int, help="With --url, the server process to sample CPU and RSS from")
+    parser.add_argument("--synthetic-model", metavar="CALL_MS,ITEM_MS",
+                        help="Serve predictions from a stand-in model with this cost instead of the trained one")
+    parser.add_argument("--json", help="Write the report to this file")
+    parser.add_argument("--save-baseline", help="Write the report as the baseline for later runs")
+    parser.add_argument("--baseline", help="Fail if this run regressed against the saved baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed relative regression")
+    parser.add_argument("--slack-ms", type=float, default=150.0, help="Extra p95 allowance per stage, in ms")
+    args = parser.parse_args()
+
+    os.chdir(APP_DIR)
+    sys.path.insert(0, APP_DIR)
+    from cow_disease_model.splits import DATASET_PATH, dataset_files
+    images = [path for path, *_ in dataset_files(DATASET_PATH)]
+    if not images:
+        raise SystemExit(f"No images found under {DATASET_PATH}")
+
+    server = None
+    with tempfile.TemporaryDirectory(prefix="pashu-loadtest-") as scratch:
+        if not args.url:
+            # Read by user_database in this process and inherited by the server it starts
+            os.environ["PASHU_USERS_DB"] = os.path.join(scratch, "users.db")
+        created = ensure_users(args.users)
+        try:
+            if args.url:
+                base_url, server_pid = args.url.rstrip("/"), args.server_pid
+            else:
+                server, base_url = start_server(args.synthetic_model)
+                server_pid = server.pid
+            report = run_load(base_url, server_pid, args.users, args.uploads, args.ramp_seconds, args.timeout,
+                              images)
+        finally:
+            if server is not None:
+                server.terminate()
+                server.wait()
+            if args.url:
+                remove_users(created)
+
+    print(f"{report['users']} users, {report['requests']} requests in {report['wall_seconds']:.1f}s: "
+          f"{report['requests_per_second']:.2f} req/s, {report['error_rate']:.1%} errors, "
+          f"{report['predictions']} predictions read")
+    if server_pid:
+        print(f"Server: mean CPU {report['mean_cpu_percent']:.0f}%, peak RSS {report['peak_rss_mb']:.0f} MB")
+    print(f"\n{'stage':<16} {'requests':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'CPU s':>7} {'RSS MB':>7}")
+    for stage, s in report['stages'].items():
+        print(f"{stage:<16} {s['requests']:>8} {s['p50_ms']:>8.0f} {s['p95_ms']:>8.0f} {s['p99_ms']:>8.0f} "
+              f"{s['cpu_seconds']:>7.1f} {s['peak_rss_mb']:>7.0f}")
+    for error in report['errors']:
+        print(f"  ❌ {error}")
+
+    for path in (args.json, args.save_baseline):
+        if path:
+            with open(path, "w") as f:
+                json.dump(report, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare_to_baseline(report, json.load(f), args.tolerance, args.slack_ms)
+        for regression in regressions:
+            print(f"  REGRESSION {regression}")
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
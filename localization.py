@@ -0,0 +1,147 @@
+import os
+import sys
+import json
+import pickle
+import tempfile
+import argparse
+from functools import lru_cache
+from collections.abc import Mapping
+from typing import Dict, Optional
+
+LOCALES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "locales")
+# Compiled catalogs; rebuilt whenever the JSON source is newer
+COMPILED_DIR = os.path.join(LOCALES_DIR, "compiled")
+DEFAULT_LANGUAGE = "English"
+# Catalogs kept in memory besides English, least recently used evicted first
+MAX_LOADED_LANGUAGES = int(os.getenv("PASHU_MAX_LANGUAGES", "4"))
+
+with open(os.path.join(LOCALES_DIR, "languages.json"), encoding="utf-8") as _f:
+    # Display name -> catalog code, in menu order
+    LANGUAGE_CODES: Dict[str, str] = json.load(_f)
+LANGUAGE_NAMES = list(LANGUAGE_CODES)
+
+
+def compile_catalog(code: str) -> Dict[str, str]:
+    """Read locales/<code>.json and write its compiled pickle; returns the messages"""
+    with open(os.path.join(LOCALES_DIR, f"{code}.json"), encoding="utf-8") as f:
+        messages = json.load(f)["messages"]
+    # Keys repeat across every catalog; interning stores each once per process
+    messages = {sys.intern(key): value for key, value in messages.items()}
+    os.makedirs(COMPILED_DIR, exist_ok=True)
+    path = os.path.join(COMPILED_DIR, f"{code}.pickle")
+    # Unique per call: sessions on several threads may compile the same catalog at once
+    fd, tmp_path = tempfile.mkstemp(dir=COMPILED_DIR, prefix=f"{code}.", suffix=".tmp")
+    try:
+        os.fchmod(fd, 0o644)  # mkstemp creates 0600
+        with os.fdopen(fd, "wb") as f:
+            pickle.dump(messages, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    return messages
+
+
+def _read_catalog(code: str) -> Dict[str, str]:
+    source = os.path.join(LOCALES_DIR, f"{code}.json")
+    compiled = os.path.join(COMPILED_DIR, f"{code}.pickle")
+    try:
+        if os.path.getmtime(compiled) >= os.path.getmtime(source):
+            with open(compiled, "rb") as f:
+                return {sys.intern(key): value for key, value in pickle.load(f).items()}
+    except (OSError, pickle.UnpicklingError, EOFError):
+        pass
+    return compile_catalog(code)
+
+
+@lru_cache(maxsize=1)
+def _fallback_catalog() -> Dict[str, str]:
+    return _read_catalog(LANGUAGE_CODES[DEFAULT_LANGUAGE])
+
+
+@lru_cache(maxsize=MAX_LOADED_LANGUAGES)
+def _catalog(code: str) -> Dict[str, str]:
+    return _read_catalog(code)
+
+
+class Texts(Mapping):
+    """A language's messages, falling back to English and then to the key itself"""
+
+    def __init__(self, messages: Dict[str, str], fallback: Dict[str, str]):
+        self.messages = messages
+        self.fallback = fallback
+
+    def __getitem__(self, key: str) -> str:
+        value = self.messages.get(key)
+        if value is None:
+            value = self.fallback.get(key, key)
+        return value
+
+    def get(self, key: str, default: Optional[str] = None) -> Optional[str]:
+        value = self.messages.get(key)
+        return value if value is not None else self.fallback.get(key, default)
+
+    def __contains__(self, key) -> bool:
+        return key in self.messages or key in self.fallback
+
+    def __iter__(self):
+        yield from self.fallback
+        yield from (key for key in self.messages if key not in self.fallback)
+
+    def __len__(self) -> int:
+        return len(self.fallback.keys() | self.messages.keys())
+
+
+def get_texts(language: str = DEFAULT_LANGUAGE) -> Texts:
+    """Messages for a language display name (e.g. "हिन्दी"); unknown names get English"""
+    fallback = _fallback_catalog()
+    code = LANGUAGE_CODES.get(language)
+    if code is None or language == DEFAULT_LANGUAGE:
+        return Texts(fallback, fallback)
+    return Texts(_catalog(code), fallback)
+
+
+def localize_record(kind: str, name: str, record: Optional[Dict], language: Optional[str]) -> Optional[Dict]:
+    """Translated copy of a knowledge-base record.
+
+    Each field is looked up as "<kind>.<name>.<field>" (free text such as a
+    description) and then as "<field>.<value>" (shared values such as a
+    severity level). Fields without a translation keep the English text.
+    """
+    if record is None or not language or language == DEFAULT_LANGUAGE:
+        return record
+    code = LANGUAGE_CODES.get(language)
+    if code is None:
+        return record
+    messages = _catalog(code)
+    localized = {}
+    for field, value in record.items():
+        text = messages.get(f"{kind}.{name}.{field}")
+        if text is None and isinstance(value, str):
+            text = messages.get(f"{field}.{value}")
+        localized[field] = value if text is None else text
+    return localized
+
+
+def loaded_languages() -> Dict:
+    return {'cached': _catalog.cache_info().currsize, 'max': MAX_LOADED_LANGUAGES}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compile and check localization catalogs")
+    parser.add_argument("--check", action="store_true", help="List keys each language lacks compared to English")
+    args = parser.parse_args()
+
+    english = compile_catalog(LANGUAGE_CODES[DEFAULT_LANGUAGE])
+    for name, code in LANGUAGE_CODES.items():
+        messages = english if name == DEFAULT_LANGUAGE else compile_catalog(code)
+        missing = sorted(english.keys() - messages.keys())
+        print(f"{name} ({code}): {len(messages)} messages, {len(missing)} missing")
+        if args.check:
+            for key in missing:
+                print(f"  {key}")
+    print(f"✅ Compiled catalogs written to {COMPILED_DIR}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,95 @@
 import numpy as np
 import os
+import json
 from tensorflow.keras.models import load_model
 from tensorflow.keras.preprocessing import image
 from PIL import Image
+from instrumentation import stage
+
+MODEL_PATH = os.path.join("cow_disease_model", "model", "trained_model.h5")
+
+# Test-time augmentation: views per image by detect_image_quality()['overall_quality']
+TTA_VIEWS_BY_QUALITY = {'good': 1, 'fair': 4, 'poor': 8, 'unknown': 4}
+
+
+def tta_views(img_pil: Image.Image, k: int, target_size=(224, 224)) -> np.ndarray:
+    """Up to 8 deterministic views (flips, 90% crops, brightness jitter) as one (k, H, W, 3) batch"""
+    img = img_pil.convert("RGB")
+    w, h = img.size
+    cw, ch = int(w * 0.9), int(h * 0.9)
+    center = img.crop(((w - cw) // 2, (h - ch) // 2, (w - cw) // 2 + cw, (h - ch) // 2 + ch))
+    base = np.asarray(img.resize(target_size), dtype=np.float32) / 255.0
+    center = np.asarray(center.resize(target_size), dtype=np.float32) / 255.0
+    views = [
+        lambda: base,
+        lambda: base[:, ::-1],
+        lambda: center,
+        lambda: np.clip(base * 1.15, 0.0, 1.0),
+        lambda: base * 0.85,
+        lambda: center[:, ::-1],
+        lambda: np.asarray(img.crop((0, 0, cw, ch)).resize(target_size), dtype=np.float32) / 255.0,
+        lambda: np.asarray(img.crop((w - cw, h - ch, w, h)).resize(target_size), dtype=np.float32) / 255.0,
+    ]
+    return np.stack([view() for view in views[:max(1, min(k, len(views)))]])
+
+
+def combine_views(preds: np.ndarray) -> np.ndarray:
+    """Average the views' logits (log-probabilities) and renormalise"""
+    if len(preds) == 1:
+        return preds[0]
+    logits = np.log(np.clip(preds, 1e-7, 1.0)).mean(axis=0)
+    exp = np.exp(logits - logits.max())
+    return exp / exp.sum()
+
+
+def apply_temperature(preds: np.ndarray, temperature: float) -> np.ndarray:
+    """Rescale softmax outputs as if the logits were divided by temperature"""
+    if temperature == 1.0:
+        return preds
+    logits = np.log(np.clip(preds, 1e-7, 1.0)) / temperature
+    exp = np.exp(logits - logits.max(axis=-1, keepdims=True))
+    return exp / exp.sum(axis=-1, keepdims=True)
+
+
+def fit_temperature(preds: np.ndarray, labels: np.ndarray, low: float = 0.05, high: float = 20.0) -> float:
+    """Temperature minimising the negative log-likelihood of (N, C) probabilities, by golden-section search"""
+    def nll(log_t):
+        scaled = apply_temperature(preds, float(np.exp(log_t)))
+        return -np.log(np.clip(scaled[np.arange(len(labels)), labels], 1e-12, 1.0)).mean()
+
+    a, b = np.log(low), np.log(high)
+    ratio = (np.sqrt(5) - 1) / 2
+    for _ in range(60):
+        c, d = b - ratio * (b - a), a + ratio * (b - a)
+        if nll(c) < nll(d):
+            b = d
+        else:
+            a = c
+    return float(np.exp((a + b) / 2))
+
+
+def expected_calibration_error(preds: np.ndarray, labels: np.ndarray, bins: int = 10) -> float:
+    confidence = preds.max(axis=1)
+    correct = preds.argmax(axis=1) == labels
+    edges = np.minimum((confidence * bins).astype(int), bins - 1)
+    return float(sum(abs(correct[edges == b].mean() - confidence[edges == b].mean()) * (edges == b).mean()
+                     for b in range(bins) if (edges == b).any()))
+
+
+def model_file_version(path: str):
+    """Short content hash of a model file, stored with every prediction it makes"""
+    import hashlib
+    try:
+        with open(path, "rb") as f:
+            return hashlib.sha256(f.read()).hexdigest()[:12]
+    except OSError:
+        return None
+
 
 class CowDiseaseModel:
     def __init__(self):
         # Update model path relative to your project
-        self.model_path = os.path.join("cow_disease_model", "model", "trained_model.h5")
+        self.model_path = MODEL_PATH
         self.class_names = [
             'Actinomycosis',
             'Anthrax',
@@ -22,9 +104,30 @@ class CowDiseaseModel:
         ]
 
         self.confidence_threshold = 0.3
+        # Optional TTA: low-quality photos get several augmented views in one batched pass
+        self.tta_enabled = os.getenv("PASHU_TTA", "0") == "1"
+        # Temperature scaling fitted by cow_disease_model/calibrate.py, stored next to the model
+        self.calibration_path = os.path.splitext(self.model_path)[0] + ".calibration.json"
+        self.temperature = 1.0
+        # Cascade: a low-resolution pass answers confident images, the rest escalate to 224x224
+        self.cascade = None
+        self.cascade_enabled = os.getenv("PASHU_CASCADE", "0") == "1"
+        self.small_model = None
+        self.embedding_model = None
         self.model_loaded = False
+        self.model_version = model_file_version(self.model_path)
+        self._load_calibration()
         self._load_model()
 
+    def _load_calibration(self):
+        try:
+            with open(self.calibration_path) as f:
+                calibration = json.load(f)
+        except (OSError, ValueError):
+            return
+        self.temperature = calibration.get('temperature', 1.0)
+        self.cascade = calibration.get('cascade')
+
     def _load_model(self):
         try:
             self.model = load_model(self.model_path)
@@ -33,6 +136,23 @@ class CowDiseaseModel:
         except Exception as e:
             print(f"❌ Failed to load model: {str(e)}")
             self.model_loaded = False
+            return
+        try:
+            from tensorflow.keras.models import Model
+            # Penultimate Dense(128) layer, for similar-case retrieval
+            self.embedding_model = Model(self.model.input, self.model.layers[-2].output)
+        except Exception as e:
+            print(f"❌ Embedding model unavailable: {str(e)}")
+        if self.cascade_enabled and self.cascade:
+            try:
+                self.small_model = self.build_resized_model(self.cascade['size'])
+            except Exception as e:
+                print(f"❌ Cascade model unavailable: {str(e)}")
+
+    def build_resized_model(self, size: int):
+        """Same weights with a size x size input; the MobileNetV2 base is fully convolutional"""
+        from model_server import resize_keras_model
+        return resize_keras_model(self.model, size)
 
     def preprocess_image(self, img_pil: Image.Image, target_size=(224, 224)) -> np.ndarray:
         try:
@@ -45,24 +165,100 @@ class CowDiseaseModel:
             print(f"❌ Image preprocessing error: {e}")
             return None
 
-    def predict(self, img_pil: Image.Image):
+    def tta_view_count(self, quality: dict = None) -> int:
+        """Number of TTA views for an image; 1 when TTA is off or the photo is good"""
+        if not self.tta_enabled or quality is None:
+            return 1
+        return TTA_VIEWS_BY_QUALITY.get(quality.get('overall_quality'), TTA_VIEWS_BY_QUALITY['unknown'])
+
+    def preprocess_views(self, img_pil: Image.Image, k: int, target_size=(224, 224)) -> np.ndarray:
+        if k <= 1:
+            return self.preprocess_image(img_pil, target_size)
+        try:
+            return tta_views(img_pil, k, target_size)
+        except Exception as e:
+            print(f"❌ Image preprocessing error: {e}")
+            return None
+
+    def predict(self, img_pil: Image.Image, quality: dict = None):
         if not self.model_loaded:
             print("❌ Model is not loaded.")
             return []
 
-        preprocessed = self.preprocess_image(img_pil)
+        views = self.tta_view_count(quality)
+        try:
+            early = self.cascade_pass(img_pil) if views == 1 else None
+        except Exception as e:
+            print(f"❌ Cascade pass failed: {e}")
+            early = None
+        if early is not None:
+            return self.top_predictions(early)
+
+        with stage("model_preprocess"):
+            preprocessed = self.preprocess_views(img_pil, views)
         if preprocessed is None:
             return []
 
         try:
-            preds = self.model.predict(preprocessed)[0]
-            top_indices = preds.argsort()[-3:][::-1]
-            results = [(self.class_names[i], float(preds[i])) for i in top_indices]
-            return self.validate_prediction_confidence(results)
+            preds = self.calibrated(self.predict_proba_batch(preprocessed))
+            return self.top_predictions(preds)
         except Exception as e:
             print(f"❌ Prediction failed: {e}")
             return []
 
+    def cascade_pass(self, img_pil: Image.Image):
+        """Calibrated low-resolution probabilities if confident enough to stop there, else None"""
+        preprocessed = self.preprocess_cascade(img_pil)
+        if preprocessed is None:
+            return None
+        return self.cascade_exit(self.cascade_proba_batch(preprocessed)[0])
+
+    def preprocess_cascade(self, img_pil: Image.Image):
+        """(1, size, size, 3) input of the low-resolution pass, or None when the cascade is off"""
+        if self.small_model is None:
+            return None
+        size = self.cascade['size']
+        with stage("model_preprocess"):
+            return self.preprocess_image(img_pil, (size, size))
+
+    def cascade_proba_batch(self, batch: np.ndarray) -> np.ndarray:
+        with stage("inference_cascade"):
+            return np.asarray(self.small_model.predict_on_batch(batch))
+
+    def cascade_exit(self, preds: np.ndarray):
+        """Calibrated low-resolution probabilities of one image if confident enough, else None"""
+        preds = apply_temperature(preds, self.cascade['temperature'])
+        return preds if preds.max() >= self.cascade['target'] else None
+
+    def calibrated(self, preds: np.ndarray) -> np.ndarray:
+        """Merge the (views, classes) outputs for one image and apply the fitted temperature"""
+        return apply_temperature(combine_views(preds), self.temperature)
+
+    def predict_proba_batch(self, batch: np.ndarray) -> np.ndarray:
+        """Class probabilities for a preprocessed (N, 224, 224, 3) batch in one forward pass"""
+        with stage("inference"):
+            return np.asarray(self.model.predict_on_batch(batch))
+
+    def embed_batch(self, batch: np.ndarray) -> np.ndarray:
+        """(N, 128) penultimate-layer embeddings for a preprocessed batch"""
+        with stage("embedding"):
+            return np.asarray(self.embedding_model.predict_on_batch(batch))
+
+    def embed(self, img_pil: Image.Image):
+        """128-d embedding of one image, or None when unavailable"""
+        if self.embedding_model is None:
+            return None
+        preprocessed = self.preprocess_image(img_pil)
+        return None if preprocessed is None else self.embed_batch(preprocessed)[0]
+
+    def top_predictions(self, preds: np.ndarray, k: int = 3):
+        """Top-k (disease, confidence) pairs above the confidence threshold"""
+        k = min(k, len(preds))
+        top_indices = np.argpartition(preds, -k)[-k:]
+        top_indices = top_indices[np.argsort(preds[top_indices])[::-1]]
+        results = [(self.class_names[i], float(preds[i])) for i in top_indices]
+        return self.validate_prediction_confidence(results)
+
     def validate_prediction_confidence(self, predictions):
         """Return only predictions above confidence threshold"""
         return [(disease, conf) for disease, conf in predictions if conf >= self.confidence_threshold]
@@ -72,7 +268,111 @@ class CowDiseaseModel:
             'model_loaded': self.model_loaded,
             'classes': self.class_names,
             'confidence_threshold': self.confidence_threshold,
+            'model_version': self.model_version,
+            'temperature': self.temperature,
+            'cascade': self.cascade if self.small_model is not None else None,
             'model_type': 'Custom Keras CNN'
         }
 
+
+class _PoolHead:
+    """Stands in for a Keras model whose forward pass runs on one head of the worker pool"""
+
+    def __init__(self, owner, head: str):
+        self.owner = owner
+        self.head = head
+
+    def predict_on_batch(self, batch: np.ndarray) -> np.ndarray:
+        return self.owner.run_head(self.head, batch)
+
+
+class MultiProcessCowDiseaseModel(CowDiseaseModel):
+    """CowDiseaseModel whose forward passes run in a pool of worker processes.
+
+    The Keras model is exported once to TFLite; every worker memory-maps the
+    same file, so the weights are held in the page cache once. The embedding
+    head and the low-resolution cascade model are exported as their own
+    TFLite files and loaded by every worker alongside the classifier.
+
+    A batch that takes longer than PASHU_WORKER_TIMEOUT_SECONDS, or whose
+    worker dies, raises; the pool is then terminated and restarted so the
+    next request gets live workers.
+    """
+
+    def __init__(self, num_workers: int = 2):
+        import threading
+        self.num_workers = num_workers
+        self.timeout = float(os.getenv("PASHU_WORKER_TIMEOUT_SECONDS", "30"))
+        self.pool = None
+        self.pool_paths = {}
+        self.restarts = 0
+        self._restart_lock = threading.Lock()
+        super().__init__()
+
+    def _load_model(self):
+        from model_server import PROBABILITIES, export_tflite
+        try:
+            self.pool_paths = {PROBABILITIES: export_tflite(self.model_path)}
+        except Exception as e:
+            print(f"❌ Failed to export the model: {str(e)}")
+            self.model_loaded = False
+            return
+        try:
+            self.pool_paths['embedding'] = export_tflite(self.model_path, head='embedding')
+            self.embedding_model = _PoolHead(self, 'embedding')
+        except Exception as e:
+            print(f"❌ Embedding model unavailable: {str(e)}")
+        if self.cascade_enabled and self.cascade:
+            try:
+                self.pool_paths['cascade'] = export_tflite(self.model_path, size=self.cascade['size'])
+                self.small_model = _PoolHead(self, 'cascade')
+            except Exception as e:
+                print(f"❌ Cascade model unavailable: {str(e)}")
+        try:
+            self.pool = self._start_pool()
+            self.model_loaded = True
+            print(f"✅ Model served by {self.num_workers} worker processes from: {self.pool_paths[PROBABILITIES]}")
+        except Exception as e:
+            print(f"❌ Failed to start model workers: {str(e)}")
+            self.model_loaded = False
+
+    def _start_pool(self):
+        from model_server import ModelWorkerPool
+        return ModelWorkerPool(self.num_workers, "tflite", self.pool_paths)
+
+    def _restart_pool(self, failed) -> None:
+        """Replace a pool that timed out or lost a worker, once, however many callers saw it fail"""
+        with self._restart_lock:
+            if self.pool is not failed:
+                return
+            failed.terminate()
+            self.restarts += 1
+            try:
+                self.pool = self._start_pool()
+                print(f"⚠️ Restarted model workers ({self.restarts} restarts)")
+            except Exception as e:
+                print(f"❌ Failed to restart model workers: {str(e)}")
+
+    def run_head(self, head: str, batch: np.ndarray) -> np.ndarray:
+        from concurrent.futures import TimeoutError
+        from model_server import WorkerPoolError
+        pool = self.pool
+        future = pool.submit(np.ascontiguousarray(batch, dtype=np.float32), head)
+        try:
+            return future.result(timeout=self.timeout)
+        except (TimeoutError, WorkerPoolError) as e:
+            self._restart_pool(pool)
+            raise WorkerPoolError(f"Model workers failed on '{head}': {str(e) or 'timed out'}") from e
+
+    def predict_proba_batch(self, batch: np.ndarray) -> np.ndarray:
+        from model_server import PROBABILITIES
+        with stage("inference"):
+            return self.run_head(PROBABILITIES, batch)
+
+    def get_model_info(self):
+        info = super().get_model_info()
+        info['model_type'] = f'TFLite, {self.num_workers} worker processes'
+        info['worker_restarts'] = self.restarts
+        return info
+
 #venv\Scripts\activate
\ No newline at end of file
@@ -0,0 +1,321 @@
+import os
+import time
+import argparse
+import tempfile
+import threading
+import itertools
+import queue
+import multiprocessing as mp
+from concurrent.futures import Future
+from typing import Dict, Optional, Union
+
+import numpy as np
+
+# Kept free of TensorFlow imports: spawned workers import this module, and
+# each would otherwise pay for a full TensorFlow runtime it does not need.
+MODEL_PATH = os.path.join("cow_disease_model", "model", "trained_model.h5")
+# Default head of a pool: class probabilities at 224x224
+PROBABILITIES = "probabilities"
+# How often the collector checks that every worker process is still alive
+WATCHDOG_SECONDS = 1.0
+
+
+class WorkerPoolError(RuntimeError):
+    """A worker process died or the pool was shut down; the pool must be replaced"""
+
+
+def tflite_path_for(keras_path: str, head: str = PROBABILITIES, size: int = 224) -> str:
+    suffix = "" if head == PROBABILITIES and size == 224 else f".{head}{size}"
+    return os.path.splitext(keras_path)[0] + suffix + ".tflite"
+
+
+def resize_keras_model(model, size: int):
+    """Same weights with a size x size input; the MobileNetV2 base is fully convolutional"""
+    from tensorflow.keras.models import Model
+    config = model.get_config()
+    input_config = config['layers'][0]['config']
+    key = 'batch_shape' if 'batch_shape' in input_config else 'batch_input_shape'
+    input_config[key] = [None, size, size, 3]
+    resized = Model.from_config(config)
+    resized.set_weights(model.get_weights())
+    return resized
+
+
+def export_tflite(keras_path: str, tflite_path: Optional[str] = None, head: str = PROBABILITIES,
+                  size: int = 224) -> str:
+    """Convert the Keras model to a TFLite flatbuffer, which workers memory-map.
+
+    head="embedding" exports the penultimate Dense(128) layer instead of the
+    class probabilities; size exports the same weights at another input size.
+    """
+    tflite_path = tflite_path or tflite_path_for(keras_path, head, size)
+    if os.path.exists(tflite_path) and os.path.getmtime(tflite_path) >= os.path.getmtime(keras_path):
+        return tflite_path
+    import tensorflow as tf
+    model = tf.keras.models.load_model(keras_path)
+    if size != 224:
+        model = resize_keras_model(model, size)
+    if head == "embedding":
+        model = tf.keras.models.Model(model.input, model.layers[-2].output)
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    flatbuffer = converter.convert()
+    # Unique per call: the app and the re-scoring CLI may export the same head at once
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(tflite_path)),
+                                    prefix=os.path.basename(tflite_path) + ".", suffix=".tmp")
+    try:
+        os.fchmod(fd, 0o644)  # mkstemp creates 0600
+        with os.fdopen(fd, "wb") as f:
+            f.write(flatbuffer)
+        os.replace(tmp_path, tflite_path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    return tflite_path
+
+
+def memory_usage() -> Dict[str, float]:
+    """RSS and PSS (proportional share of shared pages) of this process in MB, Linux only"""
+    usage = {}
+    try:
+        with open("/proc/self/smaps_rollup") as f:
+            for line in f:
+                key, value = line.split(":", 1)
+                if key in ("Rss", "Pss"):
+                    usage[key.lower() + "_mb"] = int(value.split()[0]) / 1024
+    except OSError:
+        pass
+    return usage
+
+
+# ---------- Worker process ----------
+def _load_runner(backend: str, path: str):
+    """Return run(batch) -> probabilities, with weights memory-mapped from path"""
+    if backend == "tflite":
+        try:
+            from tflite_runtime.interpreter import Interpreter
+        except ImportError:
+            from tensorflow.lite import Interpreter
+        # model_path (not model_content) lets TFLite mmap the flatbuffer, so pages are shared
+        interpreter = Interpreter(model_path=path, num_threads=1)
+        input_index = interpreter.get_input_details()[0]["index"]
+        output_index = interpreter.get_output_details()[0]["index"]
+        shape = [None]
+
+        def run(batch):
+            if shape[0] != batch.shape:
+                interpreter.resize_tensor_input(input_index, batch.shape)
+                interpreter.allocate_tensors()
+                shape[0] = batch.shape
+            interpreter.set_tensor(input_index, batch)
+            interpreter.invoke()
+            return interpreter.get_tensor(output_index).copy()
+        return run
+
+    if backend == "npy":
+        # Synthetic linear model used by the benchmark: logits = x @ W
+        weights = np.load(path, mmap_mode="r")
+
+        def run(batch):
+            logits = batch.reshape(len(batch), -1) @ weights
+            exp = np.exp(logits - logits.max(axis=1, keepdims=True))
+            return exp / exp.sum(axis=1, keepdims=True)
+        return run
+
+    raise ValueError(f"Unknown backend: {backend}")
+
+
+def _worker_main(worker_id: int, backend: str, paths: Dict[str, str], requests, results) -> None:
+    try:
+        runners = {head: _load_runner(backend, path) for head, path in paths.items()}
+    except Exception as e:
+        results.put(("error", worker_id, repr(e)))
+        return
+    results.put(("ready", worker_id, memory_usage()))
+    while True:
+        item = requests.get()
+        if item is None:
+            return
+        request_id, head, batch = item
+        if request_id == "memory":
+            results.put(("memory", worker_id, memory_usage()))
+            continue
+        try:
+            results.put((request_id, worker_id, runners[head](batch)))
+        except Exception as e:
+            results.put((request_id, worker_id, RuntimeError(repr(e))))
+
+
+# ---------- Dispatcher ----------
+class ModelWorkerPool:
+    """N spawned worker processes sharing one memory-mapped copy of the weights.
+
+    Requests go to the worker with the fewest outstanding batches; a
+    collector thread resolves the returned futures. path is one model file
+    or a dict of head name -> file (e.g. probabilities, embedding, a
+    low-resolution cascade), all loaded by every worker. If a worker dies,
+    every pending future fails with WorkerPoolError and the pool is marked
+    broken, so the owner can terminate() it and start another.
+    """
+
+    def __init__(self, num_workers: int, backend: str, path: Union[str, Dict[str, str]],
+                 start_timeout: float = 120.0):
+        paths = path if isinstance(path, dict) else {PROBABILITIES: path}
+        ctx = mp.get_context("spawn")  # TensorFlow is not fork-safe once initialised
+        # Parallelism comes from the processes; threaded BLAS in each would oversubscribe the cores
+        for var in ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS"):
+            os.environ.setdefault(var, "1")
+        self.results = ctx.Queue()
+        self.requests = [ctx.Queue() for _ in range(num_workers)]
+        self.outstanding = [0] * num_workers
+        self.worker_memory = {}
+        self.broken = None
+        self._futures = {}
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+        self.processes = [
+            ctx.Process(target=_worker_main, args=(i, backend, paths, self.requests[i], self.results), daemon=True)
+            for i in range(num_workers)
+        ]
+        for process in self.processes:
+            process.start()
+
+        ready = 0
+        deadline = time.monotonic() + start_timeout
+        while ready < num_workers:
+            try:
+                kind, worker_id, payload = self.results.get(timeout=max(0.1, deadline - time.monotonic()))
+            except queue.Empty:
+                self._kill_workers()
+                raise WorkerPoolError(f"{num_workers - ready} of {num_workers} model workers did not start "
+                                      f"within {start_timeout:.0f}s") from None
+            if kind == "error":
+                self._kill_workers()
+                raise RuntimeError(f"Worker {worker_id} failed to load the model: {payload}")
+            self.worker_memory[worker_id] = payload
+            ready += 1
+
+        self._collector = threading.Thread(target=self._collect, name="model-pool-collector", daemon=True)
+        self._collector.start()
+
+    def submit(self, batch: np.ndarray, head: str = PROBABILITIES) -> Future:
+        future = Future()
+        with self._lock:
+            if self.broken:
+                future.set_exception(WorkerPoolError(self.broken))
+                return future
+            request_id = next(self._ids)
+            worker_id = min(range(len(self.outstanding)), key=self.outstanding.__getitem__)
+            self.outstanding[worker_id] += 1
+            self._futures[request_id] = future
+        self.requests[worker_id].put((request_id, head, batch))
+        return future
+
+    def _fail_pending(self, reason: str) -> None:
+        with self._lock:
+            self.broken = self.broken or reason
+            futures, self._futures = list(self._futures.values()), {}
+        for future in futures:
+            future.set_exception(WorkerPoolError(reason))
+
+    def _collect(self) -> None:
+        checked = time.monotonic()
+        while True:
+            try:
+                kind, worker_id, payload = self.results.get(timeout=WATCHDOG_SECONDS)
+            except queue.Empty:
+                kind = "idle"
+            # Checked under load too: the surviving workers keep the results queue busy
+            if time.monotonic() - checked >= WATCHDOG_SECONDS:
+                checked = time.monotonic()
+                dead = [i for i, process in enumerate(self.processes) if not process.is_alive()]
+                if dead:
+                    self._fail_pending(f"Model worker {dead[0]} exited with code {self.processes[dead[0]].exitcode}")
+                    return
+            if kind == "idle":
+                continue
+            if kind is None:
+                self._fail_pending("Model worker pool closed")
+                return
+            if kind == "memory":
+                self.worker_memory[worker_id] = payload
+                continue
+            with self._lock:
+                self.outstanding[worker_id] -= 1
+                future = self._futures.pop(kind, None)
+            if future is None:
+                continue
+            if isinstance(payload, Exception):
+                future.set_exception(payload)
+            else:
+                future.set_result(payload)
+
+    def refresh_memory(self, wait: float = 1.0) -> Dict[int, Dict]:
+        for requests in self.requests:
+            requests.put(("memory", None, None))
+        time.sleep(wait)
+        return dict(self.worker_memory)
+
+    def close(self) -> None:
+        for requests in self.requests:
+            requests.put(None)
+        for process in self.processes:
+            process.join(timeout=5)
+        self.results.put((None, None, None))
+        self._collector.join(timeout=5)
+
+    def _kill_workers(self) -> None:
+        for process in self.processes:
+            if process.is_alive():
+                process.kill()
+        for process in self.processes:
+            process.join(timeout=5)
+
+    def terminate(self) -> None:
+        """Kill the workers without waiting for them, e.g. when one hangs; pending requests fail"""
+        self._kill_workers()
+        self._fail_pending("Model worker pool terminated")
+        self.results.put((None, None, None))
+        self._collector.join(timeout=5)
+
+
+# ---------- Benchmark ----------
+def main():
+    parser = argparse.ArgumentParser(description="Inference throughput and memory vs number of worker processes")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--requests", type=int, default=200, help="Batches to send per run")
+    parser.add_argument("--batch", type=int, default=4, help="Images per batch")
+    parser.add_argument("--synthetic-mb", type=float, help="Use a synthetic memory-mapped model of this size")
+    args = parser.parse_args()
+
+    if args.synthetic_mb:
+        import tempfile
+        path = os.path.join(tempfile.mkdtemp(), "weights.npy")
+        features = 224 * 224 * 3
+        classes = max(1, int(args.synthetic_mb * 1024 * 1024 / 4 / features))
+        np.save(path, np.random.default_rng(0).standard_normal((features, classes), dtype=np.float32) * 0.01)
+        backend = "npy"
+    else:
+        backend, path = "tflite", export_tflite(MODEL_PATH)
+    model_mb = os.path.getsize(path) / 1024 / 1024
+    batch = np.random.default_rng(1).random((args.batch, 224, 224, 3), dtype=np.float32)
+
+    print(f"Model file: {model_mb:.1f} MB ({backend})")
+    print(f"{'workers':>8} {'images/sec':>12} {'RSS/worker MB':>14} {'PSS/worker MB':>14}")
+    for workers in args.workers:
+        pool = ModelWorkerPool(workers, backend, path)
+        for future in [pool.submit(batch) for _ in range(workers * 2)]:  # warm up
+            future.result()
+        started = time.perf_counter()
+        futures = [pool.submit(batch) for _ in range(args.requests)]
+        for future in futures:
+            future.result()
+        rate = args.requests * args.batch / (time.perf_counter() - started)
+        memory = pool.refresh_memory()
+        rss = np.mean([m.get("rss_mb", 0) for m in memory.values()])
+        pss = np.mean([m.get("pss_mb", 0) for m in memory.values()])
+        pool.close()
+        print(f"{workers:>8} {rate:>12.1f} {rss:>14.1f} {pss:>14.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,78 @@
+import datetime
+from contextlib import nullcontext
 import streamlit as st
 from PIL import Image
-
-def run(disease_db, treatment_db, image_processor, ml_model):
+from outbreak_detector import get_outbreak_detector
+from similarity_index import get_similarity_index
+from image_hashing import DuplicateFilter
+from image_store import get_image_store
+from session_store import session_objects
+from instrumentation import metrics, stage
+
+def show_similar_cases(ml_model, image, digest, predicted_disease, k=5):
+    """List the closest past cases, then add this diagnosis to the index"""
+    with stage("similar_cases"):
+        embedding = ml_model.embed(image)
+        if embedding is None:
+            return
+        index = get_similarity_index()
+        key = "diagnosis:" + digest
+        matches = [m for m in index.search(embedding, k + 1) if m['key'] != key][:k]
+        index.add(embedding, [predicted_disease], [key])
+
+    if matches:
+        with st.expander("🔎 Similar past cases"):
+            for match in matches:
+                source = "training image" if match['key'].startswith("dataset:") else "past diagnosis"
+                st.markdown(f"- **{match['label']}** ({source}, similarity {match['similarity']:.0%})")
+
+def save_to_records(digest, predicted_disease, confidence, model_version=None):
+    """Let the user file this diagnosis as a health record that references the stored photo"""
+    with st.form(f"save_record_{digest[:16]}"):
+        st.markdown("#### 💾 Save to Herd Records")
+        col1, col2 = st.columns(2)
+        with col1:
+            cow_id = st.text_input("Cow ID/Tag Number")
+        with col2:
+            severity = st.selectbox("Severity Level", ["Mild", "Moderate", "Severe"], index=1)
+        weight = st.number_input("Body Weight (kg)", min_value=0.0, value=None,
+                                 help="Used to estimate treatment cost from the protocol doses")
+        if st.form_submit_button("Save Diagnosis") and cow_id:
+            record = {
+                'cow_id': cow_id,
+                'diagnosis_date': datetime.date.today(),
+                'disease_name': predicted_disease,
+                'severity': severity.lower(),
+                'confidence_score': confidence,
+                'image_filename': digest,
+                'model_version': model_version,
+                'weight_kg': weight,
+            }
+            from field_sync import offline_capture_enabled, get_capture_queue
+            if offline_capture_enabled():
+                # Queued on the device with its photo; synced to the central database later
+                path = get_image_store().original_path(digest)
+                if path is None:
+                    st.error("The original photo is no longer stored; upload it again to save this diagnosis.")
+                    return
+                with open(path, "rb") as f:
+                    get_capture_queue().capture(record, f.read())
+                st.success(f"Diagnosis for Cow {cow_id} saved on this device; it will upload on the next sync")
+                return
+            from database import get_database_manager
+            if get_database_manager().add_health_record(record):
+                st.success(f"Diagnosis saved for Cow {cow_id}")
+
+def analyze(uploaded_file, image, image_processor, ml_model):
+    """Store, quality-check and diagnose one photo; predictions is None if it could not be preprocessed"""
+    with stage("store_image"):
+        digest = get_image_store().put(uploaded_file.getvalue(), image)
+    quality = image_processor.detect_image_quality(image)
+    processed = image_processor.preprocess_image(image)
+    predictions = ml_model.predict(image, quality=quality) if processed is not None else None
+    return {'digest': digest, 'quality': quality, 'predictions': predictions}
+
+def run(disease_db, treatment_db, image_processor, ml_model, language=None):
     st.header("Upload Cow Image for Diagnosis")
 
     upload_option = st.radio("Upload Method:", ["Single Image", "Multiple Images"])
@@ -15,55 +86,91 @@ def run(disease_db, treatment_db, image_processor, ml_model):
     if uploaded_files and any(uploaded_files):
         valid_files = [f for f in uploaded_files if f is not None]
         all_predictions = []
+        # Top predictions diagnosed in this run; results reused on a rerun were already counted
+        new_predictions = []
+        # Bursts of near-identical photos are diagnosed once
+        duplicates = DuplicateFilter()
+
+        # Decoded photos and results live in this session's budgeted store, so a
+        # rerun (saving a record, switching language) does not diagnose them again
+        objects = session_objects()
+        objects.retain("upload:", [f.file_id for f in valid_files])
 
         for idx, uploaded_file in enumerate(valid_files):
+            key = f"upload:{uploaded_file.file_id}"
+            result = objects.get(key + ":result")
             try:
-                image = Image.open(uploaded_file)
-                st.image(image, caption=f"Uploaded Image {idx + 1}", use_container_width=True)
-
-                quality = image_processor.detect_image_quality(image)
-                st.markdown("### 📷 Image Quality")
-                st.info(f"Overall: {quality['overall_quality']}")
-                if quality.get("issues"):
-                    st.warning(f"Issues: {', '.join(quality['issues'])}")
-
-                st.markdown(f"### 🧪 Analyzing Image {idx + 1}")
-                processed = image_processor.preprocess_image(image)
-                if processed is not None:
-                    predictions = ml_model.predict(image)
-
-                    if predictions:
-                        all_predictions.extend(predictions)
-                        for i, (disease_name, confidence) in enumerate(predictions[:3]):
-                            st.markdown(f"### 🐮 Predicted Disease: **{disease_name}** (Confidence: {confidence:.1%})")
-
-                            disease_info = disease_db.get_disease_info(disease_name)
-                            treatment_info = treatment_db.get_treatment_info(disease_name)
-
-                            if disease_info:
-                                st.markdown("#### 🧬 Disease Information")
-                                st.markdown(f"- **Description:** {disease_info['description']}")
-                                st.markdown(f"- **Symptoms:** {disease_info['symptoms']}")
-                                st.markdown(f"- **Causes:** {disease_info['causes']}")
-
-                            if treatment_info:
-                                st.markdown("#### 💊 Treatment Information")
-                                st.markdown(f"- **Immediate Actions:** {treatment_info['immediate_actions']}")
-                                st.markdown(f"- **Medications:** {treatment_info['medications']}")
-                                st.markdown(f"- **Dosage:** {treatment_info['dosage']}")
-                                st.markdown(f"- **Duration:** {treatment_info['duration']}")
-                                st.markdown(f"- **Prevention:** {treatment_info['prevention']}")
-                                st.info("⚠️ Always consult a veterinarian before applying treatment.")
-                            else:
-                                st.warning("🚫 No treatment info available.")
-                            st.markdown("---")
+                with metrics.request("diagnose_image", mode="batch" if len(valid_files) > 1 else "single") \
+                        if result is None else nullcontext():
+                    image = objects.get(key + ":image")
+                    if image is None:
+                        with stage("decode"):
+                            image = Image.open(uploaded_file)
+                            image.load()
+                        objects.put(key + ":image", image)
+                    with stage("dedupe"):
+                        original = duplicates.check(image, idx)
+                    if original is not None:
+                        st.info(f"Image {idx + 1} is a near-duplicate of image {original + 1}; skipped.")
+                        continue
+                    st.image(image, caption=f"Uploaded Image {idx + 1}", use_container_width=True)
+                    fresh = result is None
+                    if fresh:
+                        result = objects.put(key + ":result", analyze(uploaded_file, image, image_processor, ml_model))
+                    digest, quality, predictions = result['digest'], result['quality'], result['predictions']
+
+                    st.markdown("### 📷 Image Quality")
+                    st.info(f"Overall: {quality['overall_quality']}")
+                    if quality.get("issues"):
+                        st.warning(f"Issues: {', '.join(quality['issues'])}")
+
+                    st.markdown(f"### 🧪 Analyzing Image {idx + 1}")
+                    if predictions is not None:
+                        if predictions:
+                            all_predictions.extend(predictions)
+                            if fresh:
+                                new_predictions.append((digest, *predictions[0]))
+                            for i, (disease_name, confidence) in enumerate(predictions[:3]):
+                                st.markdown(f"### 🐮 Predicted Disease: **{disease_name}** (Confidence: {confidence:.1%})")
+
+                                with stage("knowledge_lookup"):
+                                    disease_info = disease_db.get_disease_info(disease_name, language)
+                                    treatment_info = treatment_db.get_treatment_info(disease_name, language)
+
+                                if disease_info:
+                                    st.markdown("#### 🧬 Disease Information")
+                                    st.markdown(f"- **Description:** {disease_info['description']}")
+                                    st.markdown(f"- **Symptoms:** {disease_info['symptoms']}")
+                                    st.markdown(f"- **Causes:** {disease_info['causes']}")
+
+                                if treatment_info:
+                                    st.markdown("#### 💊 Treatment Information")
+                                    st.markdown(f"- **Immediate Actions:** {treatment_info['immediate_actions']}")
+                                    st.markdown(f"- **Medications:** {treatment_info['medications']}")
+                                    st.markdown(f"- **Dosage:** {treatment_info['dosage']}")
+                                    st.markdown(f"- **Duration:** {treatment_info['duration']}")
+                                    st.markdown(f"- **Prevention:** {treatment_info['prevention']}")
+                                    st.info("⚠️ Always consult a veterinarian before applying treatment.")
+                                else:
+                                    st.warning("🚫 No treatment info available.")
+                                st.markdown("---")
+
+                            show_similar_cases(ml_model, image, digest, predictions[0][0])
+                            save_to_records(digest, *predictions[0], model_version=ml_model.model_version)
+                        else:
+                            st.warning("No disease detected.")
                     else:
-                        st.warning("No disease detected.")
-                else:
-                    st.error("Could not process image.")
+                        st.error("Could not process image.")
             except Exception as e:
                 st.error(f"Failed to process: {str(e)}")
 
+        if len(valid_files) > 1 and new_predictions:
+            with stage("outbreak_check"):
+                alerts = get_outbreak_detector().observe_predictions(new_predictions)
+            for alert in alerts:
+                st.error(f"🚨 Possible {alert['disease']} outbreak: {alert['cases_today']} cases today "
+                         f"(expected {alert['expected']:.1f}). Contact your veterinary officer.")
+
         if len(valid_files) > 1 and all_predictions:
             st.header("📊 Summary Across All Images")
             count = {}
@@ -77,8 +184,9 @@ def run(disease_db, treatment_db, image_processor, ml_model):
                 avg_conf = confidence[d] / count[d]
                 st.markdown(f"### 🔍 {d} (Detected in {count[d]} image(s), Avg Confidence: {avg_conf:.1%})")
 
-                info = disease_db.get_disease_info(d)
-                treat = treatment_db.get_treatment_info(d)
+                with stage("knowledge_lookup"):
+                    info = disease_db.get_disease_info(d, language)
+                    treat = treatment_db.get_treatment_info(d, language)
 
                 if info:
                     st.markdown(f"- **Description:** {info['description']}")
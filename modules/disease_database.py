@@ -3,8 +3,7 @@ import pandas as pd
 from fpdf import FPDF
 import base64
 import datetime
-import smtplib
-from email.message import EmailMessage
+from feedback_outbox import enqueue_feedback
 
 # ---------- Function to generate PDF ----------
 def generate_pdf(disease_data):
@@ -34,30 +33,12 @@ def generate_pdf(disease_data):
 
 # ---------- Function to send feedback via email ----------
 def send_feedback_email(disease_name, issue_description):
-    try:
-        sender = st.secrets["email"]["sender"]
-        receiver = st.secrets["email"]["receiver"]
-        app_password = st.secrets["email"]["app_password"]
-
-        msg = EmailMessage()
-        msg["Subject"] = f"🧾 Feedback Report for: {disease_name}"
-        msg["From"] = sender
-        msg["To"] = receiver
-        msg.set_content(
-            f"Feedback submitted for disease: {disease_name}\n\nIssue or Suggestion:\n{issue_description}"
-        )
-
-        with smtplib.SMTP_SSL("smtp.gmail.com", 465) as smtp:
-            smtp.login(sender, app_password)
-            smtp.send_message(msg)
-        return True
-    except Exception as e:
-        print("Email Error:", e)
-        return False
+    """Queue feedback for delivery by the background outbox worker"""
+    return enqueue_feedback(disease_name, issue_description)
 
 
 # ---------- Main App Function ----------
-def run(disease_db, treatment_db):
+def run(disease_db, treatment_db, language=None):
     # ---------- CSS ----------
     st.markdown(
         """
@@ -106,7 +87,7 @@ def run(disease_db, treatment_db):
     st.header("📚 Cow Disease Database")
     st.caption(f"🕒 Last Updated: {datetime.datetime.now().strftime('%d %B %Y, %I:%M %p')}")
 
-    all_diseases = disease_db.get_all_diseases()
+    all_diseases = disease_db.get_all_diseases(language)
     if not all_diseases:
         st.warning("Disease database is empty. Please check the database configuration.")
         return
@@ -121,7 +102,7 @@ def run(disease_db, treatment_db):
 
     disease_list = []
     for name, info in filtered_diseases.items():
-        treatment = treatment_db.get_treatment_info(name) or {}
+        treatment = treatment_db.get_treatment_info(name, language) or {}
         disease_list.append({
             "Disease Name": name,
             "Description": info.get("description", ""),
@@ -155,7 +136,7 @@ def run(disease_db, treatment_db):
     for disease_name in sorted(filtered_diseases.keys()):
         with st.expander(f"🦠 {disease_name}"):
             disease_info = filtered_diseases[disease_name]
-            treatment_info = treatment_db.get_treatment_info(disease_name)
+            treatment_info = treatment_db.get_treatment_info(disease_name, language)
 
             col1, col2 = st.columns(2)
             with col1:
@@ -187,8 +168,8 @@ def run(disease_db, treatment_db):
         if st.button("📩 Submit Feedback"):
             if reported_disease and issue_desc:
                 if send_feedback_email(reported_disease, issue_desc):
-                    st.success("✅ Feedback submitted and email sent to admin!")
+                    st.success("✅ Feedback submitted! It will be emailed to the admin shortly.")
                 else:
-                    st.error("❌ Failed to send email. Please try again later.")
+                    st.error("❌ Failed to save feedback. Please try again later.")
             else:
                 st.warning("Please fill in both fields before submitting.")
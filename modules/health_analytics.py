@@ -1,20 +1,70 @@
+import os
 import streamlit as st
 import pandas as pd
+import datetime
+from image_store import get_image_store
+from analytics import get_health_analytics
+from outbreak_detector import get_outbreak_detector
 
 def run(db_manager):
     st.header("📊 Health Analytics Dashboard")
     st.info("Track your herd's health patterns and trends")
 
+    analytics = get_health_analytics(db_manager)
+
+    for alert in get_outbreak_detector().active_alerts():
+        st.error(f"🚨 {alert['disease']} spike on {alert['date']}: {alert['cases_today']} cases "
+                 f"(expected {alert['expected']:.1f}, {alert['cases_7d']} in the last 7 days)")
+
+    today = datetime.date.today()
+    date_range = st.date_input("Date Range", (today - datetime.timedelta(days=90), today))
+    if not isinstance(date_range, (list, tuple)) or len(date_range) != 2:
+        st.info("Select a start and end date.")
+        return
+    start, end = date_range
+
+    summary = analytics.summary(start, end)
     col1, col2, col3 = st.columns(3)
     with col1:
-        st.metric("Total Diagnoses", "47", "12%")
+        change = summary['change_pct']
+        st.metric("Total Diagnoses", summary['total_diagnoses'], f"{change:.0f}%" if change is not None else None)
     with col2:
-        st.metric("Most Common Disease", "Mastitis", "35% of cases")
+        st.metric("Most Common Disease", summary['most_common_disease'] or "-", f"{summary['most_common_share']:.0f}% of cases")
     with col3:
-        st.metric("Prevention Success Rate", "78%", "5%")
+        st.metric("Recurrence Rate", f"{summary['recurrence_rate']:.0f}%", f"₹{summary['total_cost']:,.0f} total cost", delta_color="off")
+
+    if summary['total_diagnoses']:
+        st.subheader("📈 Disease Frequency Trends")
+        freq = st.radio("Group by", ["Day", "Week", "Month"], index=1, horizontal=True)
+        st.line_chart(analytics.incidence(start, end, freq={"Day": "D", "Week": "W", "Month": "MS"}[freq]))
+
+        col1, col2 = st.columns(2)
+        with col1:
+            st.subheader("💰 Cost per Disease")
+            st.dataframe(analytics.cost_per_disease(start, end))
+        with col2:
+            st.subheader("🌡️ Severity Mix")
+            st.dataframe(analytics.severity_mix(start, end).style.format("{:.0%}"))
+
+        st.subheader("🔁 Cows with Recurring Cases")
+        recurrence = analytics.recurrence(start, end)
+        if recurrence.empty:
+            st.info("No repeat cases in this period.")
+        else:
+            st.dataframe(recurrence)
+    else:
+        st.info("No health records in this date range. Add records below or import historical data.")
 
-    st.subheader("📈 Disease Frequency Trends (Mock)")
-    st.info("Health analytics requires connection to your farm management system or manual data entry to display real trends and statistics.")
+    photographed = [r for r in db_manager.get_health_records(limit=200) if r['image_filename']][:12]
+    if photographed:
+        st.subheader("🖼️ Recent Diagnosed Photos")
+        store = get_image_store()
+        columns = st.columns(6)
+        for i, record in enumerate(photographed):
+            thumbnail = store.thumbnail_path(record['image_filename'])
+            if os.path.exists(thumbnail):
+                with columns[i % 6]:
+                    st.image(thumbnail, caption=f"{record['cow_id']}: {record['disease_name']}")
 
     st.subheader("📝 Manual Health Record Entry")
     with st.form("health_record_form"):
@@ -25,7 +75,9 @@ def run(db_manager):
             disease = st.selectbox("Diagnosed Disease", ["Mastitis", "Lameness", "Respiratory Disease", "Ketosis", "Pink Eye", "Other"])
         with col2:
             severity = st.selectbox("Severity Level", ["Mild", "Moderate", "Severe"])
-            cost = st.number_input("Treatment Cost (₹)", min_value=0.0)
+            cost = st.number_input("Treatment Cost (₹)", min_value=0.0, value=None,
+                                   help="Leave empty to estimate it from the treatment protocol")
+            weight = st.number_input("Body Weight (kg)", min_value=0.0, value=None)
             vet = st.text_input("Veterinarian Name")
         notes = st.text_area("Additional Notes")
         submitted = st.form_submit_button("Add Health Record")
@@ -36,8 +88,9 @@ def run(db_manager):
                 'diagnosis_date': diagnosis_date,
                 'disease_name': disease,
                 'severity': severity.lower(),
-                'treatment_applied': f"{severity} treatment for {disease}",
+                'treatment_applied': f"{severity} treatment for {disease}" if cost is not None else None,
                 'total_cost': cost,
+                'weight_kg': weight,
                 'veterinarian': vet,
                 'notes': notes
             }
@@ -13,11 +13,14 @@ def run(db_manager):
         if records:
             df = pd.DataFrame(records)
             st.dataframe(df)
+            if df['cost_estimated'].eq(True).any():
+                st.caption("cost_estimated: costs were not entered and were estimated from the treatment "
+                           "protocol and drug price list.")
         else:
             st.info("No records available.")
 
     with tab2:
-        search = st.text_input("Search by Disease or Cow ID")
+        search = st.text_input("Search by Cow ID, Disease, Symptoms, Treatment or Notes")
         if search:
             results = db_manager.search_records(search)
             if results:
@@ -0,0 +1,57 @@
+from functools import lru_cache
+from html import escape
+from typing import Iterable
+
+# Base font size for each Settings choice
+FONT_SIZES = {
+    "Small": "14px",
+    "Medium": "17px",
+    "Large": "20px"
+}
+
+
+@lru_cache(maxsize=None)
+def dashboard_css(font_size: str) -> str:
+    """The dashboard's global styles as one <style> block"""
+    return f"""
+    <style>
+    html, body, [class*="css"]  {{
+        font-family: 'Segoe UI', sans-serif;
+        background-color: #F8FAFC;
+        font-size: {FONT_SIZES.get(font_size, FONT_SIZES["Medium"])} !important;
+    }}
+    .guide details {{
+        border: 1px solid #E2E8F0;
+        border-radius: 8px;
+        padding: 0.4em 0.8em;
+        margin-bottom: 0.6em;
+        background-color: #FFFFFF;
+    }}
+    .guide summary {{
+        cursor: pointer;
+        font-weight: 600;
+    }}
+    .guide .note {{
+        background-color: #FFF8E1;
+        border-radius: 8px;
+        padding: 0.6em 0.8em;
+        margin-bottom: 0.8em;
+    }}
+    </style>
+    """
+
+
+def html_list(items: Iterable[str], ordered: bool = False) -> str:
+    tag = "ol" if ordered else "ul"
+    return f"<{tag}>" + "".join(f"<li>{escape(item)}</li>" for item in items) + f"</{tag}>"
+
+
+def section(summary: str, body: str) -> str:
+    """Collapsible section; plain <details> needs no widget round trip to open"""
+    return f"<details><summary>{escape(summary)}</summary>{body}</details>"
+
+
+def guide_page(font_size: str, *parts: str) -> str:
+    """Wrap a static page's parts in one fragment, sized for the Settings font size"""
+    size = FONT_SIZES.get(font_size, FONT_SIZES["Medium"])
+    return f'<div class="guide" style="font-size:{size}">' + "".join(parts) + "</div>"
@@ -1,6 +1,8 @@
 import streamlit as st
+import pandas as pd
 import ast
-from cow_nutrition_model.suggest import get_nutrition_advice
+from cow_nutrition_model.suggest import get_nutrition_advice, advise_herd
+from cow_nutrition_model.ration import load_feeds, get_ration_optimizer
 
 def run():
     st.title("🐄 Nutrition Advisor for Livestock")
@@ -55,3 +57,46 @@ def run():
             <p>{result.get("follow_up", "-")}</p>
         </div>
         """, unsafe_allow_html=True)
+
+    st.markdown("---")
+    st.subheader("🐄🐄 Whole-Herd Nutrition Plan")
+    herd_file = st.file_uploader("Upload herd CSV (columns: breed, age, stage; optional: weight, milk_yield)",
+                                 type=["csv"], key="herd_csv")
+    if herd_file is not None:
+        herd = pd.read_csv(herd_file)
+        missing = {"breed", "age", "stage"} - set(herd.columns)
+        if missing:
+            st.error(f"⚠️ Missing columns: {', '.join(sorted(missing))}")
+            return
+        plan = advise_herd(herd)
+        st.dataframe(plan)
+        st.download_button("⬇️ Download Plan", plan.to_csv(index=False), file_name="herd_nutrition_plan.csv",
+                           mime="text/csv")
+
+        if not {"weight", "milk_yield"} & set(herd.columns):
+            st.info("Add weight (kg) and milk_yield (litres/day) columns for a least-cost ration.")
+            return
+        st.subheader("🌾 Least-Cost Herd Ration")
+        st.caption("Edit prices, nutrient content and daily stock to match your farm. "
+                   "Leave share and availability limits blank for no limit.")
+        feeds = st.data_editor(load_feeds(), num_rows="dynamic", key="feed_inventory")
+        if st.button("🧮 Optimize Ration"):
+            try:
+                result = get_ration_optimizer(feeds.to_csv(index=False)).optimize_herd(herd)
+            except Exception as e:
+                st.error(f"⚠️ Could not optimize ration: {e}")
+                return
+            if result['status'] != "optimal":
+                st.warning(f"⚠️ Ration {result['status']}: no ration for {result['uncosted_head']:,} of "
+                           f"{len(herd):,} animals; their rows are left blank and not costed.")
+            col1, col2 = st.columns(2)
+            col1.metric("Daily feed cost", f"₹{result['daily_cost']:,.0f}")
+            col2.metric("Animals costed", f"{len(herd) - result['uncosted_head']:,}/{len(herd):,}")
+            rations = result['groups'][["age_group", "stage", "weight", "milk_yield", "head", "cost_per_head"]] \
+                .join(result['rations'])
+            st.dataframe(rations)
+            st.bar_chart(result['feed_totals_kg'])
+            per_animal = herd.join(rations.drop(columns=["age_group", "stage", "weight", "milk_yield", "head"])
+                                   .reindex(result['animal_group']).set_index(herd.index))
+            st.download_button("⬇️ Download Rations", per_animal.to_csv(index=False), file_name="herd_rations.csv",
+                               mime="text/csv")
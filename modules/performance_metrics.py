@@ -0,0 +1,76 @@
+import streamlit as st
+import pandas as pd
+from instrumentation import metrics, start_metrics_server
+
+def run(load_ml_model):
+    st.header("📈 Performance Metrics")
+    st.caption("Per-stage latency of the diagnosis pipeline since the server started.")
+
+    rows = metrics.snapshot()
+    if not rows:
+        st.info("No requests recorded yet. Diagnose an image to collect timings.")
+    else:
+        df = pd.DataFrame(rows).set_index("stage")
+        st.dataframe(df.style.format({c: "{:.1f}" for c in ["mean_ms", "p50_ms", "p95_ms", "p99_ms", "max_ms"]}))
+        st.bar_chart(df["mean_ms"])
+
+    col1, col2 = st.columns(2)
+    with col1:
+        if st.button("🧹 Reset Metrics"):
+            metrics.reset()
+            st.rerun()
+    with col2:
+        port = start_metrics_server()
+        if port:
+            st.markdown(f"Prometheus endpoint: `http://<host>:{port}/metrics`")
+
+    st.subheader("🐢 Slow Request Profiles")
+    st.caption(f"Sample rate {metrics.profile_sample_rate:.0%}, kept when slower than {metrics.slow_threshold:.1f}s "
+               "(set PASHU_PROFILE_SAMPLE_RATE and PASHU_SLOW_REQUEST_SECONDS).")
+    if not metrics.slow_profiles:
+        st.info("No slow requests captured.")
+    for profile in reversed(metrics.slow_profiles):
+        with st.expander(f"{profile['at']} · {profile['name']} · {profile['seconds']:.2f}s {profile['labels']}"):
+            st.code(profile['stats'])
+
+    with st.expander("Raw Prometheus text"):
+        st.code(metrics.prometheus_text())
+
+    st.subheader("🧠 Session Memory")
+    from session_store import get_session_store
+    usage = get_session_store().usage()
+    st.caption("Uploaded images and results held per browser session; beyond the budget "
+               "(PASHU_SESSION_BUDGET_MB) the least recently used are spilled to disk.")
+    st.markdown(f"{len(usage['sessions'])} sessions: **{usage['total_memory_mb']:.1f} MB** in memory, "
+                f"{usage['total_spilled_mb']:.1f} MB spilled, {usage['total_objects']} objects.")
+    if usage['sessions']:
+        st.dataframe(pd.DataFrame(usage['sessions']).set_index("session_id"))
+
+    st.subheader("🔁 Re-score History with the Current Model")
+    st.caption("Runs stored record images through the deployed model in the background, "
+               "pausing while diagnoses are in progress.")
+    from database import get_database_manager
+    db_manager = get_database_manager()
+    # The version the re-scoring job scores with, hashed once when the shared model was loaded
+    service = load_ml_model()
+    model_version = service.model_version if service.model_loaded else None
+    if not model_version:
+        st.info("No trained model deployed.")
+        return
+    progress = db_manager.get_rescoring_progress(model_version)
+    st.markdown(f"Model `{model_version}`: {progress['done']}/{progress['total']} stored images re-scored.")
+
+    if st.button("▶️ Start / Resume Re-scoring"):
+        from rescoring import get_rescoring_job
+        from image_store import get_image_store
+        job = get_rescoring_job(service, db_manager, get_image_store())
+        job.start()
+        st.success("Re-scoring started.")
+
+    if progress['done']:
+        from rescoring import drift_report
+        report = drift_report(db_manager, model_version)
+        st.metric("Labels changed vs original diagnosis", f"{report['changed']}/{report['rescored']}",
+                  f"{report['change_rate']:.1%}", delta_color="off")
+        if report['transitions']:
+            st.dataframe(pd.DataFrame(report['transitions']))
@@ -1,54 +1,61 @@
 import streamlit as st
+from html import escape
+from functools import lru_cache
+from modules.html_fragments import guide_page, html_list, section
 
-def run():
-    st.header("🛡️ Disease Prevention Guide")
-
-    prevention_categories = {
-        "Hygiene & Sanitation": {
-            "description": "Basic cleanliness practices to prevent disease spread",
-            "practices": [
-                "Clean milking equipment daily with approved sanitizers",
-                "Maintain clean, dry bedding areas",
-                "Regular cleaning of feed and water containers",
-                "Proper waste management and disposal",
-                "Hand hygiene for farm workers"
-            ]
-        },
-        "Nutrition Management": {
-            "description": "Proper feeding practices for disease prevention",
-            "practices": [
-                "Provide balanced nutrition based on life stage",
-                "Ensure access to clean, fresh water",
-                "Monitor body condition scores regularly",
-                "Avoid sudden feed changes",
-                "Store feed properly to prevent contamination"
-            ]
-        },
-        "Vaccination Programs": {
-            "description": "Essential vaccines for cattle health",
-            "practices": [
-                "Follow recommended vaccination schedules",
-                "Consult veterinarian for regional disease risks",
-                "Maintain proper vaccine storage conditions",
-                "Keep detailed vaccination records",
-                "Monitor for adverse reactions"
-            ]
-        },
-        "Environmental Controls": {
-            "description": "Managing the farm environment for health",
-            "practices": [
-                "Ensure proper ventilation in housing",
-                "Control flies and other disease vectors",
-                "Maintain appropriate stocking densities",
-                "Provide adequate shelter from weather",
-                "Regular facility maintenance and repair"
-            ]
-        }
+PREVENTION_CATEGORIES = {
+    "Hygiene & Sanitation": {
+        "description": "Basic cleanliness practices to prevent disease spread",
+        "practices": [
+            "Clean milking equipment daily with approved sanitizers",
+            "Maintain clean, dry bedding areas",
+            "Regular cleaning of feed and water containers",
+            "Proper waste management and disposal",
+            "Hand hygiene for farm workers"
+        ]
+    },
+    "Nutrition Management": {
+        "description": "Proper feeding practices for disease prevention",
+        "practices": [
+            "Provide balanced nutrition based on life stage",
+            "Ensure access to clean, fresh water",
+            "Monitor body condition scores regularly",
+            "Avoid sudden feed changes",
+            "Store feed properly to prevent contamination"
+        ]
+    },
+    "Vaccination Programs": {
+        "description": "Essential vaccines for cattle health",
+        "practices": [
+            "Follow recommended vaccination schedules",
+            "Consult veterinarian for regional disease risks",
+            "Maintain proper vaccine storage conditions",
+            "Keep detailed vaccination records",
+            "Monitor for adverse reactions"
+        ]
+    },
+    "Environmental Controls": {
+        "description": "Managing the farm environment for health",
+        "practices": [
+            "Ensure proper ventilation in housing",
+            "Control flies and other disease vectors",
+            "Maintain appropriate stocking densities",
+            "Provide adequate shelter from weather",
+            "Regular facility maintenance and repair"
+        ]
     }
+}
+
+
+@lru_cache(maxsize=None)
+def render_page(language: str, font_size: str) -> str:
+    """The whole guide as one HTML fragment, built once per language and font size"""
+    parts = ["<h2>🛡️ Disease Prevention Guide</h2>"]
+    for category, info in PREVENTION_CATEGORIES.items():
+        parts.append(section(f"📋 {category}",
+                             f"<p><strong>{escape(info['description'])}</strong></p>" + html_list(info['practices'])))
+    return guide_page(font_size, *parts)
+
 
-    for category, info in prevention_categories.items():
-        with st.expander(f"📋 {category}"):
-            st.markdown(f"**{info['description']}**")
-            st.markdown("")
-            for practice in info['practices']:
-                st.markdown(f"• {practice}")
+def run(language="English", font_size="Medium"):
+    st.markdown(render_page(language, font_size), unsafe_allow_html=True)
@@ -1,19 +1,70 @@
 import streamlit as st
+import pandas as pd
+from treatment_costs import DEFAULT_WEIGHT_KG, SEVERITY_POSITION, get_cost_engine, load_prices
 
-def run():
+def run(treatment_db):
     st.header("💊 Treatment Cost Calculator")
+    st.caption("Costs follow the dosage in each treatment protocol: weight-based doses are scaled by body "
+               "weight and priced per pack unit, plus labour and supplies per administration.")
 
-    disease_costs = {
-        "Mastitis": {"mild": 1000, "moderate": 2000, "severe": 4000},
-        "Lameness": {"mild": 1200, "moderate": 2500, "severe": 4500}
-    }
+    with st.expander("💲 Drug Prices"):
+        st.caption("Edit prices and concentrations to match your supplier.")
+        prices = st.data_editor(load_prices(), num_rows="dynamic", key="drug_prices")
+    try:
+        engine = get_cost_engine(prices.to_csv(index=False))
+    except Exception as e:
+        st.error(f"⚠️ Could not use the price list: {e}")
+        return
+    if engine.unpriced:
+        st.warning(f"No price for {', '.join(engine.unpriced)}; those drugs are left out of the estimates.")
 
-    disease = st.selectbox("Disease", list(disease_costs.keys()))
-    severity = st.selectbox("Severity", ["mild", "moderate", "severe"])
-    num_animals = st.number_input("Number of Cattle", min_value=1, value=1)
+    diseases = list(engine.regimens["disease"].unique())
+    uncosted = [name for name in treatment_db.get_all_treatments() if name not in diseases]
+    if uncosted:
+        st.caption(f"No weight-based doses to cost for {', '.join(uncosted)}.")
+
+    st.subheader("📊 Quick Estimate")
+    col1, col2 = st.columns(2)
+    with col1:
+        disease = st.selectbox("Disease", diseases)
+        severity = st.selectbox("Severity", list(SEVERITY_POSITION))
+    with col2:
+        num_animals = st.number_input("Number of Cattle", min_value=1, value=1)
+        weight = st.number_input("Average Body Weight (kg)", min_value=50.0, value=DEFAULT_WEIGHT_KG, step=10.0)
 
     if disease and severity:
-        cost = disease_costs[disease][severity] * num_animals
-        st.subheader("📊 Cost Estimate")
-        st.markdown(f"**Estimated Total Cost:** ₹{cost}")
-        st.markdown(f"**Per Animal:** ₹{cost/num_animals}")
+        herd = pd.DataFrame({"disease": [disease], "severity": [severity], "weight": [weight]})
+        result = engine.cost_herd(herd, lines=True)
+        animal = result["animals"].iloc[0]
+        st.markdown(f"**Estimated Total Cost:** ₹{animal['total_cost'] * num_animals:,.0f}")
+        st.markdown(f"**Per Animal:** ₹{animal['total_cost']:,.0f} (medication ₹{animal['medication_cost']:,.0f}, "
+                    f"labour ₹{animal['labor_cost']:,.0f}, supplies ₹{animal['supplies_cost']:,.0f})")
+        st.dataframe(result["lines"].drop(columns=["animal"]).round(2), hide_index=True)
+
+    st.subheader("🐄 Herd Outbreak Costing")
+    st.caption("Upload a CSV with one row per animal: disease, severity and optionally weight "
+               f"(defaults to {DEFAULT_WEIGHT_KG:.0f} kg) and quarters for intramammary treatment.")
+    uploaded = st.file_uploader("Herd CSV", type=["csv"], key="herd_costing")
+    if uploaded is None:
+        return
+    try:
+        herd = pd.read_csv(uploaded)
+        herd.columns = [str(c).strip().lower() for c in herd.columns]
+        result = engine.cost_herd(herd)
+    except Exception as e:
+        st.error(f"⚠️ Could not cost the herd: {e}")
+        return
+
+    totals = result["totals"]
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Animals Costed", f"{totals['costed']:,}/{totals['animals']:,}")
+    col2.metric("Total Cost", f"₹{totals['total_cost']:,.0f}")
+    col3.metric("Medication", f"₹{totals['medication_cost']:,.0f}")
+    if totals['costed'] < totals['animals']:
+        st.warning("Animals whose disease has no priced regimen are left blank.")
+    st.markdown("**Drugs to order**")
+    st.dataframe(result["drugs"].round(2), hide_index=True)
+    animals = herd.drop(columns=result["animals"].columns, errors="ignore").join(result["animals"].round(2))
+    st.dataframe(animals.head(500))
+    st.download_button("📥 Download Per-Animal Costs", animals.to_csv(index=False),
+                       file_name="treatment_costs.csv", mime="text/csv")
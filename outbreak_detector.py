@@ -0,0 +1,370 @@
+import os
+import copy
+import json
+import math
+import time
+import argparse
+import tempfile
+import threading
+from collections import OrderedDict, deque
+from datetime import date, datetime, timedelta
+from typing import Callable, Dict, List, Optional
+
+import pandas as pd
+
+STATE_PATH = "outbreak_state.json"
+
+# Detector settings; priority diseases alarm earlier and on fewer cases
+DEFAULT_SETTINGS = {
+    'alpha': 0.1,        # EWMA weight of the newest day in the baseline
+    'gamma': 0.05,       # EWMA weight for the day-of-week seasonal factors
+    'cusum_k': 0.5,      # CUSUM allowance, in standard deviations
+    'cusum_h': 6.0,      # CUSUM decision threshold
+    'z_alarm': 4.0,      # Single-day spike threshold, in standard deviations
+    'min_cases': 3,      # Never alarm on fewer cases than this in a day
+    'warmup_days': 14,   # Days of history required before alarming
+}
+PRIORITY_SETTINGS = {
+    'anthrax': {'cusum_h': 2.0, 'z_alarm': 2.0, 'min_cases': 1, 'warmup_days': 0},
+    'lumpyskindisease': {'cusum_h': 5.0, 'z_alarm': 3.5},
+    'mastitis': {'cusum_h': 5.0},
+}
+
+MAX_GAP_DAYS = 60  # EWMA has converged to zero long before this
+# Photos already counted as diagnoses, so saving one as a record does not count it again
+MAX_SEEN_IMAGES = 5000
+
+
+def normalize_disease(name: str) -> str:
+    """Match 'LumpySkinDisease' from the model with 'Lumpy Skin Disease' from records"""
+    return str(name).replace(" ", "").lower()
+
+
+def _new_state(day: int) -> Dict:
+    return {
+        'day': day, 'count': 0, 'alerted': False,
+        'ring': [0] * 7, 'window': 0,
+        'mean': 0.0, 'var': 0.0, 'cusum': 0.0,
+        'season': [1.0] * 7, 'days_seen': 0,
+    }
+
+
+class OutbreakDetector:
+    """Streaming per-disease spike detector.
+
+    Each event only increments the current day's counter (O(1)); baselines
+    are updated once per elapsed day with an EWMA of deseasonalised daily
+    counts and a one-sided CUSUM. The whole state is a few numbers per
+    disease and is persisted as JSON so restarts never rescan history.
+    """
+
+    def __init__(self, state_path: Optional[str] = STATE_PATH, on_alert: Optional[Callable[[Dict], None]] = None):
+        self.state_path = state_path
+        self.on_alert = on_alert
+        self.diseases = {}
+        self.names = {}
+        self.alerts = deque(maxlen=200)
+        self.events = 0
+        self.late_events = 0
+        self.seen_images = OrderedDict()
+        self._lock = threading.Lock()
+        # Orders whole saves, so an older snapshot never replaces a newer one
+        self._save_lock = threading.Lock()
+        self._dirty = False
+        if state_path and os.path.exists(state_path):
+            self.load(state_path)
+
+    # ---------- Settings ----------
+    def settings(self, key: str) -> Dict:
+        return {**DEFAULT_SETTINGS, **PRIORITY_SETTINGS.get(key, {})}
+
+    @staticmethod
+    def _expected(state: Dict, dow: int) -> float:
+        return max(state['mean'] * state['season'][dow], 0.1)
+
+    @staticmethod
+    def _std(state: Dict, expected: float) -> float:
+        # Poisson floor keeps sparse diseases from alarming on noise
+        return math.sqrt(max(state['var'], expected))
+
+    # ---------- Event ingestion ----------
+    def observe(self, disease_name: str, when=None, count: int = 1) -> Optional[Dict]:
+        """Count one case; returns an alert dict if this event triggered one"""
+        when = pd.Timestamp(when if when is not None else datetime.now())
+        day = when.toordinal()
+        key = normalize_disease(disease_name)
+
+        with self._lock:
+            self.events += count
+            self.names.setdefault(key, disease_name)
+            state = self.diseases.get(key)
+            if state is None:
+                state = self.diseases[key] = _new_state(day)
+
+            if day < state['day']:
+                # Historical backfill: outside the live window, ignore
+                self.late_events += count
+                return None
+            alert = self._advance(key, state, day) if day > state['day'] else None
+
+            state['count'] += count
+            state['window'] += count
+            self._dirty = True
+
+            # Early warning within the day, before the day is closed
+            cfg = self.settings(key)
+            if not state['alerted'] and state['days_seen'] >= cfg['warmup_days'] and state['count'] >= cfg['min_cases']:
+                expected = self._expected(state, date.fromordinal(day).weekday())
+                z = (state['count'] - expected) / self._std(state, expected)
+                if z > cfg['z_alarm']:
+                    state['alerted'] = True
+                    alert = self._raise(key, state, day, 'spike', z, expected)
+            return alert
+
+    def observe_records(self, records: List[Dict]) -> List[Dict]:
+        """Record listener for DatabaseManager: consume newly committed health records"""
+        alerts = []
+        for record in records:
+            if self._seen(record.get('image_filename')):
+                continue
+            alert = self.observe(record['disease_name'], record.get('diagnosis_date'))
+            if alert:
+                alerts.append(alert)
+        self.save()
+        return alerts
+
+    def observe_predictions(self, predictions: List, when=None, min_confidence: float = 0.5) -> List[Dict]:
+        """Consume batch diagnosis results: one (image digest, disease, confidence) top prediction per image.
+
+        Each photo is counted once, however often it is diagnosed again, and
+        is skipped when it is later saved as a health record.
+        """
+        alerts = []
+        for digest, disease_name, confidence in predictions:
+            if confidence >= min_confidence and not self._seen(digest, add=True):
+                alert = self.observe(disease_name, when)
+                if alert:
+                    alerts.append(alert)
+        self.save()
+        return alerts
+
+    def _seen(self, digest: Optional[str], add: bool = False) -> bool:
+        if not digest:
+            return False
+        with self._lock:
+            if digest in self.seen_images:
+                self.seen_images.move_to_end(digest)
+                return True
+            if add:
+                self.seen_images[digest] = None
+                if len(self.seen_images) > MAX_SEEN_IMAGES:
+                    self.seen_images.popitem(last=False)
+                self._dirty = True
+            return False
+
+    def attach(self, db_manager) -> None:
+        db_manager.add_record_listener(self.observe_records)
+
+    # ---------- Daily baseline update ----------
+    def _advance(self, key: str, state: Dict, day: int) -> Optional[Dict]:
+        """Close every day between state['day'] and day, updating the baseline"""
+        alert = self._close_day(key, state, state['day'])
+        # Days beyond MAX_GAP_DAYS would only decay the baseline further towards zero
+        for empty_day in range(state['day'] + 1, min(day, state['day'] + 1 + MAX_GAP_DAYS)):
+            state['count'] = 0
+            state['alerted'] = False
+            self._close_day(key, state, empty_day)
+        state['day'] = day
+        state['count'] = 0
+        state['alerted'] = False
+        state['ring'][day % 7] = 0
+        state['window'] = sum(state['ring'])
+        return alert
+
+    def _close_day(self, key: str, state: Dict, day: int) -> Optional[Dict]:
+        cfg = self.settings(key)
+        count = state['count']
+        dow = date.fromordinal(day).weekday()
+        expected = self._expected(state, dow)
+        state['ring'][day % 7] = count
+
+        alert = None
+        if state['days_seen'] >= cfg['warmup_days']:
+            z = (count - expected) / self._std(state, expected)
+            state['cusum'] = max(0.0, state['cusum'] + z - cfg['cusum_k'])
+            if state['cusum'] > cfg['cusum_h'] and count >= cfg['min_cases']:
+                if not state['alerted']:
+                    alert = self._raise(key, state, day, 'cusum', z, expected)
+                state['cusum'] = 0.0
+                state['alerted'] = True
+
+        # Keep outbreak days out of the baseline
+        if not state['alerted']:
+            deseasonalised = count / state['season'][dow]
+            diff = deseasonalised - state['mean']
+            state['mean'] += cfg['alpha'] * diff
+            state['var'] = (1 - cfg['alpha']) * (state['var'] + cfg['alpha'] * diff * diff)
+            if state['mean'] > 0:
+                season = state['season']
+                season[dow] = (1 - cfg['gamma']) * season[dow] + cfg['gamma'] * count / state['mean']
+                total = sum(season)
+                state['season'] = [s * 7 / total for s in season] if total else [1.0] * 7
+        state['days_seen'] += 1
+        return alert
+
+    def _raise(self, key: str, state: Dict, day: int, kind: str, z: float, expected: float) -> Dict:
+        alert = {
+            'disease': self.names.get(key, key),
+            'date': date.fromordinal(day).isoformat(),
+            'kind': kind,
+            'cases_today': state['count'],
+            'cases_7d': state['window'],
+            'expected': round(expected, 2),
+            'z_score': round(z, 2),
+            'raised_at': datetime.now().isoformat(timespec='seconds'),
+        }
+        self.alerts.append(alert)
+        if self.on_alert:
+            try:
+                self.on_alert(alert)
+            except Exception as e:
+                print(f"Outbreak alert callback failed: {e}")
+        return alert
+
+    # ---------- Queries ----------
+    def rolling_counts(self) -> Dict[str, int]:
+        """Cases per disease over the last 7 days of each disease's stream"""
+        with self._lock:
+            return {self.names.get(k, k): s['window'] for k, s in self.diseases.items()}
+
+    def active_alerts(self, days: int = 7) -> List[Dict]:
+        cutoff = (date.today() - timedelta(days=days)).isoformat()
+        return [a for a in self.alerts if a['date'] >= cutoff]
+
+    # ---------- Persistence ----------
+    def to_dict(self) -> Dict:
+        """Snapshot of the state, copied under the lock so concurrent observations cannot change it"""
+        with self._lock:
+            return copy.deepcopy({
+                'version': 1,
+                'diseases': self.diseases,
+                'names': self.names,
+                'alerts': list(self.alerts),
+                'events': self.events,
+                'seen_images': list(self.seen_images),
+            })
+
+    def save(self, path: Optional[str] = None) -> None:
+        path = path or self.state_path
+        if not path or not self._dirty:
+            return
+        with self._save_lock:
+            # Cleared before the snapshot: an observation made while writing marks the state dirty again
+            self._dirty = False
+            payload = json.dumps(self.to_dict(), separators=(',', ':'))
+            # Unique per call, so another process saving the same file cannot clobber it
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)),
+                                            prefix=os.path.basename(path) + ".", suffix=".tmp")
+            try:
+                os.fchmod(fd, 0o644)  # mkstemp creates 0600
+                with os.fdopen(fd, "w") as f:
+                    f.write(payload)
+                os.replace(tmp_path, path)
+            except BaseException:
+                os.unlink(tmp_path)
+                self._dirty = True
+                raise
+
+    def load(self, path: str) -> None:
+        try:
+            with open(path) as f:
+                data = json.load(f)
+            self.diseases = data.get('diseases', {})
+            self.names = data.get('names', {})
+            self.alerts.extend(data.get('alerts', []))
+            self.events = data.get('events', 0)
+            self.seen_images = OrderedDict.fromkeys(data.get('seen_images', []))
+        except Exception as e:
+            print(f"Failed to load outbreak detector state: {e}")
+
+
+def get_outbreak_detector() -> OutbreakDetector:
+    """Process-wide detector; get_database_manager attaches it when the shared manager is created"""
+    import streamlit as st
+
+    @st.cache_resource
+    def _detector():
+        return OutbreakDetector()
+
+    return _detector()
+
+
+# ---------- Replay benchmark ----------
+def synthetic_year(days: int = 365, daily_rate: float = 40.0, seed: int = 7):
+    """Synthetic record stream with weekly seasonality and injected outbreaks"""
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    diseases = ['Mastitis', 'Footrot', 'LumpySkinDisease', 'Pinkeye', 'Ringworm', 'TickInfestation', 'Anthrax']
+    shares = np.array([0.30, 0.20, 0.08, 0.15, 0.12, 0.149, 0.001])
+    weekly = np.array([1.1, 1.1, 1.0, 1.0, 1.0, 0.9, 0.9])
+    start = date.today() - timedelta(days=days)
+
+    injected = {
+        'LumpySkinDisease': (days // 3, 6, 4.0),
+        'Mastitis': (days // 2, 4, 2.5),
+        'Anthrax': (2 * days // 3, 2, 3.0),
+    }
+
+    events = []
+    truth = []
+    for offset in range(days):
+        day = start + timedelta(days=offset)
+        lam = daily_rate * weekly[day.weekday()] * shares
+        for name, (first, length, factor) in injected.items():
+            if first <= offset < first + length:
+                i = diseases.index(name)
+                lam[i] = max(lam[i] * factor, 3.0)
+                truth.append((name, day))
+        counts = rng.poisson(lam)
+        for name, n in zip(diseases, counts):
+            moment = datetime.combine(day, datetime.min.time())
+            events.extend([(name, moment + timedelta(seconds=int(s))) for s in np.sort(rng.integers(0, 86400, n))])
+    return events, truth
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a synthetic year of health records through the outbreak detector")
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--rate", type=float, default=40.0, help="Average cases per day across all diseases")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    events, truth = synthetic_year(args.days, args.rate, args.seed)
+    detector = OutbreakDetector(state_path=None)
+
+    started = time.perf_counter()
+    for name, when in events:
+        detector.observe(name, when)
+    elapsed = time.perf_counter() - started
+
+    outbreak_days = {(normalize_disease(n), d.isoformat()) for n, d in truth}
+    alerts = list(detector.alerts)
+    hits = [a for a in alerts if (normalize_disease(a['disease']), a['date']) in outbreak_days]
+    detected = {normalize_disease(a['disease']) for a in hits}
+    # Diseases that alarm on a single case (min_cases 1) report every sporadic case by design
+    notifiable = [a for a in alerts if a not in hits and detector.settings(normalize_disease(a['disease']))['min_cases'] <= 1]
+    false_alarms = len(alerts) - len(hits) - len(notifiable)
+
+    print(f"Replayed {len(events)} events in {elapsed:.2f}s ({len(events) / elapsed:,.0f} events/sec)")
+    print(f"State size: {len(json.dumps(detector.to_dict(), separators=(',', ':')))} bytes")
+    print(f"Alerts: {len(alerts)} total, {len(hits)} on injected outbreak days, "
+          f"{len(notifiable)} sporadic cases of single-case diseases, {false_alarms} false alarms "
+          f"({false_alarms / args.days * 365:.1f} per year)")
+    for name in sorted({n for n, _ in truth}):
+        status = "detected" if normalize_disease(name) in detected else "MISSED"
+        print(f"  {name}: {status}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+import os
+import time
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+
+class Throttle:
+    """Keeps a background job to a share of the model's time.
+
+    After each batch the job sleeps so that busy time stays at duty_cycle,
+    and it waits while interactive requests arrived within idle_seconds.
+    """
+
+    def __init__(self, duty_cycle: float = 0.5, idle_seconds: float = 2.0,
+                 last_activity: Optional[Callable[[], float]] = None):
+        self.duty_cycle = min(max(duty_cycle, 0.01), 1.0)
+        self.idle_seconds = idle_seconds
+        self.last_activity = last_activity
+
+    def wait_for_idle(self, stopping: threading.Event) -> None:
+        while self.last_activity and not stopping.is_set():
+            quiet_for = time.monotonic() - self.last_activity()
+            if quiet_for >= self.idle_seconds:
+                return
+            stopping.wait(self.idle_seconds - quiet_for)
+
+    def rest_after(self, busy_seconds: float, stopping: threading.Event) -> None:
+        stopping.wait(busy_seconds * (1 - self.duty_cycle) / self.duty_cycle)
+
+
+class RescoringJob:
+    """Re-scores every stored record image with the current model version.
+
+    Records are streamed in id order; each batch's tensors are prefetched
+    from the image store on a thread pool while the previous batch runs.
+    Batches go through the InferenceService queue at background priority,
+    so the service's workers stay the only callers of the model.
+    Results go to record_predictions next to the original diagnosis, so a
+    stopped or crashed job resumes where it left off: records already
+    scored by this version are skipped.
+    """
+
+    def __init__(self, db_manager, service, store, batch_size: int = 32, throttle: Optional[Throttle] = None,
+                 prefetch_workers: int = 2):
+        self.db = db_manager
+        self.service = service
+        self.store = store
+        self.batch_size = batch_size
+        self.throttle = throttle or Throttle()
+        self.prefetch_workers = prefetch_workers
+        self.model_version = service.model_version
+        self.scored = 0
+        self.missing = 0
+        self.error = None
+        self._stopping = threading.Event()
+        self._thread = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> None:
+        if not self.running:
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._run_safely, name="rescoring-job", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run_safely(self) -> None:
+        try:
+            self.run()
+        except Exception as e:
+            self.error = str(e)
+            print(f"Re-scoring job failed: {e}")
+
+    def run(self) -> Dict:
+        if not self.model_version:
+            raise RuntimeError("Model file not found; nothing to re-score with")
+        self.error = None
+        with ThreadPoolExecutor(self.prefetch_workers) as pool:
+            batch = self.db.get_records_to_rescore(self.model_version, 0, self.batch_size)
+            loading = pool.submit(self._load, batch)
+            while batch and not self._stopping.is_set():
+                present, tensors, missing = loading.result()
+                upcoming = self.db.get_records_to_rescore(self.model_version, batch[-1]['id'], self.batch_size)
+                loading = pool.submit(self._load, upcoming)
+
+                self.throttle.wait_for_idle(self._stopping)
+                started = time.perf_counter()
+                predictions = self._score(present, tensors) + missing
+                busy = time.perf_counter() - started
+                self.db.add_record_predictions(predictions)
+                self.scored += len(predictions) - len(missing)
+                self.missing += len(missing)
+                self.throttle.rest_after(busy, self._stopping)
+                batch = upcoming
+        return self.db.get_rescoring_progress(self.model_version)
+
+    def _load(self, records: List[Dict]):
+        """(records with tensors, stacked tensors, predictions for records whose image is gone)"""
+        present, missing = [], []
+        for record in records:
+            if record['image_filename'] in self.store:
+                present.append(record)
+            else:
+                missing.append({'record_id': record['id'], 'model_version': self.model_version,
+                                'disease_name': None, 'confidence_score': None})
+        tensors = self.store.load_batch(r['image_filename'] for r in present) if present else None
+        return present, tensors, missing
+
+    def _score(self, records: List[Dict], tensors: Optional[np.ndarray]) -> List[Dict]:
+        if not records:
+            return []
+        probs = self.service.predict_proba_batch(tensors, background=True)
+        predictions = []
+        for record, preds in zip(records, probs):
+            calibrated = self.service.calibrated(preds[np.newaxis])
+            best = int(np.argmax(calibrated))
+            predictions.append({'record_id': record['id'], 'model_version': self.model_version,
+                                'disease_name': self.service.class_names[best],
+                                'confidence_score': float(calibrated[best])})
+        return predictions
+
+    def progress(self) -> Dict:
+        progress = self.db.get_rescoring_progress(self.model_version)
+        progress.update(running=self.running, scored=self.scored, missing=self.missing, error=self.error)
+        return progress
+
+
+def drift_report(db_manager, model_version: str) -> Dict:
+    """How the new model's labels differ from the original diagnoses"""
+    df = db_manager.get_prediction_drift(model_version)
+    if df.empty:
+        return {'rescored': 0, 'changed': 0, 'change_rate': 0.0, 'mean_confidence_delta': None,
+                'transitions': [], 'by_old_version': {}}
+    df['old_version'] = df['old_version'].fillna("unversioned")
+    changed = df[df['old_disease'] != df['new_disease']]
+    transitions = (changed.groupby(['old_disease', 'new_disease']).size()
+                   .sort_values(ascending=False).reset_index(name='records'))
+    unchanged = df[df['old_disease'] == df['new_disease']]
+    return {
+        'rescored': len(df),
+        'changed': len(changed),
+        'change_rate': len(changed) / len(df),
+        'mean_confidence_delta': float((unchanged['new_confidence'] - unchanged['old_confidence']).mean())
+        if unchanged['old_confidence'].notna().any() else None,
+        'transitions': transitions.to_dict('records'),
+        'by_old_version': (df['old_disease'] != df['new_disease']).groupby(df['old_version']).mean().to_dict(),
+        'changed_records': changed,
+    }
+
+
+def get_rescoring_job(service, db_manager, store) -> RescoringJob:
+    """One job per model version, sharing the app's model and yielding to its interactive requests"""
+    import streamlit as st
+
+    @st.cache_resource
+    def _job(model_version):
+        throttle = Throttle(duty_cycle=float(os.getenv("PASHU_RESCORE_DUTY_CYCLE", "0.3")),
+                            last_activity=lambda: service.last_request_at)
+        return RescoringJob(db_manager, service, store, throttle=throttle)
+
+    return _job(service.model.model_version)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-score stored record images with the current model")
+    parser.add_argument("--report", action="store_true", help="Only print the drift report")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--processes", type=int, default=0, help="Score with N model worker processes")
+    parser.add_argument("--duty-cycle", type=float, default=0.5,
+                        help="Share of wall time spent scoring, leaving the rest of the machine to the app")
+    parser.add_argument("--csv", help="Write the changed records to this file")
+    args = parser.parse_args()
+
+    from database import DatabaseManager
+    from image_store import ImageStore, STORE_DIR
+    from inference_worker import InferenceService
+    from ml_model import MODEL_PATH, CowDiseaseModel, MultiProcessCowDiseaseModel, model_file_version
+
+    db_manager = DatabaseManager()
+    if args.report:
+        model_version = model_file_version(MODEL_PATH)
+    else:
+        if hasattr(os, "nice"):
+            os.nice(10)
+        model = MultiProcessCowDiseaseModel(args.processes) if args.processes else CowDiseaseModel()
+        if not model.model_loaded:
+            raise SystemExit("Model not available; train it with cow_disease_model/train_model.py first")
+        store = ImageStore(os.getenv("PASHU_IMAGE_STORE", STORE_DIR))
+        service = InferenceService(model, max_batch_size=args.batch_size, dispatchers=max(args.processes, 1))
+        job = RescoringJob(db_manager, service, store, args.batch_size, Throttle(args.duty_cycle))
+        started = time.perf_counter()
+        try:
+            progress = job.run()
+        except KeyboardInterrupt:
+            progress = db_manager.get_rescoring_progress(job.model_version)
+            print("Interrupted; run again to resume.")
+        elapsed = time.perf_counter() - started
+        print(f"Model {job.model_version}: scored {job.scored} records in {elapsed:.1f}s "
+              f"({job.missing} images no longer stored); {progress['done']}/{progress['total']} done")
+        model_version = job.model_version
+
+    report = drift_report(db_manager, model_version)
+    print(f"\nDrift vs original diagnoses: {report['changed']}/{report['rescored']} labels changed "
+          f"({report['change_rate']:.1%})")
+    for old_version, rate in report['by_old_version'].items():
+        print(f"  from model {old_version}: {rate:.1%} changed")
+    for t in report['transitions'][:15]:
+        print(f"  {t['old_disease']:<22} -> {t['new_disease']:<22} {t['records']:>5}")
+    if args.csv and report['rescored']:
+        report['changed_records'].to_csv(args.csv, index=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,22 @@
+import time
+import argparse
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain the daily and weekly health rollup tables")
+    parser.add_argument("--rebuild", action="store_true", help="Rebuild the rollups from cow_health_records")
+    args = parser.parse_args()
+
+    if not args.rebuild:
+        parser.print_help()
+        return
+
+    from database import DatabaseManager
+
+    started = time.perf_counter()
+    rows = DatabaseManager().rebuild_rollups()
+    print(f"✅ Rebuilt rollups: {rows} daily rows in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
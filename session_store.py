@@ -0,0 +1,261 @@
+import os
+import time
+import shutil
+import hashlib
+import pickle
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Optional
+
+import numpy as np
+from PIL import Image
+
+# Per-session memory budget; least recently used objects beyond it are spilled or dropped
+SESSION_BUDGET_BYTES = int(float(os.getenv("PASHU_SESSION_BUDGET_MB", "64")) * 1024 * 1024)
+# Arrays and images at least this large are spilled to disk instead of dropped
+SPILL_MIN_BYTES = 256 * 1024
+# Sessions idle this long are released even if the browser never logged out
+SESSION_TIMEOUT_SECONDS = float(os.getenv("PASHU_SESSION_TIMEOUT_SECONDS", str(30 * 60)))
+SWEEP_INTERVAL_SECONDS = 60.0
+SPILL_DIR = os.getenv("PASHU_SESSION_SPILL_DIR", os.path.join(tempfile.gettempdir(), "pashu-session-spill"))
+# Image modes that round-trip through a plain array
+_SPILLABLE_MODES = {"L", "RGB", "RGBA"}
+
+
+def sizeof(value: Any) -> int:
+    """Approximate bytes held by a value: exact for arrays, decoded size for images"""
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, Image.Image):
+        return value.width * value.height * len(value.getbands())
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return len(value)
+    try:
+        return len(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+    except Exception:
+        return 1024
+
+
+class _Entry:
+    __slots__ = ("value", "nbytes", "path", "mode")
+
+    def __init__(self, value: Any, nbytes: int):
+        self.value = value
+        self.nbytes = nbytes
+        self.path = None
+        self.mode = None
+
+
+class SessionObjects:
+    """One browser session's large objects: uploaded images, tensors and results.
+
+    Entries are kept in least-recently-used order. When the bytes held in
+    memory exceed the budget, the oldest arrays and images are written to
+    .npy files and re-loaded on their next get(); other objects are simply
+    dropped, so callers treat a miss as "recompute".
+    """
+
+    def __init__(self, session_id: str, budget_bytes: int = SESSION_BUDGET_BYTES, spill_dir: str = SPILL_DIR):
+        self.session_id = session_id
+        self.budget_bytes = budget_bytes
+        self.spill_dir = os.path.join(spill_dir, session_id)
+        self.last_access = time.monotonic()
+        self.spills = 0
+        self.drops = 0
+        self._entries = OrderedDict()
+        self._lock = threading.RLock()
+
+    def put(self, key: str, value: Any) -> Any:
+        with self._lock:
+            self._discard(key)
+            self._entries[key] = _Entry(value, sizeof(value))
+            self.last_access = time.monotonic()
+            self._enforce_budget()
+        return value
+
+    def get(self, key: str, default: Any = None) -> Any:
+        with self._lock:
+            self.last_access = time.monotonic()
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+            self._entries.move_to_end(key)
+            if entry.path is not None:
+                self._load(entry)
+                self._enforce_budget()
+            return entry.value
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._entries
+
+    def discard(self, key: str) -> None:
+        with self._lock:
+            self._discard(key)
+
+    def retain(self, prefix: str, keep: Iterable[str]) -> int:
+        """Drop entries under prefix whose next key segment is not in keep, e.g. files no longer uploaded"""
+        keep = set(keep)
+        with self._lock:
+            stale = [k for k in self._entries if k.startswith(prefix) and k[len(prefix):].split(":", 1)[0] not in keep]
+            for key in stale:
+                self._discard(key)
+        return len(stale)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            shutil.rmtree(self.spill_dir, ignore_errors=True)
+
+    def usage(self) -> Dict:
+        with self._lock:
+            memory = sum(e.nbytes for e in self._entries.values() if e.path is None)
+            disk = sum(e.nbytes for e in self._entries.values() if e.path is not None)
+            return {
+                'session_id': self.session_id,
+                'objects': len(self._entries),
+                'memory_mb': memory / 1024 / 1024,
+                'spilled_mb': disk / 1024 / 1024,
+                'budget_mb': self.budget_bytes / 1024 / 1024,
+                'spills': self.spills,
+                'drops': self.drops,
+                'idle_seconds': time.monotonic() - self.last_access,
+            }
+
+    # ---------- Budget ----------
+    def _discard(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None and entry.path is not None:
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
+
+    def _enforce_budget(self) -> None:
+        in_memory = sum(e.nbytes for e in self._entries.values() if e.path is None)
+        # Spill large arrays and images first, oldest first; drop other objects only if that is not enough.
+        # The newest entry always stays, even when it alone exceeds the budget
+        for spilling in (True, False):
+            for key in list(self._entries)[:-1]:
+                if in_memory <= self.budget_bytes:
+                    return
+                entry = self._entries[key]
+                if entry.path is not None:
+                    continue
+                if spilling:
+                    if not self._spill(key, entry):
+                        continue
+                else:
+                    del self._entries[key]
+                    self.drops += 1
+                in_memory -= entry.nbytes
+
+    def _spill(self, key: str, entry: _Entry) -> bool:
+        value = entry.value
+        if entry.nbytes < SPILL_MIN_BYTES:
+            return False
+        if isinstance(value, Image.Image) and value.mode in _SPILLABLE_MODES:
+            entry.mode, array = value.mode, np.asarray(value)
+        elif isinstance(value, np.ndarray) and value.dtype != object:
+            array = value
+        else:
+            return False
+        os.makedirs(self.spill_dir, exist_ok=True)
+        path = os.path.join(self.spill_dir, hashlib.sha1(key.encode()).hexdigest() + ".npy")
+        np.save(path, array)
+        entry.path, entry.value = path, None
+        self.spills += 1
+        return True
+
+    def _load(self, entry: _Entry) -> None:
+        array = np.load(entry.path)
+        entry.value = Image.fromarray(array) if entry.mode else array
+        os.remove(entry.path)
+        entry.path = entry.mode = None
+
+
+class SessionStore:
+    """Process-wide registry of SessionObjects, released on logout or after the session goes idle"""
+
+    def __init__(self, budget_bytes: int = SESSION_BUDGET_BYTES, timeout_seconds: float = SESSION_TIMEOUT_SECONDS,
+                 spill_dir: str = SPILL_DIR):
+        self.budget_bytes = budget_bytes
+        self.timeout_seconds = timeout_seconds
+        self.spill_dir = spill_dir
+        self._sessions = {}
+        self._lock = threading.Lock()
+        self._last_sweep = time.monotonic()
+
+    def objects(self, session_id: str) -> SessionObjects:
+        if time.monotonic() - self._last_sweep > SWEEP_INTERVAL_SECONDS:
+            self.sweep()
+        with self._lock:
+            objects = self._sessions.get(session_id)
+            if objects is None:
+                objects = self._sessions[session_id] = SessionObjects(session_id, self.budget_bytes, self.spill_dir)
+            return objects
+
+    def release(self, session_id: str) -> None:
+        with self._lock:
+            objects = self._sessions.pop(session_id, None)
+        if objects is not None:
+            objects.clear()
+
+    def sweep(self, is_active=None) -> int:
+        """Release sessions idle past the timeout or, given is_active(session_id), no longer connected"""
+        self._last_sweep = time.monotonic()
+        if is_active is None:
+            is_active = _runtime_session_check()
+        with self._lock:
+            expired = [sid for sid, objects in self._sessions.items()
+                       if self._last_sweep - objects.last_access > self.timeout_seconds
+                       or (is_active is not None and not is_active(sid))]
+        for session_id in expired:
+            self.release(session_id)
+        return len(expired)
+
+    def usage(self) -> Dict:
+        with self._lock:
+            sessions = [objects.usage() for objects in self._sessions.values()]
+        return {
+            'sessions': sorted(sessions, key=lambda s: s['memory_mb'], reverse=True),
+            'total_memory_mb': sum(s['memory_mb'] for s in sessions),
+            'total_spilled_mb': sum(s['spilled_mb'] for s in sessions),
+            'total_objects': sum(s['objects'] for s in sessions),
+        }
+
+
+def _runtime_session_check():
+    """Runtime.is_active_session when running under streamlit, so closed tabs are released early"""
+    try:
+        from streamlit.runtime import Runtime
+        return Runtime.instance().is_active_session if Runtime.exists() else None
+    except Exception:
+        return None
+
+
+def get_session_store() -> SessionStore:
+    """Process-wide store shared by all sessions"""
+    import streamlit as st
+
+    @st.cache_resource
+    def _store():
+        return SessionStore()
+
+    return _store()
+
+
+def _current_session_id() -> Optional[str]:
+    from streamlit.runtime.scriptrunner import get_script_run_ctx
+    ctx = get_script_run_ctx()
+    return ctx.session_id if ctx else None
+
+
+def session_objects() -> SessionObjects:
+    """Objects of the session whose script is running on this thread"""
+    return get_session_store().objects(_current_session_id() or "default")
+
+
+def release_session_objects() -> None:
+    """Free everything the current session holds, e.g. on logout"""
+    get_session_store().release(_current_session_id() or "default")
@@ -0,0 +1,289 @@
+import os
+import json
+import time
+import argparse
+import threading
+from array import array
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+INDEX_DIR = "similar_cases"
+EMBEDDING_DIM = 128
+# Below this many vectors an exact scan is already fast; IVF is trained once the index passes it
+IVF_MIN_SIZE = 50_000
+SCAN_CHUNK = 65_536
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    k = min(k, len(scores))
+    if k == 0:
+        return np.empty(0, dtype=np.int64)
+    top = np.argpartition(scores, -k)[-k:]
+    return top[np.argsort(scores[top])[::-1]]
+
+
+class EmbeddingIndex:
+    """Cosine nearest-neighbour index over float16 embeddings.
+
+    Vectors live in one growable float16 array (256 bytes per 128-d
+    embedding). Search is an exact chunked scan, or an IVF probe once the
+    index has been trained: k-means centroids partition the vectors into
+    inverted lists and a query only scans the nprobe closest lists. New
+    vectors are appended to their nearest list, so adds are O(nlist).
+    On disk the index is an append-only raw vector file plus a JSONL file of
+    entries, so each add writes only the new rows.
+    """
+
+    def __init__(self, path: Optional[str] = INDEX_DIR, dim: int = EMBEDDING_DIM):
+        self.path = path
+        self.dim = dim
+        self.vectors = np.empty((1024, dim), dtype=np.float16)
+        self.count = 0
+        self.keys = []
+        self.labels = array('h')
+        self.label_names = []
+        self._label_ids = {}
+        self._key_set = set()
+        self.centroids = None
+        self.trained_size = 0
+        self._lists = []
+        self._lock = threading.RLock()
+        if path:
+            self.load()
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._key_set
+
+    # ---------- Updates ----------
+    def add(self, vectors: np.ndarray, labels: Sequence[str], keys: Sequence[str], persist: bool = True) -> int:
+        """Append embeddings with their disease label and a unique key; returns how many were new"""
+        vectors = normalize(vectors)
+        with self._lock:
+            fresh = [i for i, key in enumerate(keys) if key not in self._key_set]
+            if not fresh:
+                return 0
+            vectors = vectors[fresh].astype(np.float16)
+            keys = [keys[i] for i in fresh]
+            labels = [labels[i] for i in fresh]
+            self._append(vectors, labels, keys)
+            if persist and self.path:
+                self._persist(vectors, labels, keys)
+            if self.count >= IVF_MIN_SIZE and (self.centroids is None or self.count > 4 * self.trained_size):
+                self.train()
+            return len(fresh)
+
+    def _append(self, vectors: np.ndarray, labels: Sequence[str], keys: Sequence[str]) -> None:
+        start, end = self.count, self.count + len(vectors)
+        if end > len(self.vectors):
+            grown = np.empty((max(end, 2 * len(self.vectors)), self.dim), dtype=np.float16)
+            grown[:start] = self.vectors[:start]
+            self.vectors = grown
+        self.vectors[start:end] = vectors
+        self.count = end
+        self.keys.extend(keys)
+        self._key_set.update(keys)
+        for label in labels:
+            if label not in self._label_ids:
+                self._label_ids[label] = len(self.label_names)
+                self.label_names.append(label)
+            self.labels.append(self._label_ids[label])
+        if self.centroids is not None:
+            for offset, list_id in enumerate(self._assign(vectors)):
+                self._lists[list_id].append(start + offset)
+
+    # ---------- IVF ----------
+    def train(self, nlist: Optional[int] = None, iterations: int = 10, sample: int = 100_000) -> None:
+        """Spherical k-means over a sample of the vectors, then rebuild the inverted lists"""
+        with self._lock:
+            nlist = nlist or max(1, int(np.sqrt(self.count)))
+            rng = np.random.default_rng(0)
+            chosen = rng.choice(self.count, size=min(sample, self.count), replace=False)
+            data = self.vectors[chosen].astype(np.float32)
+            centroids = data[rng.choice(len(data), size=min(nlist, len(data)), replace=False)]
+            for _ in range(iterations):
+                assignment = np.argmax(data @ centroids.T, axis=1)
+                sums = np.zeros_like(centroids)
+                np.add.at(sums, assignment, data)
+                empty = np.bincount(assignment, minlength=len(centroids)) == 0
+                sums[empty] = centroids[empty]
+                centroids = normalize(sums)
+            self.centroids = centroids
+            self.trained_size = self.count
+            self._rebuild_lists()
+            if self.path:
+                np.save(os.path.join(self.path, "centroids.npy"), centroids)
+
+    def _assign(self, vectors: np.ndarray) -> np.ndarray:
+        assignment = np.empty(len(vectors), dtype=np.int64)
+        for start in range(0, len(vectors), SCAN_CHUNK):
+            chunk = vectors[start:start + SCAN_CHUNK].astype(np.float32)
+            assignment[start:start + SCAN_CHUNK] = np.argmax(chunk @ self.centroids.T, axis=1)
+        return assignment
+
+    def _rebuild_lists(self) -> None:
+        assignment = self._assign(self.vectors[:self.count])
+        order = np.argsort(assignment, kind="stable")
+        bounds = np.searchsorted(assignment[order], np.arange(len(self.centroids) + 1))
+        self._lists = [array('q', order[bounds[i]:bounds[i + 1]].tolist()) for i in range(len(self.centroids))]
+
+    # ---------- Search ----------
+    def search(self, query: np.ndarray, k: int = 10, exact: bool = False, nprobe: int = 8) -> List[Dict]:
+        """k most similar entries to one embedding, most similar first"""
+        query = normalize(query)[0]
+        with self._lock:
+            if self.centroids is None or exact:
+                ids, scores = self._scan(query, k)
+            else:
+                probes = _top_k(self.centroids @ query, nprobe)
+                candidates = np.concatenate([np.frombuffer(self._lists[p], dtype=np.int64) for p in probes])
+                scores = self.vectors[candidates].astype(np.float32) @ query
+                top = _top_k(scores, k)
+                ids, scores = candidates[top], scores[top]
+            return [{'key': self.keys[i], 'label': self.label_names[self.labels[i]], 'similarity': float(s)}
+                    for i, s in zip(ids, scores)]
+
+    def _scan(self, query: np.ndarray, k: int):
+        best_ids, best_scores = np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        for start in range(0, self.count, SCAN_CHUNK):
+            scores = self.vectors[start:min(start + SCAN_CHUNK, self.count)].astype(np.float32) @ query
+            top = _top_k(scores, k)
+            best_ids = np.concatenate([best_ids, top + start])
+            best_scores = np.concatenate([best_scores, scores[top]])
+            keep = _top_k(best_scores, k)
+            best_ids, best_scores = best_ids[keep], best_scores[keep]
+        return best_ids, best_scores
+
+    # ---------- Persistence ----------
+    def _persist(self, vectors: np.ndarray, labels: Sequence[str], keys: Sequence[str]) -> None:
+        os.makedirs(self.path, exist_ok=True)
+        with open(os.path.join(self.path, "entries.jsonl"), "a", encoding="utf-8") as f:
+            f.writelines(json.dumps({'key': key, 'label': label}) + "\n" for key, label in zip(keys, labels))
+        with open(os.path.join(self.path, "vectors.f16"), "ab") as f:
+            f.write(np.ascontiguousarray(vectors, dtype=np.float16).tobytes())
+
+    def load(self) -> None:
+        vectors_path = os.path.join(self.path, "vectors.f16")
+        entries_path = os.path.join(self.path, "entries.jsonl")
+        if not os.path.exists(vectors_path) or not os.path.exists(entries_path):
+            return
+        vectors = np.fromfile(vectors_path, dtype=np.float16)
+        vectors = vectors[:len(vectors) // self.dim * self.dim].reshape(-1, self.dim)
+        with open(entries_path, encoding="utf-8") as f:
+            entries = [json.loads(line) for line in f if line.strip()]
+        # A crash between the two appends leaves one file longer; drop the unmatched tail
+        n = min(len(vectors), len(entries))
+        with self._lock:
+            self._append(vectors[:n], [e['label'] for e in entries[:n]], [e['key'] for e in entries[:n]])
+            centroids_path = os.path.join(self.path, "centroids.npy")
+            if os.path.exists(centroids_path):
+                self.centroids = np.load(centroids_path)
+                self.trained_size = self.count
+                self._rebuild_lists()
+
+    def stats(self) -> Dict:
+        return {
+            'entries': self.count,
+            'memory_mb': self.count * self.dim * 2 / 1024 / 1024,
+            'ivf_lists': len(self.centroids) if self.centroids is not None else 0,
+            'labels': {name: int(n) for name, n in zip(
+                self.label_names, np.bincount(np.frombuffer(self.labels, dtype=np.int16),
+                                              minlength=len(self.label_names)))} if self.count else {},
+        }
+
+
+def get_similarity_index() -> EmbeddingIndex:
+    """Process-wide index shared by all sessions"""
+    import streamlit as st
+
+    @st.cache_resource
+    def _index():
+        return EmbeddingIndex()
+
+    return _index()
+
+
+# ---------- CLI ----------
+def build_dataset_index(index: EmbeddingIndex, dataset_path: str, batch_size: int = 32) -> int:
+    """Embed every training image not yet in the index"""
+    from PIL import Image
+    from ml_model import CowDiseaseModel
+    from cow_disease_model.splits import dataset_files
+
+    model = CowDiseaseModel()
+    if model.embedding_model is None:
+        raise SystemExit("Model not available; train it with cow_disease_model/train_model.py first")
+    pending = [(path, class_name) for path, class_name, _, _ in dataset_files(dataset_path)
+               if f"dataset:{class_name}/{os.path.basename(path)}" not in index]
+    added = 0
+    for start in range(0, len(pending), batch_size):
+        chunk = pending[start:start + batch_size]
+        batch = np.concatenate([model.preprocess_image(Image.open(path).convert("RGB")) for path, _ in chunk])
+        keys = [f"dataset:{label}/{os.path.basename(path)}" for path, label in chunk]
+        added += index.add(model.embed_batch(batch), [label for _, label in chunk], keys)
+    return added
+
+
+def benchmark(size: int, queries: int = 100, k: int = 10) -> None:
+    """Exact vs IVF latency and recall on synthetic clustered embeddings"""
+    rng = np.random.default_rng(0)
+    centers = rng.standard_normal((200, EMBEDDING_DIM)).astype(np.float32)
+    index = EmbeddingIndex(path=None)
+    started = time.perf_counter()
+    for start in range(0, size, 100_000):
+        n = min(100_000, size - start)
+        vectors = centers[rng.integers(0, len(centers), n)] + 0.6 * rng.standard_normal((n, EMBEDDING_DIM))
+        index.add(vectors, ["synthetic"] * n, [f"s{start + i}" for i in range(n)], persist=False)
+    print(f"Indexed {size:,} embeddings in {time.perf_counter() - started:.1f}s "
+          f"({index.stats()['memory_mb']:.0f} MB float16, {index.stats()['ivf_lists']} IVF lists)")
+
+    probes = centers[rng.integers(0, len(centers), queries)] + 0.6 * rng.standard_normal((queries, EMBEDDING_DIM))
+    exact_ms, exact_results = [], []
+    for q in probes:
+        started = time.perf_counter()
+        exact_results.append({r['key'] for r in index.search(q, k, exact=True)})
+        exact_ms.append((time.perf_counter() - started) * 1000)
+    print(f"exact        p50 {np.percentile(exact_ms, 50):7.2f} ms  p95 {np.percentile(exact_ms, 95):7.2f} ms")
+    if index.centroids is None:
+        return
+    for nprobe in (4, 8, 16, 32):
+        ivf_ms, recall = [], []
+        for q, truth in zip(probes, exact_results):
+            started = time.perf_counter()
+            found = {r['key'] for r in index.search(q, k, nprobe=nprobe)}
+            ivf_ms.append((time.perf_counter() - started) * 1000)
+            recall.append(len(found & truth) / k)
+        print(f"IVF nprobe={nprobe:<3} p50 {np.percentile(ivf_ms, 50):7.2f} ms  p95 {np.percentile(ivf_ms, 95):7.2f} ms"
+              f"  recall@{k} {np.mean(recall):.1%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Similar-case embedding index")
+    parser.add_argument("--build", action="store_true", help="Embed the training dataset into the index")
+    parser.add_argument("--dataset", default=os.path.join("cow_disease_model", "dataset"))
+    parser.add_argument("--train", action="store_true", help="(Re)train the IVF partitioning")
+    parser.add_argument("--benchmark", type=int, metavar="N", help="Benchmark search over N synthetic embeddings")
+    args = parser.parse_args()
+
+    if args.benchmark:
+        benchmark(args.benchmark)
+        return
+    index = EmbeddingIndex()
+    if args.build:
+        print(f"Added {build_dataset_index(index, args.dataset)} dataset images")
+    if args.train and len(index):
+        index.train()
+    print(json.dumps(index.stats(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+import os
+import re
+import sys
+import json
+import time
+import argparse
+import subprocess
+from typing import Dict, List, Optional
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+APP_FILE = os.path.join(APP_DIR, "app.py")
+
+# Heavy third-party dependencies worth tracking on their own
+HEAVY_IMPORTS = ["streamlit", "pandas", "numpy", "PIL", "cv2", "fpdf", "sqlalchemy", "tensorflow"]
+
+_IMPORTTIME = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def profile_import(module: str) -> Dict:
+    """Cold import of one module in a fresh interpreter, via -X importtime"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=APP_DIR, capture_output=True, text=True
+    )
+    entries = []
+    for line in result.stderr.splitlines():
+        match = _IMPORTTIME.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            entries.append({'module': name, 'self_ms': int(self_us) / 1000,
+                            'cumulative_ms': int(cumulative_us) / 1000, 'depth': len(indent) // 2})
+    end = next((i for i in range(len(entries) - 1, -1, -1) if entries[i]['module'] == module), None)
+    # Direct children are the depth-1 lines immediately preceding the module's own line
+    children = []
+    if end is not None:
+        i = end - 1
+        while i >= 0 and entries[i]['depth'] >= 1:
+            if entries[i]['depth'] == 1:
+                children.append(entries[i])
+            i -= 1
+    total = entries[end]['cumulative_ms'] if end is not None else None
+    heaviest = sorted(children, key=lambda e: e['cumulative_ms'], reverse=True)[:5]
+    return {
+        'module': module,
+        'ok': result.returncode == 0,
+        'error': result.stderr.strip().splitlines()[-1] if result.returncode else None,
+        'cumulative_ms': total,
+        'heaviest': [(e['module'], e['cumulative_ms']) for e in heaviest],
+    }
+
+
+def _render_page(page: Optional[str]) -> Dict:
+    """Run app.py once with AppTest in this process and time the first render"""
+    started = time.perf_counter()
+    from streamlit.testing.v1 import AppTest
+    harness_ms = (time.perf_counter() - started) * 1000
+
+    app = AppTest.from_file(APP_FILE, default_timeout=300)
+    if page:
+        app.session_state["logged_in"] = True
+        app.session_state["username"] = "profiler"
+        app.session_state["page"] = page
+
+    before = set(sys.modules)
+    started = time.perf_counter()
+    app.run()
+    render_ms = (time.perf_counter() - started) * 1000
+
+    loaded = sorted({m.split(".")[0] for m in set(sys.modules) - before})
+    return {
+        'page': page or "Login",
+        'render_ms': render_ms,
+        'harness_ms': harness_ms,
+        'errors': [e.message for e in app.exception],
+        'heavy_modules_loaded': [m for m in HEAVY_IMPORTS if m in loaded],
+    }
+
+
+def profile_first_render(page: Optional[str]) -> Dict:
+    """First render of a page in a fresh interpreter, so nothing is pre-imported"""
+    result = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--render-one", page or ""],
+        cwd=APP_DIR, capture_output=True, text=True
+    )
+    for line in reversed(result.stdout.splitlines()):
+        if line.startswith("{"):
+            return json.loads(line)
+    return {'page': page or "Login", 'render_ms': None, 'errors': [result.stderr.strip()[-500:]],
+            'heavy_modules_loaded': []}
+
+
+def page_keys() -> List[str]:
+    """Page keys registered in app.PAGES, read without importing app.py"""
+    with open(APP_FILE, encoding="utf-8") as f:
+        source = f.read()
+    block = source[source.index("PAGES = {"):]
+    block = block[:block.index("\n}\n")]
+    return re.findall(r'^\s+"([^"]+)": \(', block, re.MULTILINE)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Profile cold start: import times and first render per page")
+    parser.add_argument("--pages", nargs="*", help="Pages to render (default: login + all pages)")
+    parser.add_argument("--budget-ms", type=float, help="Fail if any first render exceeds this many ms")
+    parser.add_argument("--allow-errors", action="store_true", help="Do not fail on page exceptions")
+    parser.add_argument("--json", help="Write the full report to this file")
+    parser.add_argument("--render-one", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.render_one is not None:
+        print(json.dumps(_render_page(args.render_one or None)))
+        return
+
+    report = {'imports': [], 'renders': []}
+
+    print("Import time (cold, cumulative)")
+    for module in ["app"] + HEAVY_IMPORTS:
+        entry = profile_import(module)
+        report['imports'].append(entry)
+        if entry['ok']:
+            heaviest = ", ".join(f"{name} {ms:.0f}ms" for name, ms in entry['heaviest'][:3])
+            print(f"  {module:<12} {entry['cumulative_ms']:>8.1f} ms   {heaviest}")
+        else:
+            print(f"  {module:<12} {'n/a':>8}      {entry['error']}")
+
+    pages = args.pages if args.pages is not None else [""] + page_keys()
+    print("\nFirst render (fresh process)")
+    failed = False
+    for page in pages:
+        entry = profile_first_render(page or None)
+        report['renders'].append(entry)
+        render_ms = entry['render_ms']
+        over = args.budget_ms is not None and (render_ms is None or render_ms > args.budget_ms)
+        errored = bool(entry['errors']) and not args.allow_errors
+        failed = failed or over or errored
+        flag = " OVER BUDGET" if over else ""
+        timing = f"{render_ms:>8.1f} ms" if render_ms is not None else f"{'n/a':>8}   "
+        print(f"  {entry['page']:<22} {timing}  heavy: {', '.join(entry['heavy_modules_loaded']) or '-'}{flag}")
+        for error in entry['errors']:
+            print(f"      ❌ {error.splitlines()[-1] if error else error}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
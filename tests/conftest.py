@@ -0,0 +1,9 @@
+import pytest
+
+
+@pytest.fixture
+def db_manager(tmp_path, monkeypatch):
+    """DatabaseManager on a fresh SQLite file"""
+    monkeypatch.setenv("DATABASE_URL", f"sqlite:///{tmp_path / 'pashu_raksha.db'}")
+    from database import DatabaseManager
+    return DatabaseManager()
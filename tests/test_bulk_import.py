@@ -0,0 +1,64 @@
+import types
+
+import pandas as pd
+
+from bulk_import import import_records, normalize_records
+
+CSV = """Tag,Date,Disease,Severity,Cost,Vet
+C1,2024-01-05,Mastitis,High,250,Dr. Rao
+C2,2024-01-06,Footrot,mild,,
+C3,not a date,Pinkeye,moderate,,
+,2024-01-07,Anthrax,severe,,
+C4,2024-01-08,Brucellosis,unknown,,
+C5,2024-01-09,Ringworm,Medium,-5,
+"""
+
+
+def write_source(tmp_path):
+    path = tmp_path / "records.csv"
+    path.write_text(CSV)
+    return str(path)
+
+
+def test_normalize_maps_aliases_and_flags_errors():
+    raw = pd.read_csv(pd.io.common.StringIO(CSV), dtype=str, keep_default_na=False)
+    clean, rejects = normalize_records(raw)
+    assert clean['cow_id'].tolist() == ["C1", "C2"]
+    assert clean['severity'].tolist() == ["severe", "mild"]
+    assert clean['total_cost'].iloc[0] == 250.0
+    assert clean['veterinarian'].iloc[0] == "Dr. Rao"
+    errors = dict(zip(rejects['Tag'], rejects['error']))
+    assert errors["C3"] == "invalid diagnosis_date"
+    assert errors[""] == "missing cow_id"
+    assert errors["C4"].startswith("severity must be one of")
+    assert errors["C5"] == "total_cost is negative"
+
+
+def test_import_inserts_clean_rows_and_writes_rejects(tmp_path, db_manager):
+    stats = import_records(write_source(tmp_path), db_manager, chunksize=2)
+    assert (stats['read'], stats['inserted'], stats['rejected']) == (6, 2, 4)
+    assert stats['copy_fallbacks'] == 0
+
+    rejects = pd.read_csv(stats['reject_file'])
+    assert rejects['source_row'].tolist() == [3, 4, 5, 6]
+    assert db_manager.get_disease_statistics()['disease_counts'] == {'Mastitis': 1, 'Footrot': 1}
+    # Footrot came without costs and was estimated from its protocol
+    costs = {r['cow_id']: r['total_cost'] for r in db_manager.get_health_records()}
+    assert costs["C1"] == 250.0
+    assert costs["C2"] > 0
+
+
+def test_failed_copy_falls_back_to_batched_insert(tmp_path, db_manager):
+    def copy_health_records(records):
+        raise RuntimeError("COPY not permitted")
+
+    postgres = types.SimpleNamespace(
+        engine=types.SimpleNamespace(dialect=types.SimpleNamespace(name='postgresql')),
+        copy_health_records=copy_health_records,
+        add_health_records_bulk=db_manager.add_health_records_bulk,
+    )
+    stats = import_records(write_source(tmp_path), postgres, chunksize=1)
+    assert stats['inserted'] == 2
+    assert stats['copy_fallbacks'] == 2
+    assert stats['copy_error'] == "COPY not permitted"
+    assert db_manager.get_disease_statistics()['total_records'] == 2
@@ -0,0 +1,118 @@
+from datetime import datetime, timedelta
+
+import pandas as pd
+from sqlalchemy import select
+
+from database import ROLLUP_COUNTERS, DailyHealthRollup, RecordPrediction, WeeklyHealthRollup
+
+
+def record(cow_id, disease, day, severity="mild", **fields):
+    return {'cow_id': cow_id, 'disease_name': disease, 'severity': severity,
+            'diagnosis_date': datetime(2024, 3, day), **fields}
+
+
+def rollup_table(db_manager, model):
+    with db_manager.engine.connect() as conn:
+        rows = conn.execute(select(model.__table__)).mappings().all()
+    columns = ['period_start', 'disease_name', *ROLLUP_COUNTERS]
+    return pd.DataFrame(rows)[columns].sort_values(['period_start', 'disease_name']).reset_index(drop=True)
+
+
+def test_bulk_insert_maintains_rollups(db_manager):
+    records = [record(f"C{i}", ["Mastitis", "Footrot"][i % 2], 1 + i % 10, ["mild", "severe"][i % 3 == 0],
+                      total_cost=100.0) for i in range(50)]
+    inserted, failures = db_manager.add_health_records_bulk(records, batch_size=16)
+    assert (inserted, failures) == (50, [])
+
+    stats = db_manager.get_disease_statistics()
+    assert stats['total_records'] == 50
+    assert stats['disease_counts'] == {'Mastitis': 25, 'Footrot': 25}
+    assert stats['average_cost'] == 100.0
+
+    # Incremental rollups match a rebuild from the records
+    daily, weekly = rollup_table(db_manager, DailyHealthRollup), rollup_table(db_manager, WeeklyHealthRollup)
+    db_manager.rebuild_rollups()
+    pd.testing.assert_frame_equal(daily, rollup_table(db_manager, DailyHealthRollup))
+    pd.testing.assert_frame_equal(weekly, rollup_table(db_manager, WeeklyHealthRollup))
+
+
+def test_bulk_insert_isolates_bad_rows(db_manager):
+    records = [record(f"C{i}", "Pinkeye", 5) for i in range(5)]
+    records[3]['cow_id'] = None
+    inserted, failures = db_manager.add_health_records_bulk(records)
+    assert inserted == 4
+    assert [index for index, _ in failures] == [3]
+    assert db_manager.get_disease_statistics()['disease_counts'] == {'Pinkeye': 4}
+
+
+def test_record_without_costs_is_costed(db_manager):
+    assert db_manager.add_health_record(record("C1", "Mastitis", 2, "moderate", weight_kg=450.0))
+    assert db_manager.add_health_record(record("C2", "Mastitis", 2, total_cost=10.0))
+    records = {r['cow_id']: r for r in db_manager.get_health_records()}
+    assert records['C1']['total_cost'] > 0
+    assert records['C1']['cost_estimated'] is True
+    assert records['C2']['total_cost'] == 10.0
+    assert records['C2']['cost_estimated'] is False
+
+
+def test_full_text_search_ranks_and_quotes(db_manager):
+    db_manager.add_health_records_bulk([
+        record("C1", "Mastitis", 1, symptoms="swollen udder, clots in milk"),
+        record("C2", "Footrot", 2, symptoms="lameness, swollen hoof"),
+        record("C3", "Pinkeye", 3, notes="tearing, cloudy cornea"),
+    ])
+    assert db_manager.fts_backend == 'fts5'
+
+    results = db_manager.search_records("swollen udder")
+    assert [r['cow_id'] for r in results] == ["C1"]
+    assert "**" in results[0]['snippet']
+    assert {r['cow_id'] for r in db_manager.search_records("swoll")} == {"C1", "C2"}
+    assert [r['cow_id'] for r in db_manager.search_records("corn")] == ["C3"]
+    # FTS5 operators in user input are matched as text, not parsed
+    assert db_manager.search_records('udder" OR "hoof') == []
+    assert db_manager.search_records("***") == []
+
+
+def test_search_sees_records_updated_by_sync(db_manager):
+    synced = record("C9", "Ringworm", 4, client_id="a" * 36, client_updated_at=datetime(2024, 3, 4, 8),
+                    notes="circular lesions")
+    db_manager.upsert_synced_records([synced])
+    db_manager.upsert_synced_records([{**synced, 'notes': "crusty patches",
+                                       'client_updated_at': synced['client_updated_at'] + timedelta(hours=1)}])
+    assert db_manager.search_records("circular") == []
+    assert [r['cow_id'] for r in db_manager.search_records("crusty")] == ["C9"]
+
+
+def test_sync_upsert_is_idempotent_and_last_writer_wins(db_manager):
+    updates = []
+    db_manager.add_update_listener(updates.append)
+    edited_at = datetime(2024, 3, 6, 9)
+    synced = record("C1", "Mastitis", 6, client_id="b" * 36, client_updated_at=edited_at)
+
+    assert db_manager.upsert_synced_records([synced, dict(synced)])['inserted'] == 1
+    assert db_manager.upsert_synced_records([synced])['unchanged'] == 1
+
+    newer = {**synced, 'disease_name': "Footrot", 'client_updated_at': edited_at + timedelta(hours=2)}
+    result = db_manager.upsert_synced_records([newer])
+    assert result['updated'] == 1
+    assert db_manager.get_disease_statistics()['disease_counts'] == {'Footrot': 1}
+    assert [r['disease_name'] for r in updates[0]] == ["Mastitis", "Footrot"]
+
+    older = {**synced, 'disease_name': "Anthrax", 'client_updated_at': edited_at + timedelta(hours=1)}
+    result = db_manager.upsert_synced_records([older])
+    assert result['updated'] == 0
+    assert [c['disease_name'] for c in result['conflicts']] == ["Footrot"]
+    assert db_manager.get_disease_statistics()['disease_counts'] == {'Footrot': 1}
+
+
+def test_record_predictions_ignore_already_scored_records(db_manager):
+    first = [{'record_id': i, 'model_version': "v2", 'disease_name': "Mastitis", 'confidence_score': 0.9}
+             for i in (1, 2)]
+    db_manager.add_record_predictions(first)
+    # An overlapping batch from a second job keeps the first prediction and adds the new one
+    db_manager.add_record_predictions([{**first[1], 'disease_name': "Healthy"},
+                                       {**first[0], 'record_id': 3}])
+    with db_manager.engine.connect() as conn:
+        rows = conn.execute(select(RecordPrediction.record_id, RecordPrediction.disease_name)
+                            .order_by(RecordPrediction.record_id)).all()
+    assert [tuple(r) for r in rows] == [(1, "Mastitis"), (2, "Mastitis"), (3, "Mastitis")]
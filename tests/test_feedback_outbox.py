@@ -0,0 +1,125 @@
+import time
+import socket
+
+import pytest
+
+from feedback_outbox import (LocalSMTPServer, OutboxWorker, SMTPConnectionPool, build_feedback_message,
+                             create_worker, enqueue_message, init_outbox, outbox_status)
+
+
+@pytest.fixture
+def smtp():
+    server = LocalSMTPServer().start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = str(tmp_path / "outbox.db")
+    init_outbox(path)
+    return path
+
+
+def make_worker(smtp, db_path, **kwargs):
+    pool = SMTPConnectionPool("127.0.0.1", smtp.port, "app@localhost", "secret", use_ssl=False)
+    return OutboxWorker(pool, "app@localhost", "admin@localhost", db_path=db_path, **kwargs)
+
+
+def enqueue_feedback(db_path, disease, issue="Dosage looks wrong"):
+    message = build_feedback_message(disease, issue)
+    return enqueue_message(message['subject'], message['body'], db_path)
+
+
+def wait_for(condition, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.02)
+
+
+def test_worker_delivers_enqueued_message(smtp, db_path):
+    worker = make_worker(smtp, db_path, poll_interval=30.0)
+    worker.start()
+    try:
+        enqueue_feedback(db_path, "Mastitis", "Withdrawal period missing")
+        worker.notify()
+        wait_for(lambda: outbox_status(db_path).get('sent') == 1)
+    finally:
+        worker.stop()
+        worker.join(5)
+
+    assert len(smtp.messages) == 1
+    message = smtp.messages[0]
+    assert message['from'] == "app@localhost"
+    assert message['to'] == ["admin@localhost"]
+    assert "Withdrawal period missing" in message['data']
+    assert "Mastitis" in message['data']
+    assert not worker.is_alive()
+
+
+def test_failed_send_is_retried(smtp, db_path):
+    worker = make_worker(smtp, db_path, base_delay=0.0)
+    enqueue_feedback(db_path, "Footrot")
+
+    smtp.fail_auth = True
+    assert worker.deliver_due() == 0
+    assert outbox_status(db_path) == {'pending': 1}
+    assert smtp.messages == []
+
+    smtp.fail_auth = False
+    assert worker.deliver_due() == 1
+    assert outbox_status(db_path) == {'sent': 1}
+    assert len(smtp.messages) == 1
+
+
+def test_message_fails_after_max_attempts(smtp, db_path):
+    worker = make_worker(smtp, db_path, base_delay=0.0, max_attempts=2)
+    enqueue_feedback(db_path, "Anthrax")
+    smtp.fail_auth = True
+
+    worker.deliver_due()
+    assert outbox_status(db_path) == {'pending': 1}
+    worker.deliver_due()
+    assert outbox_status(db_path) == {'failed': 1}
+    assert worker.deliver_due() == 0
+    assert smtp.messages == []
+
+
+def test_connection_is_reused_across_batches(smtp, db_path):
+    worker = make_worker(smtp, db_path, batch_size=5)
+    for i in range(12):
+        enqueue_feedback(db_path, f"Disease {i}")
+
+    assert [worker.deliver_due() for _ in range(4)] == [5, 5, 2, 0]
+    assert len(smtp.messages) == 12
+    assert smtp.connections == 1
+    assert smtp.logins == 1
+
+    enqueue_feedback(db_path, "Ringworm")
+    assert worker.deliver_due() == 1
+    assert smtp.connections == 1
+    worker.pool.close_all()
+
+
+def test_stale_connection_is_replaced(smtp, db_path):
+    worker = make_worker(smtp, db_path)
+    enqueue_feedback(db_path, "Pinkeye")
+    assert worker.deliver_due() == 1
+    # The server drops the idle connection
+    server, _ = worker.pool._idle[0]
+    server.sock.shutdown(socket.SHUT_RDWR)
+
+    enqueue_feedback(db_path, "Brucellosis")
+    assert worker.deliver_due() == 1
+    wait_for(lambda: smtp.connections == 2)
+    assert outbox_status(db_path) == {'sent': 2}
+    worker.pool.close_all()
+
+
+@pytest.mark.parametrize("value, use_ssl", [(True, True), (False, False), ("false", False), ("0", False),
+                                            ("True", True), ("yes", True)])
+def test_smtp_ssl_setting_is_parsed(db_path, value, use_ssl):
+    worker = create_worker({"smtp_ssl": value, "sender": "app@localhost", "receiver": "admin@localhost",
+                            "app_password": "secret"}, db_path=db_path)
+    assert worker.pool.use_ssl is use_ssl
@@ -0,0 +1,115 @@
+import threading
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from inference_worker import InferenceService
+
+
+class RecordingModel:
+    """Model stand-in that records which thread ran each head"""
+    model_loaded = True
+    embedding_model = object()
+
+    def __init__(self, cascade_confidence):
+        self.cascade_confidence = cascade_confidence
+        self.calls = []
+
+    def _record(self, head, batch):
+        self.calls.append((head, threading.current_thread().name, batch.shape))
+
+    def preprocess_image(self, img_pil, target_size=(224, 224)):
+        return np.zeros((1, *target_size, 3), np.float32)
+
+    def preprocess_views(self, img_pil, k, target_size=(224, 224)):
+        return np.zeros((k, *target_size, 3), np.float32)
+
+    def preprocess_cascade(self, img_pil):
+        return self.preprocess_image(img_pil, (112, 112))
+
+    def tta_view_count(self, quality=None):
+        return 1
+
+    def predict_proba_batch(self, batch):
+        self._record('probabilities', batch)
+        return np.tile([0.9, 0.1], (len(batch), 1))
+
+    def cascade_proba_batch(self, batch):
+        self._record('cascade', batch)
+        return np.tile([self.cascade_confidence, 1 - self.cascade_confidence], (len(batch), 1))
+
+    def cascade_exit(self, preds):
+        return preds if preds.max() >= 0.8 else None
+
+    def embed_batch(self, batch):
+        self._record('embedding', batch)
+        return np.ones((len(batch), 128), np.float32)
+
+    def calibrated(self, preds):
+        return preds.mean(axis=0)
+
+    def top_predictions(self, preds, k=3):
+        return [("A", float(preds[0]))]
+
+
+@pytest.fixture
+def image():
+    return Image.new("RGB", (300, 300))
+
+
+def test_confident_cascade_exits_early_on_the_worker(image):
+    model = RecordingModel(cascade_confidence=0.95)
+    service = InferenceService(model, max_wait_ms=5)
+    try:
+        assert service.predict(image) == [("A", 0.95)]
+    finally:
+        service.close()
+    assert model.calls == [('cascade', 'inference-worker-0', (1, 112, 112, 3))]
+
+
+def test_unsure_cascade_escalates_to_full_model(image):
+    model = RecordingModel(cascade_confidence=0.6)
+    service = InferenceService(model, max_wait_ms=5)
+    try:
+        assert service.predict(image) == [("A", 0.9)]
+    finally:
+        service.close()
+    assert [head for head, _, _ in model.calls] == ['cascade', 'probabilities']
+    assert {thread for _, thread, _ in model.calls} == {'inference-worker-0'}
+
+
+def test_embedding_runs_on_the_worker(image):
+    model = RecordingModel(cascade_confidence=0.6)
+    service = InferenceService(model, max_wait_ms=5)
+    try:
+        assert service.embed(image).shape == (128,)
+    finally:
+        service.close()
+    assert model.calls == [('embedding', 'inference-worker-0', (1, 224, 224, 3))]
+
+
+def test_concurrent_heads_share_a_micro_batch_but_not_a_forward_pass():
+    model = RecordingModel(cascade_confidence=0.6)
+    service = InferenceService(model, max_wait_ms=200)
+    try:
+        futures = [service.submit_array(np.zeros((224, 224, 3)), head=head)
+                   for head in ('probabilities', 'embedding', 'probabilities')]
+        results = [future.result(timeout=5) for future in futures]
+    finally:
+        service.close()
+    assert [r.shape for r in results] == [(2,), (128,), (2,)]
+    # One batch, padded to a bucket size per head
+    assert [(head, shape[0]) for head, _, shape in model.calls] == [('probabilities', 2), ('embedding', 1)]
+    assert service.stats()['batches'] == 1
+
+
+def test_model_without_embeddings_returns_none(image):
+    model = RecordingModel(cascade_confidence=0.6)
+    model.embedding_model = None
+    service = InferenceService(model, max_wait_ms=5)
+    try:
+        assert service.embed(image) is None
+    finally:
+        service.close()
+    assert model.calls == []
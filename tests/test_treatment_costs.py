@@ -0,0 +1,40 @@
+import pandas as pd
+
+from treatment_costs import COST_FIELDS, fill_record_costs, get_cost_engine
+
+
+def test_cost_herd_scales_with_weight_and_severity():
+    engine = get_cost_engine()
+    herd = pd.DataFrame({
+        'disease': ["Mastitis", "Mastitis", "Mastitis", "Unknown Disease"],
+        'severity': ["mild", "mild", "severe", "mild"],
+        'weight': [250.0, 550.0, 250.0, 400.0],
+    })
+    result = engine.cost_herd(herd)
+    animals = result['animals']
+    assert result['totals']['animals'] == 4
+    assert result['totals']['costed'] == 3
+    assert animals['total_cost'].iloc[1] > animals['total_cost'].iloc[0]
+    assert animals['total_cost'].iloc[2] >= animals['total_cost'].iloc[0]
+    assert pd.isna(animals['total_cost'].iloc[3])
+    parts = animals[['medication_cost', 'labor_cost', 'supplies_cost']].sum(axis=1)
+    assert (parts.iloc[:3] - animals['total_cost'].iloc[:3]).abs().max() < 0.01
+    assert result['totals']['total_cost'] == animals['total_cost'].sum()
+
+
+def test_fill_record_costs_only_fills_records_without_costs():
+    records = [
+        {'disease_name': "Footrot", 'severity': "moderate", 'weight_kg': 400.0},
+        {'disease_name': "Footrot", 'severity': "moderate", 'total_cost': 75.0, 'treatment_applied': "Hoof trim"},
+        {'disease_name': "Unknown Disease", 'severity': "mild"},
+    ]
+    fill_record_costs(records)
+    estimated, entered, unknown = records
+    assert estimated['total_cost'] > 0
+    assert estimated['treatment_applied']
+    assert estimated['cost_estimated'] is True
+    assert entered['total_cost'] == 75.0
+    assert entered['treatment_applied'] == "Hoof trim"
+    assert entered['cost_estimated'] is False
+    assert all(unknown[field] is None for field in COST_FIELDS)
+    assert unknown['cost_estimated'] is False
@@ -0,0 +1,279 @@
+import os
+import json
+import time
+import random
+import inspect
+import argparse
+import threading
+import contextvars
+from collections import defaultdict
+from contextlib import contextmanager
+from functools import wraps
+from typing import Dict, List, Optional
+
+TRACE_LOG = "traces.jsonl"
+# Rotated to <log>.1 once it grows past this size
+MAX_LOG_BYTES = int(float(os.getenv("PASHU_TRACE_LOG_MAX_MB", "50")) * 1024 * 1024)
+# A runaway trace (e.g. a long background loop) keeps only its first spans
+MAX_SPANS_PER_TRACE = 2000
+
+
+class Span:
+    __slots__ = ("trace", "span_id", "parent_id", "name", "attrs", "start", "error")
+
+    def __init__(self, trace: "_Trace", span_id: int, parent_id: Optional[int], name: str, attrs: Dict):
+        self.trace = trace
+        self.span_id = span_id
+        self.parent_id = parent_id
+        self.name = name
+        self.attrs = attrs
+        self.start = time.time()
+        self.error = None
+
+    def set(self, **attrs) -> None:
+        self.attrs.update(attrs)
+
+
+class _Trace:
+    __slots__ = ("trace_id", "spans", "next_id", "dropped")
+
+    def __init__(self):
+        self.trace_id = f"{random.getrandbits(64):016x}"
+        self.spans = []
+        self.next_id = 0
+        self.dropped = 0
+
+
+# Streamlit's st.rerun()/st.stop() unwind the script with these; they are not failures
+_CONTROL_FLOW = {"RerunException", "StopException"}
+# Marks "inside a trace that was not sampled", so nested spans cost one lookup
+_UNSAMPLED = object()
+
+
+class Tracer:
+    """Sampled span tracing written as JSONL, one line per finished span.
+
+    The sampling decision is made once per root span; every span nested
+    under a sampled root (in the same thread or asyncio task) is recorded
+    with its parent's id. A trace's spans are buffered and appended to the
+    log together when its root finishes, so the log is written once per
+    request rather than once per span.
+    """
+
+    def __init__(self, path: Optional[str] = TRACE_LOG, sample_rate: float = 0.0):
+        self.path = path
+        self.sample_rate = sample_rate
+        self._current = contextvars.ContextVar("pashu_span", default=None)
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.path) and self.sample_rate > 0
+
+    def current_span(self) -> Optional[Span]:
+        span = self._current.get()
+        return None if span is _UNSAMPLED else span
+
+    @contextmanager
+    def span(self, name: str, **attrs):
+        """Time a block as a span; a root span is sampled at the tracer's rate"""
+        parent = self._current.get()
+        if parent is _UNSAMPLED or (parent is None and not (self.enabled and random.random() < self.sample_rate)):
+            token = self._current.set(_UNSAMPLED) if parent is None else None
+            try:
+                yield None
+            finally:
+                if token is not None:
+                    self._current.reset(token)
+            return
+
+        trace = parent.trace if parent is not None else _Trace()
+        trace.next_id += 1
+        span = Span(trace, trace.next_id, parent.span_id if parent is not None else None, name, attrs)
+        token = self._current.set(span)
+        started = time.perf_counter()
+        try:
+            yield span
+        except BaseException as e:
+            if type(e).__name__ in _CONTROL_FLOW:
+                span.attrs['ended_by'] = type(e).__name__
+            elif span.error is None:
+                span.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            self._current.reset(token)
+            self._finish(span, elapsed_ms)
+            if parent is None:
+                self._write(trace)
+
+    def traced(self, name: Optional[str] = None):
+        """Decorator form of span(); the name defaults to the function's qualified name"""
+        def decorator(func):
+            span_name = name or func.__qualname__
+
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.span(span_name):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def trace_methods(self, cls):
+        """Class decorator: trace every public method defined on the class"""
+        for attr, value in list(vars(cls).items()):
+            if inspect.isfunction(value) and not attr.startswith("_"):
+                setattr(cls, attr, self.traced(f"{cls.__name__}.{attr}")(value))
+        return cls
+
+    def record_exception(self, error: BaseException) -> None:
+        """Mark the current span failed for an exception the code handles itself (e.g. shows with st.error)"""
+        span = self.current_span()
+        if span is not None:
+            span.error = f"{type(error).__name__}: {error}"
+
+    def _finish(self, span: Span, elapsed_ms: float) -> None:
+        trace = span.trace
+        if len(trace.spans) >= MAX_SPANS_PER_TRACE and span.parent_id is not None:
+            trace.dropped += 1
+            return
+        record = {
+            'trace_id': trace.trace_id,
+            'span_id': span.span_id,
+            'parent_id': span.parent_id,
+            'name': span.name,
+            'start': round(span.start, 6),
+            'duration_ms': round(elapsed_ms, 3),
+            'thread': threading.current_thread().name,
+        }
+        if span.attrs:
+            record['attrs'] = span.attrs
+        if span.error:
+            record['error'] = span.error
+        if span.parent_id is None and trace.dropped:
+            record['dropped_spans'] = trace.dropped
+        trace.spans.append(record)
+
+    def _write(self, trace: _Trace) -> None:
+        lines = "".join(json.dumps(record, default=str) + "\n" for record in trace.spans)
+        with self._lock:
+            try:
+                if os.path.exists(self.path) and os.path.getsize(self.path) > MAX_LOG_BYTES:
+                    os.replace(self.path, self.path + ".1")
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(lines)
+            except OSError as e:
+                print(f"Trace log unavailable at {self.path}: {e}")
+
+
+tracer = Tracer(
+    path=os.getenv("PASHU_TRACE_LOG", TRACE_LOG),
+    sample_rate=float(os.getenv("PASHU_TRACE_SAMPLE_RATE", "0.0")),
+)
+span = tracer.span
+traced = tracer.traced
+trace_methods = tracer.trace_methods
+record_exception = tracer.record_exception
+
+
+# ---------- Viewer ----------
+def read_spans(paths: List[str]) -> List[Dict]:
+    spans = []
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    try:
+                        spans.append(json.loads(line))
+                    except json.JSONDecodeError:
+                        continue
+    return spans
+
+
+def summarize(spans: List[Dict], prefix: str = "") -> List[Dict]:
+    """One row per span name: count, errors, latency percentiles and total time"""
+    import numpy as np
+
+    durations = defaultdict(list)
+    errors = defaultdict(int)
+    for s in spans:
+        if s['name'].startswith(prefix):
+            durations[s['name']].append(s['duration_ms'])
+            errors[s['name']] += 'error' in s
+    rows = []
+    for name, values in durations.items():
+        values = np.array(values)
+        p50, p95 = np.percentile(values, [50, 95])
+        rows.append({'name': name, 'count': len(values), 'errors': errors[name], 'p50_ms': p50, 'p95_ms': p95,
+                     'max_ms': float(values.max()), 'total_s': float(values.sum()) / 1000})
+    return rows
+
+
+def slowest_traces(spans: List[Dict], limit: int) -> List[List[Dict]]:
+    """The slowest traces, each as its spans in start order"""
+    by_trace = defaultdict(list)
+    for s in spans:
+        by_trace[s['trace_id']].append(s)
+    roots = sorted((s for s in spans if s['parent_id'] is None), key=lambda s: s['duration_ms'], reverse=True)
+    return [sorted(by_trace[root['trace_id']], key=lambda s: (s['start'], s['span_id'])) for root in roots[:limit]]
+
+
+def _print_tree(trace: List[Dict]) -> None:
+    children = defaultdict(list)
+    for s in trace:
+        children[s['parent_id']].append(s)
+
+    def walk(parent_id, depth):
+        # Repeated calls under one parent (e.g. a lookup per table row) print as one line
+        groups = defaultdict(list)
+        for s in children.get(parent_id, []):
+            groups[s['name']].append(s)
+        for name, group in groups.items():
+            slowest = max(group, key=lambda s: s['duration_ms'])
+            label = name if len(group) == 1 else f"{name} ×{len(group)}"
+            total = sum(s['duration_ms'] for s in group)
+            errors = [s['error'] for s in group if 'error' in s]
+            error = f"  ❌ {errors[0]}" if errors else ""
+            attrs = f" {slowest['attrs']}" if len(group) == 1 and slowest.get('attrs') else ""
+            print(f"  {'  ' * depth}{label:<{max(44 - 2 * depth, 8)}} {total:>9.1f} ms{attrs}{error}")
+            walk(slowest['span_id'], depth + 1)
+
+    walk(None, 0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rank the slowest spans and pages in a trace log")
+    parser.add_argument("logs", nargs="*", default=[os.getenv("PASHU_TRACE_LOG", TRACE_LOG)])
+    parser.add_argument("--top", type=int, default=15, help="Rows per table")
+    parser.add_argument("--sort", choices=["p95_ms", "total_s", "max_ms", "count"], default="p95_ms")
+    parser.add_argument("--name", default="", help="Only spans whose name starts with this")
+    parser.add_argument("--traces", type=int, default=3, help="Print the span tree of the N slowest traces")
+    args = parser.parse_args()
+
+    spans = read_spans(args.logs)
+    if not spans:
+        raise SystemExit(f"No spans in {', '.join(args.logs)}; set PASHU_TRACE_SAMPLE_RATE to record some")
+    print(f"{len(spans)} spans in {len({s['trace_id'] for s in spans})} traces\n")
+
+    header = f"{'name':<44} {'count':>6} {'errors':>6} {'p50 ms':>9} {'p95 ms':>9} {'max ms':>9} {'total s':>8}"
+    for title, prefix in (("Pages", "page:"), ("Spans", args.name)):
+        rows = sorted(summarize(spans, prefix), key=lambda r: r[args.sort], reverse=True)[:args.top]
+        if not rows:
+            continue
+        print(f"{title} by {args.sort}\n{header}")
+        for r in rows:
+            print(f"{r['name']:<44} {r['count']:>6} {r['errors']:>6} {r['p50_ms']:>9.1f} {r['p95_ms']:>9.1f} "
+                  f"{r['max_ms']:>9.1f} {r['total_s']:>8.2f}")
+        print()
+
+    for trace in slowest_traces(spans, args.traces):
+        root = next(s for s in trace if s['parent_id'] is None)
+        print(f"Trace {root['trace_id']} ({root['duration_ms']:.0f} ms, "
+              f"{time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(root['start']))})")
+        _print_tree(trace)
+        print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,296 @@
+import os
+import time
+import argparse
+from io import StringIO
+from functools import lru_cache
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+DRUG_PRICES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "drug_prices.csv")
+# Used when a record or herd row has no body weight
+DEFAULT_WEIGHT_KG = 400.0
+# Where in a protocol's dose and course ranges each severity sits (0 = low end, 1 = high end)
+SEVERITY_POSITION = {"mild": 0.0, "moderate": 0.5, "severe": 1.0}
+# Unit -> (dimension, factor to the dimension's base unit: mg, IU or ml)
+UNITS = {
+    "mcg": ("mass", 1e-3), "mg": ("mass", 1.0), "g": ("mass", 1e3), "kg": ("mass", 1e6),
+    "IU": ("activity", 1.0),
+    "ml": ("volume", 1.0), "l": ("volume", 1e3),
+}
+# Pack units sold by volume or weight; anything else (capsule, tablet, tube) is whole units per administration
+DIVISIBLE_PACK_UNITS = {"ml", "l", "g", "kg"}
+# Labour and consumables (₹) per administration, by route
+ROUTE_COSTS = {
+    "IV": (150.0, 25.0),
+    "IM": (40.0, 10.0),
+    "SC": (40.0, 10.0),
+    "oral": (10.0, 0.0),
+    "intramammary": (20.0, 5.0),
+}
+DEFAULT_ROUTE = "IM"
+# Generic names in protocol text -> the priced product
+DRUG_ALIASES = {"NSAID": "Flunixin"}
+COST_FIELDS = ("medication_cost", "labor_cost", "supplies_cost", "total_cost")
+
+
+def normalize_disease(name) -> str:
+    """Disease key that matches TreatmentDatabase names ("Lumpy Skin Disease" == "LumpySkinDisease")"""
+    return str(name).replace(" ", "").lower()
+
+
+def load_prices(path: str = DRUG_PRICES_PATH) -> pd.DataFrame:
+    return pd.read_csv(path)
+
+
+def _pack_units_per_dose_unit(dose_unit: str, concentration: float, concentration_unit, pack_unit: str) -> float:
+    """How many pack units (ml, g, capsules) one dose unit (mg, IU, ml) takes"""
+    dose_dim, dose_scale = UNITS[dose_unit]
+    if pack_unit in UNITS and UNITS[pack_unit][0] == dose_dim:
+        return dose_scale / UNITS[pack_unit][1]
+    if not isinstance(concentration_unit, str) or "/" not in concentration_unit or not concentration > 0:
+        raise ValueError(f"a dose in {dose_unit} needs a concentration per {pack_unit}")
+    amount_unit, per_unit = (u.strip() for u in concentration_unit.split("/", 1))
+    if per_unit != pack_unit or UNITS.get(amount_unit, (None,))[0] != dose_dim:
+        raise ValueError(f"concentration {concentration_unit} does not convert {dose_unit} to {pack_unit}")
+    return dose_scale / (concentration * UNITS[amount_unit][1])
+
+
+class TreatmentCostEngine:
+    """Doses, volumes and costs for a whole herd, vectorised over animals.
+
+    Each disease's regimen rows (one per drug, from
+    TreatmentDatabase.get_dosage_table) are joined with the price list once.
+    Costing a herd then expands every animal into its disease's regimen rows
+    with np.repeat, interpolates dose and course length by severity, scales
+    by body weight and sums the lines back per animal with np.bincount.
+    """
+
+    def __init__(self, dosages: pd.DataFrame, prices: pd.DataFrame):
+        prices = prices.dropna(subset=["drug"]).drop_duplicates("drug", keep="last").set_index("drug")
+        regimens = dosages.assign(product_drug=dosages["drug"].map(lambda d: DRUG_ALIASES.get(d, d)))
+        priced = regimens["product_drug"].isin(prices.index)
+        self.unpriced = sorted(regimens.loc[~priced, "drug"].unique())
+        regimens = regimens[priced].join(prices, on="product_drug", rsuffix="_price")
+        regimens["route"] = regimens["route"].fillna(regimens["route_price"]).fillna(DEFAULT_ROUTE)
+        regimens["pack_per_dose_unit"] = [
+            _pack_units_per_dose_unit(r.dose_unit, r.concentration, r.concentration_unit, r.pack_unit)
+            for r in regimens.itertuples()
+        ]
+        regimens["key"] = regimens["disease"].map(normalize_disease)
+        self.regimens = regimens.sort_values("key", kind="stable").reset_index(drop=True)
+
+        keys = self.regimens["key"].to_numpy()
+        self.diseases = pd.Index(pd.unique(keys))
+        self._starts = np.searchsorted(keys, self.diseases.to_numpy())
+        self._counts = np.diff(np.append(self._starts, len(keys)))
+        r = self.regimens
+        self._dose_min, self._dose_max = r["dose_min"].to_numpy(float), r["dose_max"].to_numpy(float)
+        self._days_min, self._days_max = r["days_min"].to_numpy(float), r["days_max"].to_numpy(float)
+        self._interval_min = r["interval_min"].to_numpy(float)
+        self._interval_max = r["interval_max"].to_numpy(float)
+        self._single = r["single"].to_numpy(bool)
+        self._per_kg = r["per"].eq("kg").to_numpy()
+        self._per_quarter = r["per"].eq("quarter").to_numpy()
+        self._pack_factor = r["pack_per_dose_unit"].to_numpy(float)
+        self._whole_packs = ~r["pack_unit"].isin(DIVISIBLE_PACK_UNITS).to_numpy()
+        self._price = r["price_per_pack_unit"].to_numpy(float)
+        route_costs = np.array([ROUTE_COSTS.get(route, ROUTE_COSTS[DEFAULT_ROUTE]) for route in r["route"]])
+        self._labor, self._supplies = route_costs.reshape(-1, 2).T
+
+    def has_regimen(self, disease: str) -> bool:
+        return normalize_disease(disease) in self.diseases
+
+    def cost_herd(self, herd: pd.DataFrame, lines: bool = False) -> Dict:
+        """Cost a herd table with disease, severity and (optional) weight and quarters columns.
+
+        Returns 'animals' (herd index; doses per animal and the four cost
+        fields, NaN where the disease has no priced regimen), 'drugs' (herd
+        totals per drug) and 'totals'; with lines=True also 'lines', one row
+        per animal and drug.
+        """
+        n = len(herd)
+        disease = herd["disease"] if "disease" in herd else herd["disease_name"]
+        disease_idx = self.diseases.get_indexer(disease.map(normalize_disease))
+        known = disease_idx >= 0
+        severity = herd["severity"].astype("string").str.strip().str.lower().map(SEVERITY_POSITION)
+        position = severity.fillna(SEVERITY_POSITION["moderate"]).to_numpy(float)
+        weight_column = "weight" if "weight" in herd else "weight_kg"
+        weight = pd.to_numeric(herd[weight_column], errors="coerce").to_numpy(float) if weight_column in herd \
+            else np.full(n, np.nan)
+        weight = np.where(weight > 0, weight, DEFAULT_WEIGHT_KG)
+        quarters = pd.to_numeric(herd["quarters"], errors="coerce").fillna(1).to_numpy(float) if "quarters" in herd \
+            else np.ones(n)
+
+        # One line per (animal, regimen row): animal i contributes counts[disease] consecutive rows
+        counts = np.where(known, self._counts[np.maximum(disease_idx, 0)], 0)
+        animal = np.repeat(np.arange(n), counts)
+        first_line = np.repeat(np.cumsum(counts) - counts, counts)
+        row = np.repeat(np.where(known, self._starts[np.maximum(disease_idx, 0)], 0), counts) \
+            + np.arange(len(animal)) - first_line
+
+        t = position[animal]
+        dose = self._dose_min[row] + t * (self._dose_max[row] - self._dose_min[row])
+        scale = np.where(self._per_kg[row], weight[animal], np.where(self._per_quarter[row], quarters[animal], 1.0))
+        packs_per_admin = dose * scale * self._pack_factor[row]
+        packs_per_admin = np.where(self._whole_packs[row], np.ceil(packs_per_admin - 1e-9), packs_per_admin)
+        days = np.ceil(self._days_min[row] + t * (self._days_max[row] - self._days_min[row]) - 1e-9)
+        # Severe cases get the short end of a repeat interval
+        interval = self._interval_max[row] - t * (self._interval_max[row] - self._interval_min[row])
+        administrations = np.where(self._single[row], 1.0,
+                                   np.where(np.isnan(interval), days, np.ceil(days / np.where(np.isnan(interval), 1.0,
+                                                                                              interval) - 1e-9)))
+        packs = packs_per_admin * administrations
+        medication = packs * self._price[row]
+        labor = administrations * self._labor[row]
+        supplies = administrations * self._supplies[row]
+
+        def per_animal(values):
+            return np.where(known, np.bincount(animal, weights=values, minlength=n), np.nan)
+
+        animals = pd.DataFrame({
+            "administrations": per_animal(administrations),
+            "medication_cost": per_animal(medication),
+            "labor_cost": per_animal(labor),
+            "supplies_cost": per_animal(supplies),
+        }, index=herd.index)
+        animals["total_cost"] = animals["medication_cost"] + animals["labor_cost"] + animals["supplies_cost"]
+
+        r = self.regimens
+        drugs = pd.DataFrame({"drug": r["product_drug"].to_numpy()[row], "pack_unit": r["pack_unit"].to_numpy()[row],
+                              "animals": 1, "administrations": administrations, "quantity": packs,
+                              "medication_cost": medication}) \
+            .groupby(["drug", "pack_unit"], as_index=False).sum().sort_values("medication_cost", ascending=False)
+        result = {
+            "animals": animals,
+            "drugs": drugs.reset_index(drop=True),
+            "totals": {
+                "animals": n,
+                "costed": int(known.sum()),
+                **{field: float(np.nansum(animals[field])) for field in COST_FIELDS},
+            },
+        }
+        if lines:
+            result["lines"] = pd.DataFrame({
+                "animal": herd.index.to_numpy()[animal],
+                "disease": r["disease"].to_numpy()[row],
+                "drug": r["product_drug"].to_numpy()[row],
+                "product": r["product"].to_numpy()[row],
+                "route": r["route"].to_numpy()[row],
+                "dose": dose,
+                "dose_unit": r["dose_unit"].to_numpy()[row] + "/" + r["per"].to_numpy()[row],
+                "quantity_per_administration": packs_per_admin,
+                "pack_unit": r["pack_unit"].to_numpy()[row],
+                "administrations": administrations,
+                "medication_cost": medication,
+            })
+        return result
+
+    def fill_record_costs(self, records: pd.DataFrame) -> pd.DataFrame:
+        """Health records with cost fields (and an empty treatment_applied) estimated where none were given.
+
+        cost_estimated marks the rows whose costs were filled in here.
+        """
+        records = records.copy()
+        for field in COST_FIELDS + ("treatment_applied",):
+            if field not in records:
+                records[field] = None
+        if "cost_estimated" not in records:
+            records["cost_estimated"] = False
+        missing = records[list(COST_FIELDS)].isna().all(axis=1).to_numpy()
+        if not missing.any():
+            return records
+        todo = records[missing]
+        result = self.cost_herd(todo, lines=True)
+        costed = result["animals"]["total_cost"].notna()
+        for field in COST_FIELDS:
+            records.loc[costed[costed].index, field] = result["animals"].loc[costed, field].round(2)
+        records.loc[costed[costed].index, "cost_estimated"] = True
+
+        line = result["lines"]
+        if line.empty:
+            return records
+        text = (line["drug"] + " " + line["quantity_per_administration"].round(1).astype(str) + " "
+                + line["pack_unit"] + " " + line["route"] + " x" + line["administrations"].astype(int).astype(str))
+        summary = text.groupby(line["animal"].to_numpy(), sort=False).agg("; ".join)
+        blank = records["treatment_applied"].isna() | records["treatment_applied"].astype("string").str.strip().eq("")
+        fill = blank & records.index.isin(summary.index)
+        records.loc[fill, "treatment_applied"] = summary.reindex(records.index[fill]).to_numpy()
+        return records
+
+
+def fill_record_costs(records: List[Dict]) -> List[Dict]:
+    """Estimate cost fields in place for health-record dicts that carry none; returns the same list"""
+    if not records:
+        return records
+    frame = pd.DataFrame.from_records(records)
+    if "disease_name" not in frame or "severity" not in frame:
+        return records
+    filled = get_cost_engine().fill_record_costs(frame)
+    columns = list(COST_FIELDS) + ["treatment_applied", "cost_estimated"]
+    values = filled[columns].astype(object).where(filled[columns].notna(), None).to_dict("records")
+    for record, costs in zip(records, values):
+        record.update(costs)
+    return records
+
+
+@lru_cache(maxsize=8)
+def get_cost_engine(prices_csv: Optional[str] = None) -> TreatmentCostEngine:
+    """Shared engine per price list (CSV text); the default uses drug_prices.csv"""
+    from treatment_database import TreatmentDatabase
+    prices = pd.read_csv(StringIO(prices_csv)) if prices_csv else load_prices()
+    return TreatmentCostEngine(TreatmentDatabase().get_dosage_table(), prices)
+
+
+def synthetic_outbreak(size: int, seed: int = 0, diseases: Optional[List[str]] = None) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    diseases = diseases or list(get_cost_engine().regimens["disease"].unique())
+    return pd.DataFrame({
+        "cow_id": [f"COW-{i:05d}" for i in range(size)],
+        "weight": rng.uniform(150, 600, size).round(0),
+        "disease": rng.choice(diseases, size),
+        "severity": rng.choice(list(SEVERITY_POSITION), size, p=[0.5, 0.35, 0.15]),
+    })
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Treatment doses and costs for a herd")
+    parser.add_argument("--herd", help="CSV with disease, severity and optional weight/quarters columns")
+    parser.add_argument("--prices", default=DRUG_PRICES_PATH, help="Drug price list CSV")
+    parser.add_argument("--output", help="Write per-animal costs to this CSV")
+    parser.add_argument("--dosages", action="store_true", help="Print the dosage table parsed from the protocols")
+    parser.add_argument("--benchmark", type=int, metavar="N", help="Cost a synthetic outbreak of N animals")
+    args = parser.parse_args()
+
+    with open(args.prices) as f:
+        engine = get_cost_engine(f.read())
+    if args.dosages:
+        print(engine.regimens[["disease", "drug", "dose_min", "dose_max", "dose_unit", "per", "route", "days_min",
+                               "days_max", "single", "product"]].to_string(index=False))
+    if engine.unpriced:
+        print(f"⚠️ No price for: {', '.join(engine.unpriced)}")
+
+    if args.benchmark:
+        herd = synthetic_outbreak(args.benchmark)
+        started = time.perf_counter()
+        result = engine.cost_herd(herd)
+        elapsed = time.perf_counter() - started
+        print(f"{len(herd)} animals costed in {elapsed * 1000:.1f} ms: total ₹{result['totals']['total_cost']:,.0f}")
+        print(result["drugs"].to_string(index=False))
+
+    if args.herd:
+        herd = pd.read_csv(args.herd)
+        result = engine.cost_herd(herd)
+        animals = herd.join(result["animals"].round(2))
+        totals = result["totals"]
+        print(f"{totals['costed']}/{totals['animals']} animals costed: medication ₹{totals['medication_cost']:,.0f}, "
+              f"labour ₹{totals['labor_cost']:,.0f}, supplies ₹{totals['supplies_cost']:,.0f}, "
+              f"total ₹{totals['total_cost']:,.0f}")
+        if args.output:
+            animals.to_csv(args.output, index=False)
+            print(f"✅ Per-animal costs written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,67 @@
-from typing import Dict, Optional
+import re
+from typing import Dict, List, Optional
+import pandas as pd
+from localization import localize_record
+from tracing import traced
+
+_NUMBER = r"\d[\d,]*(?:\.\d+)?"
+# "Penicillin: 20,000-40,000 IU/kg body weight IM", "Ivermectin 200 mcg/kg", "Intramammary: 10-20 ml/quarter"
+_DOSE = re.compile(rf"^(?P<drug>[A-Za-z][A-Za-z ]*?)\s*:?\s+(?P<lo>{_NUMBER})(?:\s*[-–]\s*(?P<hi>{_NUMBER}))?"
+                   rf"\s*(?P<unit>IU|mcg|µg|mg|ml|g)\s*/\s*(?P<per>kg|quarter)\b")
+_DAYS = re.compile(r"\bfor\s+(\d+)(?:\s*[-–]\s*(\d+))?\s*days?\b", re.IGNORECASE)
+_INTERVAL = re.compile(r"\bevery\s+(\d+)(?:\s*[-–]\s*(\d+))?\s*days?\b", re.IGNORECASE)
+_SINGLE = re.compile(r"\bonce\b(?!\s+daily)", re.IGNORECASE)
+_COURSE = re.compile(r"(\d+)(?:\s*[-–]\s*(\d+))?\s*(day|week)s?\b", re.IGNORECASE)
+_ROUTES = (("IV", re.compile(r"\bIV\b")), ("IM", re.compile(r"\bIM\b")),
+           ("SC", re.compile(r"\bSC\b|subcutaneous", re.IGNORECASE)), ("oral", re.compile(r"\borally\b|\boral\b", re.IGNORECASE)))
+DOSAGE_COLUMNS = ["disease", "drug", "dose_min", "dose_max", "dose_unit", "per", "route", "days_min", "days_max",
+                  "interval_min", "interval_max", "single", "source"]
+
+
+def _range(match, scale: float = 1.0):
+    lo = float(match.group(1).replace(",", "")) * scale
+    return lo, float(match.group(2).replace(",", "")) * scale if match.group(2) else lo
+
+
+def parse_dosage(dosage: str, duration: str = "") -> List[Dict]:
+    """Per-weight (or per-quarter) doses in a free-text dosage, one dict per drug.
+
+    Days come from "for N days" in the drug's own sentence, else from the
+    course length in the duration text (or any "for N days" in the dosage).
+    A drug given "once" is a single administration; "every N days" repeats
+    over the course; anything else is given daily. Instructions without a
+    weight-based dose (footbaths, creams, surgery) are left out.
+    """
+    sentences = [s.strip() for s in re.split(r"(?<!\d)[.;]", dosage) if s.strip()]
+    course = _COURSE.search(duration or "")
+    if course:
+        course = _range(course, 7.0 if course.group(3).lower() == "week" else 1.0)
+    else:
+        explicit = [_range(m) for m in _DAYS.finditer(dosage)]
+        course = max(explicit, key=lambda r: r[1]) if explicit else (1.0, 1.0)
+
+    rows = []
+    for sentence in sentences:
+        dose = _DOSE.search(sentence)
+        if not dose:
+            continue
+        days, interval = _DAYS.search(sentence), _INTERVAL.search(sentence)
+        lo = float(dose.group("lo").replace(",", ""))
+        rows.append({
+            "drug": dose.group("drug").strip(),
+            "dose_min": lo,
+            "dose_max": float(dose.group("hi").replace(",", "")) if dose.group("hi") else lo,
+            "dose_unit": dose.group("unit").replace("µg", "mcg"),
+            "per": dose.group("per"),
+            "route": next((route for route, pattern in _ROUTES if pattern.search(sentence)), None),
+            "days_min": _range(days)[0] if days else course[0],
+            "days_max": _range(days)[1] if days else course[1],
+            "interval_min": _range(interval)[0] if interval else None,
+            "interval_max": _range(interval)[1] if interval else None,
+            "single": bool(_SINGLE.search(sentence)),
+            "source": sentence,
+        })
+    return rows
 
 class TreatmentDatabase:
     """Database class for managing cow disease treatment information"""
@@ -94,17 +157,24 @@ class TreatmentDatabase:
         # Sort treatments alphabetically by disease name
         return dict(sorted(treatments.items()))
 
-    def get_treatment_info(self, disease_name: str) -> Optional[Dict]:
+    @traced()
+    def get_treatment_info(self, disease_name: str, language: Optional[str] = None) -> Optional[Dict]:
         normalized_name = disease_name.replace(" ", "").lower()
         for key in self.treatments:
             if key.replace(" ", "").lower() == normalized_name:
-                return self.treatments[key]
+                return localize_record("treatment", key, self.treatments[key], language)
         return None
 
     def get_all_treatments(self) -> Dict:
         """Get all treatments in the database"""
         return self.treatments
 
+    def get_dosage_table(self) -> pd.DataFrame:
+        """Structured doses parsed from every protocol's dosage text, one row per disease and drug"""
+        rows = [dict(disease=disease, **row) for disease, treatment in self.treatments.items()
+                for row in parse_dosage(treatment.get("dosage", ""), treatment.get("duration", ""))]
+        return pd.DataFrame(rows, columns=DOSAGE_COLUMNS)
+
     def get_medications_list(self) -> set:
         """Get a set of all medications mentioned in treatments"""
         medications = set()
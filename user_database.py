@@ -1,8 +1,12 @@
+import os
 import sqlite3
 import bcrypt
 
+# Tests and the load harness point this at a throwaway database
+USERS_DB = os.getenv("PASHU_USERS_DB", "users.db")
+
 def init_db():
-    conn = sqlite3.connect("users.db")
+    conn = sqlite3.connect(USERS_DB)
     c = conn.cursor()
     c.execute('''
         CREATE TABLE IF NOT EXISTS users (
@@ -15,7 +19,7 @@ def init_db():
 
 def create_user(username, password):
     hashed = bcrypt.hashpw(password.encode(), bcrypt.gensalt())
-    conn = sqlite3.connect("users.db")
+    conn = sqlite3.connect(USERS_DB)
     c = conn.cursor()
     try:
         c.execute("INSERT INTO users (username, password) VALUES (?, ?)", (username, hashed))
@@ -27,7 +31,7 @@ def create_user(username, password):
         conn.close()
 
 def verify_user(username, password):
-    conn = sqlite3.connect("users.db")
+    conn = sqlite3.connect(USERS_DB)
     c = conn.cursor()
     c.execute("SELECT password FROM users WHERE username=?", (username,))
     result = c.fetchone()
@@ -36,3 +40,10 @@ def verify_user(username, password):
         return bcrypt.checkpw(password.encode(), result[0])
 
     return False
+
+def delete_user(username):
+    conn = sqlite3.connect(USERS_DB)
+    c = conn.cursor()
+    c.execute("DELETE FROM users WHERE username=?", (username,))
+    conn.commit()
+    conn.close()